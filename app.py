@@ -1,28 +1,25 @@
 import tkinter as tk
 from tkinter import ttk, filedialog
 import numpy as np
-from PIL import Image, ImageTk, ImageEnhance
-from perlin_noise import PerlinNoise
-import cv2  # Dependency for high-quality denoising
+from PIL import Image, ImageTk
 import threading
 import logging
+import json
 import os
 import platform
-import colorsys
+
+from grain_renderer import GrainParams, GrainRenderer, BANDING_MODES, BLEND_MODES, GLOW_ENGINES, GRAIN_ENGINES, GRAIN_SPECTRA, PRECISIONS, RNG_MODES, SLIDER_DEFAULTS, SLIDER_RANGES, SUPERSAMPLE_MODES, UPSCALE_KERNELS, resampling
+from grain_cache import FixedMapCache, StageCache
+from grain_bank import BANK_SIZES
+from grain_scheduler import RenderScheduler
+from grain_export import export_sequence, default_worker_count
+from grain_plates import PlateSequence, decode_plate, sequence_pattern_for
+from grain_profile import StageProfiler
+from grain_writer import DEFAULT_PNG_COMPRESSION, FILE_FORMATS, OutputFormat
 
 # --- Setup professional logging ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 
-# --- Compatibility for Pillow resampling ---
-try:
-    resampling = Image.Resampling
-except AttributeError:
-    class _Res:
-        NEAREST = Image.NEAREST
-        BILINEAR = Image.BILINEAR
-        LANCZOS = Image.LANCZOS
-    resampling = _Res()
-
 # --- Tooltip Helper Class ---
 class Tooltip:
     def __init__(self, widget, text):
@@ -62,9 +59,16 @@ class OrganicGrainGeneratorApp:
         self.width = 1920
         self.height = 1080
         self.background_pil_image = None
-        self._cached_fixed_maps = {}
+        self.plate_sequence = None # Background plates per frame for composited export; the preview shows the frame that was picked
+        self._fixed_map_cache = FixedMapCache(store_dir=os.environ.get("GRAIN_MAP_CACHE") or None)
+        self._stage_cache = StageCache() # Preview stage outputs, so a slider change only reruns the stages after it
         self.pil_image = None
         self.processed_pil_image = None
+        self.proxy_pil_image = None # Low-resolution stand-in shown during slider drags
+        self.detail_region_image = None # Full-resolution Detail View crop rendered alongside a proxy
+        # Preview renders run on one worker thread; only the newest request's result is shown.
+        self._scheduler = RenderScheduler(lambda generation, result: self.master.after(0, self._on_render_result, generation, result), on_cancel=self._on_render_cancelled)
+        self._pending_save_path = None # Where to save the next full-resolution render, requested while a proxy was shown
         self._cached_luma_arr = None # For caching luminance array
 
         # --- Zoom Properties ---
@@ -88,6 +92,9 @@ class OrganicGrainGeneratorApp:
         status_bar_frame.columnconfigure(0, weight=1)
         self.credits_label = ttk.Label(status_bar_frame, text="Organic Grain Generator | Written by Nathaniel Westveer", style="TLabel", anchor=tk.E)
         self.credits_label.grid(row=0, column=1, sticky='e')
+        # Where the latest preview render spent its time and memory.
+        self.profile_label = ttk.Label(status_bar_frame, text="", style="TLabel", anchor=tk.W)
+        self.profile_label.grid(row=0, column=0, sticky='w')
 
         master_control_frame = ttk.Frame(top_frame, width=350, style="Dark.TFrame")
         master_control_frame.pack(side=tk.LEFT, fill=tk.Y, padx=(10, 0), pady=10)
@@ -196,18 +203,7 @@ class OrganicGrainGeneratorApp:
         if self.height * new_scale > 0: self.canvas.yview_moveto(scroll_y / (self.height * new_scale))
 
     def create_widgets(self):
-        self.slider_defaults = {
-            "Grain Size": 1, "PRNU (Gain FPN)": 0, "DSNU (Offset FPN)": 0,
-            "Shot Noise (Poisson)": 0, "Read Noise (Gaussian)": 0, "Color Noise": 0,
-            "Shadow Noise Bias": 0, "Shadow Falloff": 2.5, "Banding": 0, "Bit Depth": 8,
-            "Firefly Density (%)": 0, "Firefly Intensity": 0, "Firefly Opacity": 100, "Firefly Coloration": 0,
-            "Bloom / Crush": 0, "Bloom / Crush Strength": 100, "Denoise Param 1": 0,
-            "Denoise Param 2": 10, "Mix": 100, "Micro-contrast": 0, "Texture Variation": 0,
-            "Saturation": 0, "Filmic Saturation": 0, "Lift": 0, "Roll-off": 0, "Contrast": 0,
-            "Diamond Grid Opacity": 0, "Diamond Grid Size": 8, "Diamond Color Count": 4, 
-            "Diamond Color Saturation": 50, "Diamond Edge Softness": 0,
-            "Glow Amount": 0, "Glow Radius": 20, "Glow Threshold": 90, "Soften Amount": 0, "Soften Mix": 100
-        }
+        self.slider_defaults = dict(SLIDER_DEFAULTS)
         
         dim_frame = ttk.LabelFrame(self.control_frame, text="Dimensions"); dim_frame.pack(fill=tk.X, pady=5)
         ttk.Label(dim_frame, text="Width:").grid(row=0, column=0, padx=5, pady=2, sticky="w")
@@ -219,7 +215,11 @@ class OrganicGrainGeneratorApp:
         bg_frame = ttk.LabelFrame(self.control_frame, text="Background Image"); bg_frame.pack(fill=tk.X, pady=5)
         self.bg_status_label = ttk.Label(bg_frame, text="Status: No Image Loaded"); self.bg_status_label.pack(pady=(2, 4))
         ttk.Button(bg_frame, text="Load Background Image...", command=self.load_background_image).pack(fill=tk.X, padx=5)
+        plate_button = ttk.Button(bg_frame, text="Load Plate Sequence...", command=self.load_plate_sequence); plate_button.pack(fill=tk.X, padx=5, pady=(2, 0))
+        Tooltip(plate_button, "Pick any frame of a numbered shot (e.g. shot.1001.png). The preview shows that frame; a composited export puts frame N over plate N.")
         ttk.Button(bg_frame, text="Clear Background", command=self.clear_background_image).pack(fill=tk.X, padx=5, pady=(2, 5))
+        self.blend_mode_var = tk.StringVar(); self.blend_mode_combo = ttk.Combobox(bg_frame, textvariable=self.blend_mode_var, state="readonly", values=BLEND_MODES); self.blend_mode_combo.set(BLEND_MODES[0]); self.blend_mode_combo.pack(fill=tk.X, padx=5, pady=(0, 5)); self.blend_mode_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.blend_mode_combo, "How the grain is composited over the background.\nOverlay: classic. Soft Light: gentler in highlights and shadows. Linear Light: adds the grain evenly at every brightness.")
 
         perf_frame = ttk.LabelFrame(self.control_frame, text="Controls"); perf_frame.pack(fill=tk.X, pady=5)
         ttk.Label(perf_frame, text="Noise Seed:").grid(row=0, column=0, padx=5, pady=3, sticky="w")
@@ -227,96 +227,129 @@ class OrganicGrainGeneratorApp:
         self.realtime_preview_var = tk.BooleanVar(value=True); ttk.Checkbutton(perf_frame, text="Real-time Preview", variable=self.realtime_preview_var).grid(row=1, column=0, columnspan=2, sticky="w", padx=5)
         ttk.Label(perf_frame, text="Supersampling:").grid(row=2, column=0, padx=5, pady=3, sticky="w")
         self.supersample_var = tk.StringVar(); self.supersample_combo = ttk.Combobox(perf_frame, textvariable=self.supersample_var, state="readonly", width=10, values=("1x (Off)", "2x", "3x", "4x")); self.supersample_combo.set("1x (Off)"); self.supersample_combo.grid(row=2, column=1, padx=5, pady=3, sticky="w")
-        self.update_preview_button = ttk.Button(perf_frame, text="Update Full Preview", command=self.update_noise); self.update_preview_button.grid(row=3, column=0, columnspan=2, pady=5, sticky="ew")
+        ttk.Label(perf_frame, text="Supersample Mode:").grid(row=3, column=0, padx=5, pady=3, sticky="w")
+        self.supersample_mode_var = tk.StringVar(); self.supersample_mode_combo = ttk.Combobox(perf_frame, textvariable=self.supersample_mode_var, state="readonly", width=12, values=SUPERSAMPLE_MODES); self.supersample_mode_combo.set(SUPERSAMPLE_MODES[0]); self.supersample_mode_combo.grid(row=3, column=1, padx=5, pady=3, sticky="w"); self.supersample_mode_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.supersample_mode_combo, "Exact: render supersample² the pixels and downsample.\nFast: synthesize grain at output resolution with the supersampled grain's strength and softness.\nIt draws as many grain cells as Exact, so it saves most with fine grain.")
+        ttk.Label(perf_frame, text="Noise RNG:").grid(row=4, column=0, padx=5, pady=3, sticky="w")
+        self.rng_mode_var = tk.StringVar(); self.rng_mode_combo = ttk.Combobox(perf_frame, textvariable=self.rng_mode_var, state="readonly", width=12, values=RNG_MODES); self.rng_mode_combo.set("Addressable"); self.rng_mode_combo.grid(row=4, column=1, padx=5, pady=3, sticky="w"); self.rng_mode_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.rng_mode_combo, "Addressable: noise can be generated for any crop on its own, so the Detail View renders only what it shows.\nSequential: matches plates rendered by earlier versions for the same seed.")
+        ttk.Label(perf_frame, text="Precision:").grid(row=5, column=0, padx=5, pady=3, sticky="w")
+        self.precision_var = tk.StringVar(); self.precision_combo = ttk.Combobox(perf_frame, textvariable=self.precision_var, state="readonly", width=12, values=PRECISIONS); self.precision_combo.set(PRECISIONS[0]); self.precision_combo.grid(row=5, column=1, padx=5, pady=3, sticky="w"); self.precision_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.precision_combo, "8-bit: each stage rounds to 8 bits, as in earlier versions.\nFloat: the frame stays in floating point until output, avoiding accumulated rounding (slower).")
+        ttk.Label(perf_frame, text="Grain Bank:").grid(row=6, column=0, padx=5, pady=3, sticky="w")
+        self.grain_bank_var = tk.StringVar(); self.grain_bank_combo = ttk.Combobox(perf_frame, textvariable=self.grain_bank_var, state="readonly", width=12, values=("Off",) + tuple(str(n) for n in BANK_SIZES)); self.grain_bank_combo.set("Off"); self.grain_bank_combo.grid(row=6, column=1, padx=5, pady=3, sticky="w"); self.grain_bank_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.grain_bank_combo, "Render the random grain of this many frames once, then cut every frame from one of them with a random offset, flip and channel swap.\nLong sequences export at about the cost of a copy per frame; with GRAIN_MAP_CACHE set the bank is kept between runs.")
+        ttk.Label(perf_frame, text="Proxy Preview:").grid(row=7, column=0, padx=5, pady=3, sticky="w")
+        self.proxy_mode_var = tk.StringVar(); self.proxy_mode_combo = ttk.Combobox(perf_frame, textvariable=self.proxy_mode_var, state="readonly", width=12, values=("Off", "Display", "1/2", "1/4")); self.proxy_mode_combo.set("Display"); self.proxy_mode_combo.grid(row=7, column=1, padx=5, pady=3, sticky="w")
+        Tooltip(self.proxy_mode_combo, "While a slider is dragged in Real-time Preview, render at the display size (or 1/2, 1/4) with grain and radii scaled to match,\nthen refine at full resolution in the background when it is released.")
+        self.update_preview_button = ttk.Button(perf_frame, text="Update Full Preview", command=self.update_noise); self.update_preview_button.grid(row=8, column=0, columnspan=2, pady=5, sticky="ew")
 
         sliders_frame = ttk.LabelFrame(self.control_frame, text="Noise Parameters"); sliders_frame.pack(fill=tk.X, pady=5)
         self.sliders = {}
-        slider_params = {
-            "Grain Size": (1, 8), "PRNU (Gain FPN)": (0, 5.0), "DSNU (Offset FPN)": (0, 10.0),
-            "Shot Noise (Poisson)": (0, 5.0), "Read Noise (Gaussian)": (0, 15.0), "Color Noise": (0, 20.0),
-            "Shadow Noise Bias": (0, 5.0), "Shadow Falloff": (1.0, 10.0), "Banding": (0, 0.1),
-            "Bit Depth": (4, 8), "Firefly Density (%)": (0, 1.0), "Firefly Intensity": (0, 500.0),
-            "Firefly Opacity": (0, 100.0), "Firefly Coloration": (0, 2.0)
-        }
+        slider_params = {name: SLIDER_RANGES[name] for name in (
+            "Grain Size", "Grain Aspect", "Grain Angle", "PRNU (Gain FPN)", "DSNU (Offset FPN)", "Shot Noise (Poisson)", "Read Noise (Gaussian)", "Color Noise",
+            "Shadow Noise Bias", "Shadow Falloff", "Banding", "Bit Depth", "Firefly Density (%)", "Firefly Intensity", "Firefly Opacity", "Firefly Coloration", "Firefly Spread")}
         for i, (name, params) in enumerate(slider_params.items()):
             ttk.Label(sliders_frame, text=name).grid(row=i, column=0, sticky="w", padx=5)
             slider = ttk.Scale(sliders_frame, from_=params[0], to=params[1], orient=tk.HORIZONTAL, command=self.on_slider_drag); slider.set(self.slider_defaults[name]); slider.grid(row=i, column=1, sticky="ew", padx=5, pady=2)
             slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders[name] = slider
+        ttk.Label(sliders_frame, text="Banding Direction").grid(row=len(slider_params), column=0, sticky="w", padx=5)
+        self.banding_mode_var = tk.StringVar(); self.banding_mode_combo = ttk.Combobox(sliders_frame, textvariable=self.banding_mode_var, state="readonly", values=BANDING_MODES); self.banding_mode_combo.set(BANDING_MODES[0]); self.banding_mode_combo.grid(row=len(slider_params), column=1, sticky="ew", padx=5, pady=2); self.banding_mode_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        ttk.Label(sliders_frame, text="Grain Upscale").grid(row=len(slider_params) + 1, column=0, sticky="w", padx=5)
+        self.upscale_kernel_var = tk.StringVar(); self.upscale_kernel_combo = ttk.Combobox(sliders_frame, textvariable=self.upscale_kernel_var, state="readonly", values=UPSCALE_KERNELS); self.upscale_kernel_combo.set(UPSCALE_KERNELS[0]); self.upscale_kernel_combo.grid(row=len(slider_params) + 1, column=1, sticky="ew", padx=5, pady=2); self.upscale_kernel_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.upscale_kernel_combo, "How grain cells larger than a pixel are filled in.\nNearest: square cells, as in earlier versions. Bilinear / Bicubic: smooth, rounder grain of the same strength.")
+        ttk.Label(sliders_frame, text="Grain Engine").grid(row=len(slider_params) + 2, column=0, sticky="w", padx=5)
+        self.grain_engine_var = tk.StringVar(); self.grain_engine_combo = ttk.Combobox(sliders_frame, textvariable=self.grain_engine_var, state="readonly", values=GRAIN_ENGINES); self.grain_engine_combo.set(GRAIN_ENGINES[0]); self.grain_engine_combo.grid(row=len(slider_params) + 2, column=1, sticky="ew", padx=5, pady=2); self.grain_engine_combo.bind("<<ComboboxSelected>>", self.on_grain_engine_change)
+        Tooltip(self.grain_engine_combo, "Cells: one random value per grain cell, expanded to pixels (whole-pixel sizes).\nSpectral: white noise shaped in the frequency domain – any grain size, stretched or turned with Grain Aspect / Angle.")
+        ttk.Label(sliders_frame, text="Grain Spectrum").grid(row=len(slider_params) + 3, column=0, sticky="w", padx=5)
+        self.grain_spectrum_var = tk.StringVar(); self.grain_spectrum_combo = ttk.Combobox(sliders_frame, textvariable=self.grain_spectrum_var, state="disabled", values=GRAIN_SPECTRA); self.grain_spectrum_combo.set(GRAIN_SPECTRA[0]); self.grain_spectrum_combo.grid(row=len(slider_params) + 3, column=1, sticky="ew", padx=5, pady=2); self.grain_spectrum_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.grain_spectrum_combo, "Spectral engine grain shape.\nFilm: clumpy grain with fine detail, like silver-halide film. Gaussian: soft, round grain.")
         
         Tooltip(self.sliders["Shadow Noise Bias"], "Increases noise intensity in the darkest areas of the image.")
+        Tooltip(self.sliders["Grain Aspect"], "Spectral engine: grain width relative to its height (1 = round).")
+        Tooltip(self.sliders["Grain Angle"], "Spectral engine: turns stretched grain by this many degrees.")
         Tooltip(self.sliders["Shadow Falloff"], "Controls how tightly noise is concentrated in shadows.\nHigher values create a much faster, harsher falloff.")
         Tooltip(self.sliders["Firefly Opacity"], "Controls the final visibility of the fireflies.")
+        Tooltip(self.sliders["Firefly Spread"], "Spreads each firefly's energy over a soft spot of this radius (in pixels) instead of a single pixel.")
 
         sliders_frame.columnconfigure(1, weight=1)
         self.sliders["Shadow Noise Bias"].config(state="disabled")
         self.sliders["Shadow Falloff"].config(state="disabled")
+        self.sliders["Grain Aspect"].config(state="disabled")
+        self.sliders["Grain Angle"].config(state="disabled")
 
         post_process_frame = ttk.LabelFrame(self.control_frame, text="Post-Processing"); post_process_frame.pack(fill=tk.X, pady=5)
         ttk.Label(post_process_frame, text="Bloom / Crush").grid(row=0, column=0, sticky="w", padx=5)
-        bloom_crush_slider = ttk.Scale(post_process_frame, from_=-10, to=10, orient=tk.HORIZONTAL, command=self.on_slider_drag); bloom_crush_slider.set(self.slider_defaults["Bloom / Crush"]); bloom_crush_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); bloom_crush_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Bloom / Crush"] = bloom_crush_slider
+        bloom_crush_slider = ttk.Scale(post_process_frame, from_=SLIDER_RANGES["Bloom / Crush"][0], to=SLIDER_RANGES["Bloom / Crush"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); bloom_crush_slider.set(self.slider_defaults["Bloom / Crush"]); bloom_crush_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); bloom_crush_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Bloom / Crush"] = bloom_crush_slider
         ttk.Label(post_process_frame, text="Strength (%)").grid(row=1, column=0, sticky="w", padx=5)
-        bc_strength_slider = ttk.Scale(post_process_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); bc_strength_slider.set(self.slider_defaults["Bloom / Crush Strength"]); bc_strength_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); bc_strength_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Bloom / Crush Strength"] = bc_strength_slider
+        bc_strength_slider = ttk.Scale(post_process_frame, from_=SLIDER_RANGES["Bloom / Crush Strength"][0], to=SLIDER_RANGES["Bloom / Crush Strength"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); bc_strength_slider.set(self.slider_defaults["Bloom / Crush Strength"]); bc_strength_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); bc_strength_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Bloom / Crush Strength"] = bc_strength_slider
         ttk.Label(post_process_frame, text="Denoise Mode:").grid(row=2, column=0, sticky="w", padx=5, pady=2)
         self.denoise_mode_var = tk.StringVar(); self.denoise_mode_combo = ttk.Combobox(post_process_frame, textvariable=self.denoise_mode_var, state="readonly", values=["Photographic (NL-Means)", "Edge-Aware Smooth"]); self.denoise_mode_combo.set("Photographic (NL-Means)"); self.denoise_mode_combo.grid(row=2, column=1, sticky="ew", padx=5, pady=2); self.denoise_mode_combo.bind("<<ComboboxSelected>>", self.on_denoise_mode_change)
         self.denoise_label_1 = ttk.Label(post_process_frame, text="Denoise Strength"); self.denoise_label_1.grid(row=3, column=0, sticky="w", padx=5)
-        denoise_slider_1 = ttk.Scale(post_process_frame, from_=0, to=30, orient=tk.HORIZONTAL, command=self.on_slider_drag); denoise_slider_1.set(self.slider_defaults["Denoise Param 1"]); denoise_slider_1.grid(row=3, column=1, sticky="ew", padx=5, pady=2); denoise_slider_1.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Denoise Param 1"] = denoise_slider_1
+        denoise_slider_1 = ttk.Scale(post_process_frame, from_=SLIDER_RANGES["Denoise Param 1"][0], to=SLIDER_RANGES["Denoise Param 1"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); denoise_slider_1.set(self.slider_defaults["Denoise Param 1"]); denoise_slider_1.grid(row=3, column=1, sticky="ew", padx=5, pady=2); denoise_slider_1.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Denoise Param 1"] = denoise_slider_1
         self.denoise_label_2 = ttk.Label(post_process_frame, text="Detail Preservation"); self.denoise_label_2.grid(row=4, column=0, sticky="w", padx=5)
-        denoise_slider_2 = ttk.Scale(post_process_frame, from_=0, to=30, orient=tk.HORIZONTAL, command=self.on_slider_drag); denoise_slider_2.set(self.slider_defaults["Denoise Param 2"]); denoise_slider_2.grid(row=4, column=1, sticky="ew", padx=5, pady=2); denoise_slider_2.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Denoise Param 2"] = denoise_slider_2
+        denoise_slider_2 = ttk.Scale(post_process_frame, from_=SLIDER_RANGES["Denoise Param 2"][0], to=SLIDER_RANGES["Denoise Param 2"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); denoise_slider_2.set(self.slider_defaults["Denoise Param 2"]); denoise_slider_2.grid(row=4, column=1, sticky="ew", padx=5, pady=2); denoise_slider_2.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Denoise Param 2"] = denoise_slider_2
         ttk.Label(post_process_frame, text="Mix (%)").grid(row=5, column=0, sticky="w", padx=5)
-        mix_slider = ttk.Scale(post_process_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); mix_slider.set(self.slider_defaults["Mix"]); mix_slider.grid(row=5, column=1, sticky="ew", padx=5, pady=2); mix_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Mix"] = mix_slider
+        mix_slider = ttk.Scale(post_process_frame, from_=SLIDER_RANGES["Mix"][0], to=SLIDER_RANGES["Mix"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); mix_slider.set(self.slider_defaults["Mix"]); mix_slider.grid(row=5, column=1, sticky="ew", padx=5, pady=2); mix_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Mix"] = mix_slider
         post_process_frame.columnconfigure(1, weight=1)
 
         optical_frame = ttk.LabelFrame(self.control_frame, text="Optical Effects")
         optical_frame.pack(fill=tk.X, pady=5)
         ttk.Label(optical_frame, text="Soften Amount").grid(row=0, column=0, sticky="w", padx=5)
-        sa_slider = ttk.Scale(optical_frame, from_=0, to=25, orient=tk.HORIZONTAL, command=self.on_slider_drag); sa_slider.set(self.slider_defaults["Soften Amount"]); sa_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); sa_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Soften Amount"] = sa_slider
+        sa_slider = ttk.Scale(optical_frame, from_=SLIDER_RANGES["Soften Amount"][0], to=SLIDER_RANGES["Soften Amount"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); sa_slider.set(self.slider_defaults["Soften Amount"]); sa_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); sa_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Soften Amount"] = sa_slider
         Tooltip(sa_slider, "Controls the radius/size of the softening blur.")
         ttk.Label(optical_frame, text="Soften Mix (%)").grid(row=1, column=0, sticky="w", padx=5)
-        sm_slider = ttk.Scale(optical_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); sm_slider.set(self.slider_defaults["Soften Mix"]); sm_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); sm_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Soften Mix"] = sm_slider
+        sm_slider = ttk.Scale(optical_frame, from_=SLIDER_RANGES["Soften Mix"][0], to=SLIDER_RANGES["Soften Mix"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); sm_slider.set(self.slider_defaults["Soften Mix"]); sm_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); sm_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Soften Mix"] = sm_slider
         Tooltip(sm_slider, "Controls the opacity/strength of the softening effect.")
         ttk.Label(optical_frame, text="Glow Amount (%)").grid(row=2, column=0, sticky="w", padx=5)
-        ga_slider = ttk.Scale(optical_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); ga_slider.set(self.slider_defaults["Glow Amount"]); ga_slider.grid(row=2, column=1, sticky="ew", padx=5, pady=2); ga_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Glow Amount"] = ga_slider
+        ga_slider = ttk.Scale(optical_frame, from_=SLIDER_RANGES["Glow Amount"][0], to=SLIDER_RANGES["Glow Amount"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); ga_slider.set(self.slider_defaults["Glow Amount"]); ga_slider.grid(row=2, column=1, sticky="ew", padx=5, pady=2); ga_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Glow Amount"] = ga_slider
         Tooltip(ga_slider, "Overall strength of the halation/glow effect.")
         ttk.Label(optical_frame, text="Glow Radius").grid(row=3, column=0, sticky="w", padx=5)
-        gr_slider = ttk.Scale(optical_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); gr_slider.set(self.slider_defaults["Glow Radius"]); gr_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2); gr_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Glow Radius"] = gr_slider
+        gr_slider = ttk.Scale(optical_frame, from_=SLIDER_RANGES["Glow Radius"][0], to=SLIDER_RANGES["Glow Radius"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); gr_slider.set(self.slider_defaults["Glow Radius"]); gr_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2); gr_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Glow Radius"] = gr_slider
         Tooltip(gr_slider, "How far the glow spreads from the highlights.")
         ttk.Label(optical_frame, text="Glow Threshold").grid(row=4, column=0, sticky="w", padx=5)
-        gt_slider = ttk.Scale(optical_frame, from_=50, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); gt_slider.set(self.slider_defaults["Glow Threshold"]); gt_slider.grid(row=4, column=1, sticky="ew", padx=5, pady=2); gt_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Glow Threshold"] = gt_slider
+        gt_slider = ttk.Scale(optical_frame, from_=SLIDER_RANGES["Glow Threshold"][0], to=SLIDER_RANGES["Glow Threshold"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); gt_slider.set(self.slider_defaults["Glow Threshold"]); gt_slider.grid(row=4, column=1, sticky="ew", padx=5, pady=2); gt_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Glow Threshold"] = gt_slider
         Tooltip(gt_slider, "The brightness level required for a pixel to start glowing.\n(100 = only the absolute brightest pixels will glow).")
+        ttk.Label(optical_frame, text="Glow Halation (%)").grid(row=5, column=0, sticky="w", padx=5)
+        gh_slider = ttk.Scale(optical_frame, from_=SLIDER_RANGES["Glow Halation"][0], to=SLIDER_RANGES["Glow Halation"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); gh_slider.set(self.slider_defaults["Glow Halation"]); gh_slider.grid(row=5, column=1, sticky="ew", padx=5, pady=2); gh_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Glow Halation"] = gh_slider
+        Tooltip(gh_slider, "Film-style halation: widens the glow per channel, red up to twice the radius, green up to 1.5x, blue unchanged.")
+        ttk.Label(optical_frame, text="Glow Engine").grid(row=6, column=0, sticky="w", padx=5)
+        self.glow_engine_var = tk.StringVar(); self.glow_engine_combo = ttk.Combobox(optical_frame, textvariable=self.glow_engine_var, state="readonly", values=GLOW_ENGINES); self.glow_engine_combo.set("Pyramid"); self.glow_engine_combo.grid(row=6, column=1, sticky="ew", padx=5, pady=2); self.glow_engine_combo.bind("<<ComboboxSelected>>", self.update_noise)
+        Tooltip(self.glow_engine_combo, "Pyramid: blurs the highlights at reduced resolution, so large radii stay fast.\nGaussian: one full-resolution blur, matching earlier versions exactly.")
         optical_frame.columnconfigure(1, weight=1)
         
         texture_frame = ttk.LabelFrame(self.control_frame, text="Texture & Clarity"); texture_frame.pack(fill=tk.X, pady=5)
         ttk.Label(texture_frame, text="Micro-contrast").grid(row=0, column=0, sticky="w", padx=5)
-        micro_contrast_slider = ttk.Scale(texture_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); micro_contrast_slider.set(self.slider_defaults["Micro-contrast"]); micro_contrast_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); micro_contrast_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Micro-contrast"] = micro_contrast_slider
+        micro_contrast_slider = ttk.Scale(texture_frame, from_=SLIDER_RANGES["Micro-contrast"][0], to=SLIDER_RANGES["Micro-contrast"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); micro_contrast_slider.set(self.slider_defaults["Micro-contrast"]); micro_contrast_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); micro_contrast_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Micro-contrast"] = micro_contrast_slider
         ttk.Label(texture_frame, text="Texture Variation").grid(row=1, column=0, sticky="w", padx=5)
-        texture_var_slider = ttk.Scale(texture_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); texture_var_slider.set(self.slider_defaults["Texture Variation"]); texture_var_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); texture_var_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Texture Variation"] = texture_var_slider
+        texture_var_slider = ttk.Scale(texture_frame, from_=SLIDER_RANGES["Texture Variation"][0], to=SLIDER_RANGES["Texture Variation"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); texture_var_slider.set(self.slider_defaults["Texture Variation"]); texture_var_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); texture_var_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Texture Variation"] = texture_var_slider
         texture_frame.columnconfigure(1, weight=1)
         
         tone_frame = ttk.LabelFrame(self.control_frame, text="Tone, Contrast & Color"); tone_frame.pack(fill=tk.X, pady=5)
         ttk.Label(tone_frame, text="Saturation").grid(row=0, column=0, sticky="w", padx=5)
-        saturation_slider = ttk.Scale(tone_frame, from_=-100, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); saturation_slider.set(self.slider_defaults["Saturation"]); saturation_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); saturation_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Saturation"] = saturation_slider
+        saturation_slider = ttk.Scale(tone_frame, from_=SLIDER_RANGES["Saturation"][0], to=SLIDER_RANGES["Saturation"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); saturation_slider.set(self.slider_defaults["Saturation"]); saturation_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); saturation_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Saturation"] = saturation_slider
         ttk.Label(tone_frame, text="Filmic Saturation").grid(row=1, column=0, sticky="w", padx=5)
-        filmic_sat_slider = ttk.Scale(tone_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); filmic_sat_slider.set(self.slider_defaults["Filmic Saturation"]); filmic_sat_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); filmic_sat_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Filmic Saturation"] = filmic_sat_slider
+        filmic_sat_slider = ttk.Scale(tone_frame, from_=SLIDER_RANGES["Filmic Saturation"][0], to=SLIDER_RANGES["Filmic Saturation"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); filmic_sat_slider.set(self.slider_defaults["Filmic Saturation"]); filmic_sat_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); filmic_sat_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Filmic Saturation"] = filmic_sat_slider
         ttk.Label(tone_frame, text="Lift (Shadows)").grid(row=2, column=0, sticky="w", padx=5)
-        lift_slider = ttk.Scale(tone_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); lift_slider.set(self.slider_defaults["Lift"]); lift_slider.grid(row=2, column=1, sticky="ew", padx=5, pady=2); lift_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Lift"] = lift_slider
+        lift_slider = ttk.Scale(tone_frame, from_=SLIDER_RANGES["Lift"][0], to=SLIDER_RANGES["Lift"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); lift_slider.set(self.slider_defaults["Lift"]); lift_slider.grid(row=2, column=1, sticky="ew", padx=5, pady=2); lift_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Lift"] = lift_slider
         ttk.Label(tone_frame, text="Roll-off (Highlights)").grid(row=3, column=0, sticky="w", padx=5)
-        rolloff_slider = ttk.Scale(tone_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); rolloff_slider.set(self.slider_defaults["Roll-off"]); rolloff_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2); rolloff_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Roll-off"] = rolloff_slider
+        rolloff_slider = ttk.Scale(tone_frame, from_=SLIDER_RANGES["Roll-off"][0], to=SLIDER_RANGES["Roll-off"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); rolloff_slider.set(self.slider_defaults["Roll-off"]); rolloff_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2); rolloff_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Roll-off"] = rolloff_slider
         ttk.Label(tone_frame, text="Contrast").grid(row=4, column=0, sticky="w", padx=5)
-        contrast_slider = ttk.Scale(tone_frame, from_=-100, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); contrast_slider.set(self.slider_defaults["Contrast"]); contrast_slider.grid(row=4, column=1, sticky="ew", padx=5, pady=2); contrast_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Contrast"] = contrast_slider
+        contrast_slider = ttk.Scale(tone_frame, from_=SLIDER_RANGES["Contrast"][0], to=SLIDER_RANGES["Contrast"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); contrast_slider.set(self.slider_defaults["Contrast"]); contrast_slider.grid(row=4, column=1, sticky="ew", padx=5, pady=2); contrast_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Contrast"] = contrast_slider
         tone_frame.columnconfigure(1, weight=1)
 
         overlay_frame = ttk.LabelFrame(self.control_frame, text="Overlays & Effects")
         overlay_frame.pack(fill=tk.X, pady=5)
         ttk.Label(overlay_frame, text="Diamond Grid Opacity").grid(row=0, column=0, sticky="w", padx=5)
-        dgo_slider = ttk.Scale(overlay_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); dgo_slider.set(self.slider_defaults["Diamond Grid Opacity"]); dgo_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); dgo_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Grid Opacity"] = dgo_slider
+        dgo_slider = ttk.Scale(overlay_frame, from_=SLIDER_RANGES["Diamond Grid Opacity"][0], to=SLIDER_RANGES["Diamond Grid Opacity"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); dgo_slider.set(self.slider_defaults["Diamond Grid Opacity"]); dgo_slider.grid(row=0, column=1, sticky="ew", padx=5, pady=2); dgo_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Grid Opacity"] = dgo_slider
         ttk.Label(overlay_frame, text="Diamond Grid Size").grid(row=1, column=0, sticky="w", padx=5)
-        dgs_slider = ttk.Scale(overlay_frame, from_=2, to=64, orient=tk.HORIZONTAL, command=self.on_slider_drag); dgs_slider.set(self.slider_defaults["Diamond Grid Size"]); dgs_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); dgs_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Grid Size"] = dgs_slider
+        dgs_slider = ttk.Scale(overlay_frame, from_=SLIDER_RANGES["Diamond Grid Size"][0], to=SLIDER_RANGES["Diamond Grid Size"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); dgs_slider.set(self.slider_defaults["Diamond Grid Size"]); dgs_slider.grid(row=1, column=1, sticky="ew", padx=5, pady=2); dgs_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Grid Size"] = dgs_slider
         ttk.Label(overlay_frame, text="Diamond Edge Softness").grid(row=2, column=0, sticky="w", padx=5)
-        des_slider = ttk.Scale(overlay_frame, from_=0, to=25, orient=tk.HORIZONTAL, command=self.on_slider_drag); des_slider.set(self.slider_defaults["Diamond Edge Softness"]); des_slider.grid(row=2, column=1, sticky="ew", padx=5, pady=2); des_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Edge Softness"] = des_slider
+        des_slider = ttk.Scale(overlay_frame, from_=SLIDER_RANGES["Diamond Edge Softness"][0], to=SLIDER_RANGES["Diamond Edge Softness"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); des_slider.set(self.slider_defaults["Diamond Edge Softness"]); des_slider.grid(row=2, column=1, sticky="ew", padx=5, pady=2); des_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Edge Softness"] = des_slider
         ttk.Label(overlay_frame, text="Diamond Color Count").grid(row=3, column=0, sticky="w", padx=5)
-        dcc_slider = ttk.Scale(overlay_frame, from_=2, to=8, orient=tk.HORIZONTAL, command=self.on_slider_drag); dcc_slider.set(self.slider_defaults["Diamond Color Count"]); dcc_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2); dcc_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Color Count"] = dcc_slider
+        dcc_slider = ttk.Scale(overlay_frame, from_=SLIDER_RANGES["Diamond Color Count"][0], to=SLIDER_RANGES["Diamond Color Count"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); dcc_slider.set(self.slider_defaults["Diamond Color Count"]); dcc_slider.grid(row=3, column=1, sticky="ew", padx=5, pady=2); dcc_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Color Count"] = dcc_slider
         ttk.Label(overlay_frame, text="Diamond Color Saturation").grid(row=4, column=0, sticky="w", padx=5)
-        dcs_slider = ttk.Scale(overlay_frame, from_=0, to=100, orient=tk.HORIZONTAL, command=self.on_slider_drag); dcs_slider.set(self.slider_defaults["Diamond Color Saturation"]); dcs_slider.grid(row=4, column=1, sticky="ew", padx=5, pady=2); dcs_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Color Saturation"] = dcs_slider
+        dcs_slider = ttk.Scale(overlay_frame, from_=SLIDER_RANGES["Diamond Color Saturation"][0], to=SLIDER_RANGES["Diamond Color Saturation"][1], orient=tk.HORIZONTAL, command=self.on_slider_drag); dcs_slider.set(self.slider_defaults["Diamond Color Saturation"]); dcs_slider.grid(row=4, column=1, sticky="ew", padx=5, pady=2); dcs_slider.bind("<ButtonRelease-1>", self.on_slider_release); self.sliders["Diamond Color Saturation"] = dcs_slider
         overlay_frame.columnconfigure(1, weight=1)
 
         ttk.Button(self.control_frame, text="Reset All Settings", command=self.reset_all_sliders).pack(fill=tk.X, pady=(10,5))
@@ -332,6 +365,8 @@ class OrganicGrainGeneratorApp:
 
         self.zoom_button = ttk.Button(view_save_frame, text="Show Detail View", command=self.toggle_zoom_window); self.zoom_button.pack(fill=tk.X, padx=5, pady=(0,5))
         ttk.Button(view_save_frame, text="Save Single Image", command=self.save_image).pack(fill=tk.X, padx=5)
+        ttk.Button(view_save_frame, text="Save Preset...", command=self.save_preset).pack(fill=tk.X, padx=5, pady=(5,0))
+        ttk.Button(view_save_frame, text="Load Preset...", command=self.load_preset).pack(fill=tk.X, padx=5, pady=(2,5))
 
         export_frame = ttk.LabelFrame(self.control_frame, text="Sequence Export"); export_frame.pack(fill=tk.X, pady=5)
         ttk.Label(export_frame, text="Export Mode:").grid(row=0, column=0, padx=5, pady=3, sticky="w")
@@ -342,19 +377,31 @@ class OrganicGrainGeneratorApp:
         self.start_frame_var = tk.StringVar(value="1001"); ttk.Entry(export_frame, textvariable=self.start_frame_var, width=8).grid(row=2, column=1, padx=5, pady=2)
         ttk.Label(export_frame, text="End:").grid(row=2, column=2, padx=5, pady=2, sticky="w")
         self.end_frame_var = tk.StringVar(value="1010"); ttk.Entry(export_frame, textvariable=self.end_frame_var, width=8).grid(row=2, column=3, padx=5, pady=2)
-        self.export_button = ttk.Button(export_frame, text="Export Sequence", command=self.export_sequence); self.export_button.grid(row=3, column=0, columnspan=4, pady=5, sticky="ew")
-        self.progress_bar = ttk.Progressbar(export_frame, orient="horizontal", mode="determinate"); self.progress_bar.grid(row=4, column=0, columnspan=4, pady=(5,0), sticky="ew")
+        ttk.Label(export_frame, text="Workers:").grid(row=3, column=0, padx=5, pady=2, sticky="w")
+        self.workers_var = tk.StringVar(value=str(default_worker_count())); workers_entry = ttk.Entry(export_frame, textvariable=self.workers_var, width=8); workers_entry.grid(row=3, column=1, padx=5, pady=2)
+        self.resume_export_var = tk.BooleanVar(value=False); resume_check = ttk.Checkbutton(export_frame, text="Resume", variable=self.resume_export_var); resume_check.grid(row=3, column=2, columnspan=2, padx=5, pady=2, sticky="w")
+        Tooltip(workers_entry, "Number of processes rendering frames in parallel.")
+        Tooltip(resume_check, "Skip frames that already exist in the output folder.")
+        ttk.Label(export_frame, text="Format:").grid(row=4, column=0, padx=5, pady=2, sticky="w")
+        self.file_format_var = tk.StringVar(); file_format_combo = ttk.Combobox(export_frame, textvariable=self.file_format_var, state="readonly", width=10, values=FILE_FORMATS); file_format_combo.set(FILE_FORMATS[0]); file_format_combo.grid(row=4, column=1, padx=5, pady=2, sticky="w")
+        self.sixteen_bit_var = tk.BooleanVar(value=False); sixteen_bit_check = ttk.Checkbutton(export_frame, text="16-bit", variable=self.sixteen_bit_var); sixteen_bit_check.grid(row=4, column=2, columnspan=2, padx=5, pady=2, sticky="w")
+        ttk.Label(export_frame, text="PNG Level:").grid(row=5, column=0, padx=5, pady=2, sticky="w")
+        self.png_compression_var = tk.StringVar(value=str(DEFAULT_PNG_COMPRESSION)); png_level_entry = ttk.Entry(export_frame, textvariable=self.png_compression_var, width=8); png_level_entry.grid(row=5, column=1, padx=5, pady=2)
+        Tooltip(file_format_combo, "PNG or TIFF frames, or NPY Stack: every frame in one {prefix}.npy array that other tools can memory-map without decoding.")
+        Tooltip(sixteen_bit_check, "Write 16 bits per channel. With Float precision this keeps the levels between 8-bit steps.")
+        Tooltip(png_level_entry, "PNG compression, 0-9: lower levels write faster but produce larger files.")
+        self.write_trace_var = tk.BooleanVar(value=False); trace_check = ttk.Checkbutton(export_frame, text="Write Trace", variable=self.write_trace_var); trace_check.grid(row=5, column=2, columnspan=2, padx=5, pady=2, sticky="w")
+        Tooltip(trace_check, "Profile every stage of every frame and save a Chrome trace as {prefix}.trace.json in the output folder.")
+        self.export_button = ttk.Button(export_frame, text="Export Sequence", command=self.export_sequence); self.export_button.grid(row=6, column=0, columnspan=4, pady=5, sticky="ew")
+        self.progress_bar = ttk.Progressbar(export_frame, orient="horizontal", mode="determinate"); self.progress_bar.grid(row=7, column=0, columnspan=4, pady=(5,0), sticky="ew")
 
-    def get_rng_for_frame(self, seed_offset=0): return np.random.default_rng(self.get_master_seed() + seed_offset)
     def get_supersample_factor(self):
         try: return max(1, int((self.supersample_var.get() or "").split('x')[0].strip()))
         except: return 1
-    def _overlay_blend(self, background, grain_plate):
-        low_mask = background <= 0.5
-        result = np.zeros_like(background, dtype=np.float32)
-        result[low_mask] = 2 * background[low_mask] * grain_plate[low_mask]
-        result[~low_mask] = 1 - 2 * (1 - background[~low_mask]) * (1 - grain_plate[~low_mask])
-        return result
+
+    def get_grain_bank_size(self):
+        try: return max(0, int(self.grain_bank_var.get()))
+        except: return 0
 
     def _update_cached_luma_array(self):
         if self.background_pil_image:
@@ -362,389 +409,88 @@ class OrganicGrainGeneratorApp:
         else:
             self._cached_luma_arr = None
 
-    def _generate_base_image(self, seed_offset=0, composite=True):
-        luma_mask = None
-        shadow_bias_strength = self.sliders["Shadow Noise Bias"].get() if self._cached_luma_arr is not None else 0.0
-        
-        if self._cached_luma_arr is not None and shadow_bias_strength > 0:
-            luma_map = self._cached_luma_arr
-            shadow_map = 1.0 - luma_map
-            
-            falloff_curve = self.sliders["Shadow Falloff"].get()
-            curved_shadow_map = shadow_map ** falloff_curve
-            
-            noise_multiplier = curved_shadow_map * float(shadow_bias_strength)
-            
-            luma_mask = np.clip(1.0 + noise_multiplier, 1.0, 4.0)
-
-        factor = self.get_supersample_factor()
-        render_width, render_height = self.width * factor, self.height * factor
-
-        if luma_mask is not None and factor > 1:
-            lm_img = Image.fromarray(luma_mask.astype(np.float32)).resize((render_width, render_height), resample=resampling.BILINEAR)
-            luma_mask = np.array(lm_img)
-
-        grain_plate_arr = self._generate_grain_plate(render_width, render_height, seed_offset, luma_mask)
-        if factor > 1:
-            grain_plate_arr = np.array(Image.fromarray(grain_plate_arr).resize((self.width, self.height), resample=resampling.LANCZOS))
-        
-        return grain_plate_arr
-
-    def _resize_noise_array(self, noise_array, target_w, target_h):
-        min_val, max_val = noise_array.min(), noise_array.max()
-        if max_val == min_val: return np.full((target_h, target_w), min_val, dtype=np.float32)
-        
-        offset_noise = noise_array - min_val
-        scaled_noise = (offset_noise / (max_val - min_val) * 255.0).astype(np.uint8)
-        
-        img = Image.fromarray(scaled_noise).resize((target_w, target_h), resample=resampling.NEAREST)
-        
-        original_range = max_val - min_val
-        resized_float = (np.array(img).astype(np.float32) / 255.0) * original_range + min_val
-        return resized_float
-
-    def _generate_grain_plate(self, width, height, seed_offset, luma_mask=None):
-        rng = self.get_rng_for_frame(seed_offset)
-        prnu_map, dsnu_map, banding_map, _ = self._get_fixed_maps_for_resolution(width, height)
-        luma_image = np.full((height, width), 128.0, dtype=np.float32)
-        luma_image *= (1.0 + (prnu_map - 1.0) * self.sliders["PRNU (Gain FPN)"].get())
-        luma_image += dsnu_map * self.sliders["DSNU (Offset FPN)"].get()
-        
-        grain_size = int(round(self.sliders["Grain Size"].get()))
-        scaled_w, scaled_h = max(1, width // grain_size), max(1, height // grain_size)
-
-        if (strength := self.sliders["Shot Noise (Poisson)"].get()) > 0:
-            small_noise = ((rng.poisson(25.0, (scaled_h, scaled_w)).astype(np.float32) / 50.0) * 255.0 - 128.0) * (strength / 5.0)
-            shot_noise = self._resize_noise_array(small_noise, width, height)
-            if luma_mask is not None: shot_noise *= luma_mask
-            luma_image += shot_noise
-
-        if (strength := self.sliders["Read Noise (Gaussian)"].get()) > 0:
-            small_noise = rng.normal(0, 1, (scaled_h, scaled_w)).astype(np.float32) * strength
-            read_noise = self._resize_noise_array(small_noise, width, height)
-            if luma_mask is not None: read_noise *= luma_mask
-            luma_image += read_noise
-
-        luma_image += banding_map * 255 * self.sliders["Banding"].get()
-        final_image = np.stack([luma_image] * 3, axis=-1)
-
-        if (strength := self.sliders["Color Noise"].get()) > 0:
-            small_noise = rng.normal(0.0, 1.0, (scaled_h, scaled_w, 3)).astype(np.float32) * strength
-            color_noise_map = np.stack([
-                self._resize_noise_array(small_noise[:,:,0], width, height),
-                self._resize_noise_array(small_noise[:,:,1], width, height),
-                self._resize_noise_array(small_noise[:,:,2], width, height)
-            ], axis=-1)
-            if luma_mask is not None: color_noise_map *= np.expand_dims(luma_mask, axis=-1)
-            final_image += color_noise_map
-
-        if (density := self.sliders["Firefly Density (%)"].get() / 100.0) > 0:
-            intensity = self.sliders["Firefly Intensity"].get()
-            opacity = self.sliders["Firefly Opacity"].get() / 100.0
-            coloration = self.sliders["Firefly Coloration"].get()
-
-            if intensity > 0 and opacity > 0 and (num := int(width*height*density)) > 0:
-                y, x = rng.integers(0, height, num), rng.integers(0, width, num)
-                
-                brightness = rng.uniform(0.5, 1.0, (num, 1))
-                gray_base = np.repeat(brightness, 3, axis=1)
-                random_color = rng.random((num, 3))
-                colored_base = np.clip(gray_base * (1.0 - coloration) + random_color * coloration, 0.0, 1.0)
-                firefly_values = colored_base * intensity * opacity
-                
-                current_pixels = final_image[y, x, :].astype(np.float32)
-                final_image[y, x, :] = np.clip(current_pixels + firefly_values, 0, 255).astype(np.uint8)
-
-        if (bit_depth := int(self.sliders["Bit Depth"].get())) < 8:
-            levels = 2**bit_depth; final_image = np.round(final_image / 255 * (levels-1)) * (255 / (levels-1))
-        return np.clip(final_image, 0, 255).astype(np.uint8)
-
-    def _get_fixed_maps_for_resolution(self, width, height):
-        res_key = f"{width}x{height}"
-        if res_key in self._cached_fixed_maps: return self._cached_fixed_maps[res_key]
-        
-        rng = self.get_rng_for_frame(0)
-        prnu = 1.0 + (rng.standard_normal((height, width), np.float32) * 0.02)
-        dsnu = rng.standard_normal((height, width), np.float32)
-        
-        perlin_legacy = PerlinNoise(octaves=6, seed=self.get_master_seed())
-        banding = np.tile(np.array([perlin_legacy(y) for y in np.linspace(0, 5, height)], np.float32)[:, None], (1, width))
-
-        rng_texture = np.random.default_rng(self.get_master_seed() + 1)
-        small_w, small_h = max(1, width // 64), max(1, height // 64)
-        random_map = rng_texture.random((small_h, small_w)).astype(np.float32)
-        
-        blurred_map = cv2.GaussianBlur(random_map, (0,0), sigmaX=16, sigmaY=16, borderType=cv2.BORDER_REFLECT)
-        
-        texture_map_pil = Image.fromarray(blurred_map).resize((width, height), resample=resampling.BILINEAR)
-        texture_map = np.array(texture_map_pil)
-        texture_map = (texture_map - texture_map.min()) / (texture_map.max() - texture_map.min())
-        
-        self._cached_fixed_maps[res_key] = (prnu, dsnu, banding, texture_map)
-        return self._cached_fixed_maps[res_key]
-    
-    def _update_noise_worker(self):
-        processed_image = self._get_processed_image()
-        self.master.after(0, self._update_noise_complete, processed_image)
-
-    def _update_noise_complete(self, processed_image):
-        self.processed_pil_image = processed_image
-        self.on_toggle_original()
-
+    def _snapshot_params(self):
+        return GrainParams(width=self.width, height=self.height, seed=self.get_master_seed(),
+                           supersample=self.get_supersample_factor(), supersample_mode=self.supersample_mode_var.get(), denoise_mode=self.denoise_mode_var.get(),
+                           sliders={name: slider.get() for name, slider in self.sliders.items()}, rng_mode=self.rng_mode_var.get(),
+                           banding_mode=self.banding_mode_var.get(), precision=self.precision_var.get(), upscale_kernel=self.upscale_kernel_var.get(),
+                           blend_mode=self.blend_mode_var.get(), glow_engine=self.glow_engine_var.get(),
+                           grain_engine=self.grain_engine_var.get(), grain_spectrum=self.grain_spectrum_var.get(), grain_bank=self.get_grain_bank_size())
+
+    def _make_renderer(self, params=None, preview=True, cancelled=None, profiler=None):
+        return GrainRenderer(params or self._snapshot_params(), self.background_pil_image, self._cached_luma_arr, self._fixed_map_cache,
+                             stage_cache=self._stage_cache if preview else None, cancelled=cancelled, profiler=profiler)
+
+    def _request_render(self, proxy_scale=None, show_progress=False, draft=False, region_only=False):
+        """Queues a preview render (a proxy when ``proxy_scale`` is given, with approximate denoise when ``draft``), superseding any render still queued or running.
+
+        The Detail View shows exact full-resolution pixels, so while the main
+        view gets a proxy or draft (or nothing, with ``region_only``) the job
+        also renders the region the Detail View shows.
+        """
+        params = self._snapshot_params()
+        box = self._detail_view_box(self.width, self.height) if self._detail_view_renders() and (proxy_scale or draft or region_only) else None
+        def job(cancelled):
+            profiler, image, region = StageProfiler(), None, None
+            if not region_only:
+                renderer = self._make_renderer(params, cancelled=cancelled, profiler=profiler)
+                renderer.approximate_denoise = draft
+                image = (renderer.proxy(proxy_scale) if proxy_scale else renderer).render()
+            # Renders just the crop the Detail View shows (plus filter halos) instead of the whole frame.
+            if box: region = self._make_renderer(params, cancelled=cancelled, profiler=profiler).render_region(box)
+            return image, proxy_scale is not None or draft, profiler.summary(), region
+        if show_progress:
+            self.update_preview_button.config(state="disabled")
+            self.preview_progress_bar.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(10, 5))
+            self.preview_progress_bar.start()
+        self._scheduler.submit(job)
+
+    def _on_render_result(self, generation, result):
+        if not self._scheduler.is_current(generation): return
+        if result is not None:
+            image, proxy, profile, region = result
+            self.detail_region_image = region
+            if image is None: self.update_zoom_view(region)
+            else:
+                self._set_processed_image(image, proxy)
+                self.profile_label.config(text=profile or "Render: every stage cached")
+                if self._pending_save_path and not proxy: self._save_to(self._pending_save_path, image); self._pending_save_path = None
+        elif self._pending_save_path: logging.error(f"Could not save image to {self._pending_save_path}: the render failed."); self._pending_save_path = None
+        self._end_render_progress()
+
+    def _on_render_cancelled(self):
+        if self._pending_save_path: logging.info(f"Save to {self._pending_save_path} cancelled."); self._pending_save_path = None
+        self._end_render_progress()
+
+    def _end_render_progress(self):
         self.preview_progress_bar.stop()
         self.preview_progress_bar.pack_forget()
         self.update_preview_button.config(state="normal")
 
+    def _set_processed_image(self, image, proxy=False):
+        self.processed_pil_image = image
+        self.proxy_pil_image = image if proxy else None
+        self.on_toggle_original()
+
     def update_noise(self, event=None):
         if self.initializing: return
-        is_realtime = self.realtime_preview_var.get() or self.zoom_window
-        
-        if is_realtime:
-            self.processed_pil_image = self._get_processed_image()
-            self.on_toggle_original()
-        else: 
-            self.update_preview_button.config(state="disabled")
-            self.preview_progress_bar.pack(side=tk.TOP, fill=tk.X, padx=10, pady=(10, 5))
-            self.preview_progress_bar.start()
-            threading.Thread(target=self._update_noise_worker, daemon=True).start()
-
-    def _get_processed_image(self, seed_offset=0, composite=True):
-        if composite and self.background_pil_image:
-            base_image = self.background_pil_image
-        else:
-            base_image = Image.new('RGB', (self.width, self.height), (128, 128, 128))
-
-        image_to_process = self._apply_halation_glow(base_image)
-        image_to_process = self._apply_box_blur(image_to_process)
-
-        grain_plate_arr = self._generate_base_image(seed_offset, composite=False)
-        grain_image = Image.fromarray(grain_plate_arr)
-
-        if composite and self.background_pil_image:
-            bg_arr_float = np.array(image_to_process, dtype=np.float32) / 255.0
-            grain_arr_float = np.array(grain_image.convert('RGB'), dtype=np.float32) / 255.0
-            blended_arr = np.clip(self._overlay_blend(bg_arr_float, grain_arr_float) * 255.0, 0, 255).astype(np.uint8)
-            image_to_process = Image.fromarray(blended_arr)
-        else:
-            image_to_process = grain_image
-
-        bloom_crush_val = self.sliders["Bloom / Crush"].get()
-        strength_percent = self.sliders["Bloom / Crush Strength"].get()
-        if bloom_crush_val != 0 and strength_percent > 0:
-            processed_bc = self._apply_bloom_crush(image_to_process, bloom_crush_val)
-            mix_alpha = strength_percent / 100.0
-            if mix_alpha < 1.0: image_to_process = Image.blend(image_to_process, processed_bc, alpha=mix_alpha)
-            else: image_to_process = processed_bc
-        
-        denoise_strength = self.sliders["Denoise Param 1"].get()
-        if denoise_strength > 0:
-            mode = self.denoise_mode_var.get()
-            denoised_image = None
-            if mode == "Photographic (NL-Means)": denoised_image = self._apply_photographic_denoise(image_to_process)
-            elif mode == "Edge-Aware Smooth": denoised_image = self._apply_edge_aware_denoise(image_to_process)
-            
-            if denoised_image:
-                mix_alpha = self.sliders["Mix"].get() / 100.0
-                if mix_alpha < 1.0: image_to_process = Image.blend(image_to_process, denoised_image, alpha=mix_alpha)
-                else: image_to_process = denoised_image
-        
-        image_to_process = self._apply_micro_contrast(image_to_process)
-        image_to_process = self._apply_saturation(image_to_process)
-        s_curve_lut = self._generate_s_curve_lut()
-        if s_curve_lut is not None:
-            image_to_process = self._apply_lut(image_to_process, s_curve_lut)
-        
-        image_to_process = self._apply_diamond_grid(image_to_process)
-        return image_to_process
-    
-    def _apply_box_blur(self, image_to_process):
-        raw_amount = self.sliders["Soften Amount"].get()
-        mix_alpha = self.sliders["Soften Mix"].get() / 100.0
-
-        if raw_amount == 0 or mix_alpha == 0 or self.background_pil_image is None:
-            return image_to_process
-
-        normalized_amount = raw_amount / 25.0
-        curved_amount = normalized_amount ** 2.0
-        final_amount = int(curved_amount * 25.0)
-
-        if final_amount == 0:
-            return image_to_process
-
-        kernel_size = final_amount * 2 + 1
-        
-        bgr_array = cv2.cvtColor(np.array(image_to_process), cv2.COLOR_RGB2BGR)
-        blurred_bgr = cv2.blur(bgr_array, (kernel_size, kernel_size))
-        blurred_image = Image.fromarray(cv2.cvtColor(blurred_bgr, cv2.COLOR_BGR2RGB))
-
-        return Image.blend(image_to_process, blurred_image, alpha=mix_alpha)
-
-    def _apply_halation_glow(self, image_to_process):
-        amount = self.sliders["Glow Amount"].get() / 100.0
-        if amount == 0 or self.background_pil_image is None:
-            return image_to_process
-
-        radius = int(self.sliders["Glow Radius"].get())
-        threshold = self.sliders["Glow Threshold"].get() / 100.0 * 255.0
-
-        luma_image = image_to_process.convert('L')
-        luma_arr = np.array(luma_image)
-        highlight_mask = (luma_arr > threshold).astype(np.uint8) * 255
-
-        image_arr = np.array(image_to_process)
-        highlights_only_arr = cv2.bitwise_and(image_arr, image_arr, mask=highlight_mask)
-        
-        if radius > 0:
-            kernel_size = radius * 2 + 1
-            blurred_highlights = cv2.GaussianBlur(highlights_only_arr, (kernel_size, kernel_size), 0)
-        else:
-            blurred_highlights = highlights_only_arr
-        
-        base_arr_float = image_arr.astype(np.float32) / 255.0
-        glow_arr_float = blurred_highlights.astype(np.float32) / 255.0
-        
-        screened_arr_float = 1.0 - (1.0 - base_arr_float) * (1.0 - glow_arr_float)
-        
-        glow_image = Image.fromarray((screened_arr_float * 255).astype(np.uint8))
-
-        return Image.blend(image_to_process, glow_image, alpha=amount)
-
-    def _apply_bloom_crush(self, image_to_process, value):
-        bgr_array = cv2.cvtColor(np.array(image_to_process), cv2.COLOR_RGB2BGR)
-        kernel_size = abs(int(value)) * 2 + 1
-        if kernel_size <= 1: return image_to_process
-        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
-        if value > 0: processed_bgr = cv2.dilate(bgr_array, kernel, iterations=1)
-        else: processed_bgr = cv2.erode(bgr_array, kernel, iterations=1)
-        return Image.fromarray(cv2.cvtColor(processed_bgr, cv2.COLOR_BGR2RGB))
-
-    def _apply_photographic_denoise(self, image_to_process):
-        strength = self.sliders["Denoise Param 1"].get()
-        detail = self.sliders["Denoise Param 2"].get()
-        bgr_array = cv2.cvtColor(np.array(image_to_process), cv2.COLOR_RGB2BGR)
-        denoised_bgr = cv2.fastNlMeansDenoisingColored(bgr_array, None, h=strength, hColor=detail, templateWindowSize=7, searchWindowSize=21)
-        return Image.fromarray(cv2.cvtColor(denoised_bgr, cv2.COLOR_BGR2RGB))
-    
-    def _apply_edge_aware_denoise(self, image_to_process):
-        smoothing = int(self.sliders["Denoise Param 1"].get())
-        sharpening = self.sliders["Denoise Param 2"].get() / 20.0
-        image_arr = cv2.cvtColor(np.array(image_to_process), cv2.COLOR_RGB2BGR)
-        smoothed = cv2.bilateralFilter(image_arr, d=-1, sigmaColor=smoothing, sigmaSpace=15)
-        if sharpening > 0:
-            gaussian = cv2.GaussianBlur(smoothed, (0, 0), 3)
-            sharpened = cv2.addWeighted(smoothed, 1.0 + sharpening, gaussian, -sharpening, 0)
-            return Image.fromarray(cv2.cvtColor(sharpened, cv2.COLOR_BGR2RGB))
-        return Image.fromarray(cv2.cvtColor(smoothed, cv2.COLOR_BGR2RGB))
-    
-    def _apply_micro_contrast(self, image_to_process):
-        strength = self.sliders["Micro-contrast"].get() / 100.0
-        variation = self.sliders["Texture Variation"].get() / 100.0
-        if strength == 0: return image_to_process
-
-        bgr_array = cv2.cvtColor(np.array(image_to_process), cv2.COLOR_RGB2BGR)
-        blurred = cv2.GaussianBlur(bgr_array, (0,0), 3)
-        detail_layer = bgr_array.astype(np.float32) - blurred.astype(np.float32)
-        _, _, _, texture_map = self._get_fixed_maps_for_resolution(image_to_process.width, image_to_process.height)
-        
-        flat_mask = np.ones_like(texture_map, dtype=np.float32)
-        blended_mask = cv2.addWeighted(flat_mask, 1.0 - variation, texture_map, variation, 0)
-        
-        modulated_detail = detail_layer * np.expand_dims(blended_mask, axis=-1) * strength * 2.0
-        final_bgr = np.clip(bgr_array.astype(np.float32) + modulated_detail, 0, 255).astype(np.uint8)
-        return Image.fromarray(cv2.cvtColor(final_bgr, cv2.COLOR_BGR2RGB))
-
-    def _apply_saturation(self, image_to_process):
-        sat_value = self.sliders["Saturation"].get() / 100.0 + 1.0
-        if sat_value != 1.0:
-            enhancer = ImageEnhance.Color(image_to_process)
-            image_to_process = enhancer.enhance(sat_value)
-
-        filmic_sat_val = self.sliders["Filmic Saturation"].get() / 100.0
-        if filmic_sat_val > 0:
-            hsv = image_to_process.convert("HSV")
-            h, s, v = hsv.split()
-            s_np = np.array(s).astype(np.float32)
-            v_np = np.array(v) / 255.0
-
-            highlight_rolloff = 1.0 - (1.0 / (1.0 + np.exp(-(v_np - 0.8) * 15.0)))
-            shadow_rolloff = 1.0 / (1.0 + np.exp((v_np - 0.2) * 15.0))
-            
-            mask = highlight_rolloff * shadow_rolloff
-            filmic_mask = 1.0 - ((1.0 - mask) * filmic_sat_val)
-            s_np *= filmic_mask
-            s_new = Image.fromarray(np.clip(s_np, 0, 255).astype(np.uint8))
-            image_to_process = Image.merge("HSV", (h, s_new, v)).convert("RGB")
-        return image_to_process
-
-    def _generate_s_curve_lut(self):
-        lift = self.sliders["Lift"].get() / 100.0
-        rolloff = self.sliders["Roll-off"].get() / 100.0
-        contrast = self.sliders["Contrast"].get() / 100.0
-
-        if lift == 0 and rolloff == 0 and contrast == 0: return None
-
-        x = np.linspace(0, 1, 256, dtype=np.float32)
-        alpha = 1.0 + contrast if contrast >= 0 else 1.0 / (1.0 - contrast)
-        s_curve = x**alpha / (x**alpha + (1-x)**alpha)
-        output_min = lift / 2.0
-        output_max = 1.0 - (rolloff / 2.0)
-        final_curve = s_curve * (output_max - output_min) + output_min
-        return np.clip(final_curve * 255, 0, 255).astype(np.uint8)
-
-    def _apply_lut(self, image, lut):
-        if lut is None or len(lut) != 256: return image
-        bgr_array = cv2.cvtColor(np.array(image), cv2.COLOR_RGB2BGR)
-        toned_bgr = cv2.LUT(bgr_array, lut)
-        return Image.fromarray(cv2.cvtColor(toned_bgr, cv2.COLOR_BGR2RGB))
-    
-    def _apply_diamond_grid(self, image_to_process):
-        opacity = self.sliders["Diamond Grid Opacity"].get() / 100.0
-        if opacity == 0:
-            return image_to_process
-
-        size = max(2, int(self.sliders["Diamond Grid Size"].get()))
-        softness = int(self.sliders["Diamond Edge Softness"].get())
-        color_count = int(self.sliders["Diamond Color Count"].get())
-        saturation = self.sliders["Diamond Color Saturation"].get() / 100.0
-        
-        rng = np.random.default_rng(self.get_master_seed() + 42)
-        palette = []
-        for i in range(color_count):
-            hue = rng.random()
-            rgb_float = colorsys.hsv_to_rgb(hue, saturation, 1.0)
-            palette.append([int(c * 255) for c in rgb_float])
-        palette = np.array(palette, dtype=np.uint8)
-
-        w, h = image_to_process.size
-        y_coords, x_coords = np.indices((h, w))
-        
-        pattern_a = ((x_coords + y_coords) // size) % color_count
-        pattern_b = ((x_coords - y_coords) // size) % color_count
-        pattern_index = (pattern_a + pattern_b) % color_count
-        
-        color_overlay_arr = palette[pattern_index]
-
-        if softness > 0:
-            kernel_size = softness * 2 + 1
-            color_overlay_arr = cv2.GaussianBlur(color_overlay_arr, (kernel_size, kernel_size), 0)
-
-        base_arr = np.array(image_to_process, dtype=np.float32) / 255.0
-        overlay_arr = color_overlay_arr.astype(np.float32) / 255.0
-
-        low_mask = base_arr <= 0.5
-        high_mask = ~low_mask
-        
-        blended_arr = np.zeros_like(base_arr)
-        blended_arr[low_mask] = 2 * base_arr[low_mask] * overlay_arr[low_mask]
-        blended_arr[high_mask] = 1 - 2 * (1 - base_arr[high_mask]) * (1 - overlay_arr[high_mask])
-
-        blended_image = Image.fromarray((blended_arr * 255).astype(np.uint8))
-        
-        return Image.blend(image_to_process, blended_image, alpha=opacity)
+        is_realtime = self.realtime_preview_var.get()
+        self._request_render(show_progress=not is_realtime)
+
+    def _proxy_scale(self):
+        """Proxy resolution relative to the full frame for slider drags, or None to render at full resolution."""
+        if (mode := self.proxy_mode_var.get()) == "Off": return None
+        if mode != "Display": scale = 0.5 if mode == "1/2" else 0.25
+        elif (zoom_str := self.zoom_var.get()) == "Fit to Window":
+            scale = min((self.canvas.winfo_width() - 4) / self.width, (self.canvas.winfo_height() - 4) / self.height)
+        else: scale = float(zoom_str.replace('%','')) / 100.0
+        scale = min(1.0, scale)
+        # At full size a proxy only saves anything by skipping supersampling.
+        return None if scale <= 0 or (scale == 1.0 and self.get_supersample_factor() == 1) else scale
 
     def _update_display_image(self):
         if not self.pil_image: return
-        zoom_str = self.zoom_var.get(); w, h = self.pil_image.size
+        zoom_str = self.zoom_var.get(); w, h = self._logical_size(self.pil_image)
         if zoom_str == "Fit to Window":
             fw, fh = self.canvas.winfo_width() - 4, self.canvas.winfo_height() - 4
             if fw <= 1 or fh <= 1: return
@@ -761,6 +507,13 @@ class OrganicGrainGeneratorApp:
             else: self.canvas_image_id = self.canvas.create_image(0, 0, anchor='nw', image=self.photo_image)
             self.canvas.configure(scrollregion=self.canvas.bbox('all'))
 
+    def on_grain_engine_change(self, event=None):
+        spectral = self.grain_engine_var.get() == "Spectral"
+        for name in ("Grain Aspect", "Grain Angle"): self.sliders[name].config(state="normal" if spectral else "disabled")
+        self.grain_spectrum_combo.config(state="readonly" if spectral else "disabled")
+        self.upscale_kernel_combo.config(state="disabled" if spectral else "readonly")
+        if event is not None: self.update_noise()
+
     def on_denoise_mode_change(self, event=None):
         mode = self.denoise_mode_var.get()
         if mode == "Photographic (NL-Means)":
@@ -775,10 +528,20 @@ class OrganicGrainGeneratorApp:
             self.sliders["Denoise Param 2"].config(to=30)
         self.update_noise()
 
+    def _logical_size(self, image):
+        # A proxy stands in for the full frame, so it is laid out at the frame's size.
+        return (self.width, self.height) if image is self.proxy_pil_image else image.size
+
     def on_slider_drag(self, event=None):
-        if not self.initializing and (self.realtime_preview_var.get() or self.zoom_window): self.update_noise()
+        if self.initializing: return
+        if self.realtime_preview_var.get():
+            self._request_render(self._proxy_scale(), draft=True)
+        elif self._detail_view_renders(): self._request_render(region_only=True)
     def on_slider_release(self, event=None):
-        if not self.initializing and not self.realtime_preview_var.get(): self.update_noise()
+        if self.initializing: return
+        if not self.realtime_preview_var.get(): self.update_noise()
+        # Refine the drag's proxy or draft denoise at full resolution
+        elif self._proxy_scale() is not None or self.sliders["Denoise Param 1"].get() > 0: self._request_render(show_progress=True)
     
     def on_toggle_original(self):
         if self.show_original_var.get() and self.background_pil_image:
@@ -786,7 +549,8 @@ class OrganicGrainGeneratorApp:
         else:
             self.pil_image = self.processed_pil_image
         self._update_display_image()
-        if self.zoom_window: self.update_zoom_view()
+        # The Detail View always shows full-resolution pixels, even while the main view shows a proxy.
+        if self.zoom_window: self.update_zoom_view(self.detail_region_image if self.pil_image is self.proxy_pil_image else None)
 
     def on_zoom_change(self, event=None):
         if (zoom_str := self.zoom_var.get()) != "Fit to Window":
@@ -801,17 +565,24 @@ class OrganicGrainGeneratorApp:
             if w <= 0 or h <= 0: raise ValueError
             self.master.config(cursor="watch"); self.update_dim_button.config(state="disabled"); self.master.update_idletasks()
             self.width, self.height = w, h
-            self._cached_fixed_maps.clear(); self.update_noise()
+            self.update_noise()
         except ValueError: logging.error("Invalid dimensions.")
         finally: self.master.config(cursor=""); self.update_dim_button.config(state="normal")
     def load_background_image(self):
         if not (fp := filedialog.askopenfilename(filetypes=[("Image", "*.png *.jpg *.jpeg *.bmp *.tiff"), ("All", "*.*")])): return
+        self._set_background(fp)
+    def load_plate_sequence(self):
+        if not (fp := filedialog.askopenfilename(filetypes=[("Image", "*.png *.jpg *.jpeg *.bmp *.tif *.tiff *.exr"), ("All", "*.*")])): return
+        if not (pattern := sequence_pattern_for(fp)): logging.error(f"No frame number in {os.path.basename(fp)}"); return
+        self._set_background(fp, PlateSequence(pattern))
+    def _set_background(self, fp, plates=None):
         try:
-            img = Image.open(fp).convert('RGB')
+            img = decode_plate(fp)
             self.background_pil_image = img; self.width, self.height = img.size
+            self.plate_sequence = plates
             self.width_var.set(str(self.width)); self.height_var.set(str(self.height))
             self.width_entry.config(state="disabled"); self.height_entry.config(state="disabled"); self.update_dim_button.config(state="disabled")
-            self.bg_status_label.config(text=f"Loaded: {os.path.basename(fp)}")
+            self.bg_status_label.config(text=f"Sequence: {os.path.basename(plates.pattern)} ({len(plates.frames())} frames)" if plates else f"Loaded: {os.path.basename(fp)}")
             self._update_cached_luma_array()
             self.sliders["Shadow Noise Bias"].config(state="normal")
             self.sliders["Shadow Falloff"].config(state="normal")
@@ -819,7 +590,7 @@ class OrganicGrainGeneratorApp:
             self.update_noise()
         except Exception as e: logging.error(f"Failed to load image: {e}"); self.clear_background_image()
     def clear_background_image(self):
-        self.background_pil_image = None
+        self.background_pil_image = self.plate_sequence = None
         self._update_cached_luma_array()
         self.width_entry.config(state="normal"); self.height_entry.config(state="normal"); self.update_dim_button.config(state="normal")
         self.bg_status_label.config(text="Status: No Image Loaded")
@@ -837,39 +608,71 @@ class OrganicGrainGeneratorApp:
         else:
             default_image = Image.new('RGB', (self.width, self.height), (128, 128, 128))
         
-        self.processed_pil_image = default_image
-        self.on_toggle_original()
+        self._scheduler.cancel()
+        self._set_processed_image(default_image)
 
     def export_sequence(self):
         try:
             prefix, start, end = self.prefix_var.get(), int(self.start_frame_var.get()), int(self.end_frame_var.get())
-            if start > end or not prefix: raise ValueError
+            workers = int(self.workers_var.get())
+            if start > end or not prefix or workers < 1: raise ValueError
+            output = OutputFormat(self.file_format_var.get(), 16 if self.sixteen_bit_var.get() else 8, int(self.png_compression_var.get()))
         except ValueError: logging.error("Invalid sequence."); return
         if not (fp := filedialog.askdirectory()): return
         self.export_button.config(state="disabled"); self.master.config(cursor="watch")
         self.progress_bar["maximum"] = end - start + 1; self.progress_bar["value"] = 0
-        threading.Thread(target=self._export_worker, args=(fp, start, end, prefix), daemon=True).start()
-    def _export_worker(self, fp, start, end, prefix):
-        composite = self.export_mode_var.get() == "Composited Image" and self.background_pil_image
-        os.makedirs(fp, exist_ok=True)
-        
-        for i, frame in enumerate(range(start, end + 1)):
-            final_image = self._get_processed_image(seed_offset=frame, composite=composite)
-            final_image.save(os.path.join(fp, f"{prefix}.{frame:04d}.png"))
-            self.master.after(0, self.progress_bar.config, {'value': i + 1})
-        self.master.after(0, self._export_done_ui_cleanup)
+        composite = self.export_mode_var.get() == "Composited Image" and self.background_pil_image is not None
+        trace = os.path.join(fp, f"{prefix}.trace.json") if self.write_trace_var.get() else None
+        threading.Thread(target=self._export_worker, args=(fp, start, end, prefix, self._make_renderer(preview=False), composite, workers, self.resume_export_var.get(), output, trace, self.plate_sequence), daemon=True).start()
+    def _export_worker(self, fp, start, end, prefix, renderer, composite, workers, resume, output, trace, plates):
+        progress = lambda done, total: self.master.after(0, self.progress_bar.config, {'value': done, 'maximum': max(1, total)})
+        try: export_sequence(renderer, fp, start, end, prefix, composite, workers, resume, progress, output, trace, plates=plates)
+        except Exception as e: logging.error(f"Export failed: {e}")
+        finally: self.master.after(0, self._export_done_ui_cleanup)
     def _export_done_ui_cleanup(self):
         self.export_button.config(state="normal"); self.master.config(cursor="")
         self.progress_bar["value"] = 0
     def save_image(self):
         if not self.pil_image: return
         if not (fp := filedialog.asksaveasfilename(defaultextension=".png", filetypes=[("PNG", "*.png"), ("JPEG", "*.jpg")])): return
-        self.pil_image.save(fp); logging.info(f"Saved image to {fp}")
+        if self.pil_image is not self.proxy_pil_image: return self._save_to(fp, self.pil_image)
+        # A proxy or draft is on screen: save the full-resolution render once the scheduler delivers it.
+        self._pending_save_path = fp
+        self._request_render(show_progress=True)
+    def _save_to(self, fp, image):
+        try: image.save(fp); logging.info(f"Saved image to {fp}")
+        except (OSError, ValueError) as e: logging.error(f"Could not save image to {fp}: {e}")
+    def save_preset(self):
+        if not (fp := filedialog.asksaveasfilename(defaultextension=".json", filetypes=[("Preset", "*.json")])): return
+        with open(fp, "w") as f: json.dump(self._snapshot_params().to_dict(), f, indent=2)
+        logging.info(f"Saved preset to {fp}")
+    def load_preset(self):
+        if not (fp := filedialog.askopenfilename(filetypes=[("Preset", "*.json"), ("All", "*.*")])): return
+        try:
+            with open(fp) as f: params = GrainParams.from_dict(json.load(f))
+        except (OSError, ValueError, TypeError) as e: logging.error(f"Failed to load preset: {e}"); return
+        for name, slider in self.sliders.items(): slider.set(params[name])
+        self.seed_var.set(str(params.seed))
+        self.supersample_combo.set("1x (Off)" if params.supersample == 1 else f"{params.supersample}x"); self.supersample_mode_combo.set(params.supersample_mode)
+        self.rng_mode_combo.set(params.rng_mode); self.banding_mode_combo.set(params.banding_mode); self.precision_combo.set(params.precision)
+        self.upscale_kernel_combo.set(params.upscale_kernel); self.blend_mode_combo.set(params.blend_mode); self.glow_engine_combo.set(params.glow_engine)
+        self.grain_engine_combo.set(params.grain_engine); self.grain_spectrum_combo.set(params.grain_spectrum); self.on_grain_engine_change()
+        self.grain_bank_combo.set(str(params.grain_bank) if params.grain_bank else "Off")
+        self.denoise_mode_combo.set(params.denoise_mode); self.on_denoise_mode_change()
     def get_master_seed(self):
         try: return int(self.seed_var.get())
         except: return 0
-    def update_zoom_view(self):
-        if not self.zoom_window or not self.pil_image: return
+    def _detail_view_box(self, w, h):
+        cs = int(self.ZOOM_VIEW_SIZE / self.ZOOM_FACTOR)
+        cx, cy = w // 2, h // 2
+        return (max(0, cx - cs // 2), max(0, cy - cs // 2), min(w, cx + cs // 2), min(h, cy + cs // 2))
+
+    def _detail_view_renders(self):
+        """Whether the Detail View shows rendered grain (rather than the original background or the luma mask)."""
+        return bool(self.zoom_window) and not (self.show_original_var.get() and self.background_pil_image) and not self.debug_mask_var.get()
+
+    def update_zoom_view(self, region_image=None):
+        if not self.zoom_window or not (self.pil_image or region_image): return
         
         image_to_show = None
         if self.debug_mask_var.get() and self._cached_luma_arr is not None:
@@ -885,11 +688,7 @@ class OrganicGrainGeneratorApp:
             mask_img = Image.fromarray(normalized_mask.astype(np.uint8))
             image_to_show = mask_img.resize((self.ZOOM_VIEW_SIZE, self.ZOOM_VIEW_SIZE), resample=resampling.NEAREST)
         else:
-            cs = int(self.ZOOM_VIEW_SIZE / self.ZOOM_FACTOR)
-            w, h = self.pil_image.size
-            cx, cy = w // 2, h // 2
-            box = (max(0, cx - cs // 2), max(0, cy - cs // 2), min(w, cx + cs // 2), min(h, cy + cs // 2))
-            cropped_img = self.pil_image.crop(box)
+            cropped_img = region_image or self.pil_image.crop(self._detail_view_box(*self.pil_image.size))
             image_to_show = cropped_img.resize((self.ZOOM_VIEW_SIZE, self.ZOOM_VIEW_SIZE), resample=resampling.NEAREST)
 
         self.zoom_photo_image = ImageTk.PhotoImage(image_to_show)
@@ -0,0 +1,66 @@
+import hashlib
+from collections import namedtuple
+
+import numpy as np
+
+# Bump whenever bank entries or the way frames pick from them change, so stored entries are regenerated.
+BANK_VERSION = 1
+# Counter stream of the per-frame choices, next to grain_renderer.NOISE_STREAMS.
+BANK_STREAM = 31
+# Bank sizes offered by the app and the CLI help; any positive count works.
+BANK_SIZES = (8, 16, 32, 64)
+
+# How one frame is cut from the bank: which entry, the wrap-around offset of its first row and column,
+# whether rows and columns run backwards from there, and the order its channels are read in.
+BankPick = namedtuple("BankPick", "entry dy dx flip_y flip_x channels")
+
+
+def bank_digest(params):
+    """A short stable hash of the ``GrainParams`` an entry is rendered from, for its cache key and file name."""
+    return hashlib.sha1(repr(params).encode()).hexdigest()[:16]
+
+
+def bank_pick(seed, seed_offset, entries, width, height, quantum=1, mirror=True):
+    """Deterministic choice of entry, wrap-around offset, flips and channel order for frame ``seed_offset``.
+
+    Offsets are multiples of ``quantum`` pixels, so grain cells stay on their
+    grid. Without ``mirror`` the frame is only ever turned by 180 degrees,
+    which keeps the orientation of stretched grain.
+    """
+    rng = np.random.default_rng([seed, BANK_STREAM, seed_offset])
+    entry = int(rng.integers(entries))
+    dy, dx = (int(rng.integers(max(1, size // quantum))) * quantum for size in (height, width))
+    flip_y, flip_x = (bool(f) for f in rng.integers(2, size=2))
+    return BankPick(entry, dy, dx, flip_y, flip_x if mirror else flip_y, tuple(int(c) for c in rng.permutation(3)))
+
+
+def _runs(start, stop, offset, size, flip):
+    """(output slice, source slice) pairs covering outputs ``start``..``stop`` of an axis read from ``offset`` on, wrapping at ``size``."""
+    runs, i = [], start
+    while i < stop:
+        if flip:
+            s = (offset - i) % size
+            n = min(stop - i, s + 1)
+            source = slice(s, s - n if s >= n else None, -1)
+        else:
+            s = (offset + i) % size
+            n = min(stop - i, size - s)
+            source = slice(s, s + n)
+        runs.append((slice(i - start, i - start + n), source))
+        i += n
+    return runs
+
+
+def gather(layer, pick, box, out=None):
+    """``box`` (x0, y0, x1, y1) of the frame ``pick`` cuts from ``layer``, an (H, W, 3) entry.
+
+    A shifted, flipped frame is at most four rectangles of the entry, copied
+    channel by channel as strided slices, with no index arrays.
+    """
+    x0, y0, x1, y1 = box
+    height, width = layer.shape[:2]
+    if out is None: out = np.empty((y1 - y0, x1 - x0, 3), dtype=layer.dtype)
+    for out_rows, rows in _runs(y0, y1, pick.dy, height, pick.flip_y):
+        for out_cols, cols in _runs(x0, x1, pick.dx, width, pick.flip_x):
+            for k, c in enumerate(pick.channels): out[out_rows, out_cols, k] = layer[rows, cols, c]
+    return out
@@ -0,0 +1,237 @@
+import argparse
+import gc
+import json
+import logging
+import math
+import os
+import platform
+import resource
+import sys
+import time
+import tracemalloc
+
+import cv2
+import numpy as np
+import PIL
+from PIL import Image
+
+from grain_cache import StageCache
+from grain_renderer import GrainParams, GrainRenderer, PRECISIONS, SLIDER_RANGES, SUPERSAMPLE_MODES
+from grain_spectrum import radial_power_spectrum
+
+RESOLUTIONS = {"HD": (1920, 1080), "4K": (3840, 2160), "8K": (7680, 4320)}
+# Representative looks: bare sensor noise, a graded film look over a plate, the same with every expensive stage on, and a
+# softer grade that takes the other denoise mode and the filmic (HSV) saturation path.
+# Values stay within the app's slider ranges (checked by ``_params``), so they are settings a user could actually pick.
+_FILM = {"Grain Size": 2, "Read Noise (Gaussian)": 12, "Shot Noise (Poisson)": 4, "Color Noise": 8, "PRNU (Gain FPN)": 1.5,
+         "Banding": 0.02, "Micro-contrast": 40, "Texture Variation": 30, "Saturation": 20, "Lift": 5, "Contrast": 15,
+         "Glow Amount": 30, "Glow Radius": 40, "Glow Threshold": 80}
+PRESETS = {
+    "clean": {"sliders": {"Read Noise (Gaussian)": 15, "Shot Noise (Poisson)": 5, "Color Noise": 5}},
+    "film": {"sliders": _FILM, "background": True},
+    "heavy": {"sliders": {**_FILM, "Firefly Density (%)": 0.5, "Firefly Intensity": 80, "Firefly Spread": 1, "Bloom / Crush": 2,
+                          "Denoise Param 1": 10, "Diamond Grid Opacity": 20, "Diamond Edge Softness": 2},
+              "background": True, "denoise_mode": "Photographic (NL-Means)"},
+    "graded": {"sliders": {**_FILM, "Filmic Saturation": 40, "Roll-off": 30, "Denoise Param 1": 10, "Denoise Param 2": 10, "Mix": 80},
+               "background": True, "denoise_mode": "Edge-Aware Smooth"},
+}
+# A case more than this much slower than the baseline is reported as a regression.
+DEFAULT_TOLERANCE = 0.15
+# Size of the grain plates and number of frequency bands --spectra compares.
+SPECTRUM_SIZE = 512
+SPECTRUM_BANDS = 16
+
+
+def synthetic_background(width, height):
+    """A deterministic plate with gradients and bright patches, so glow and the luma-driven stages have work to do."""
+    y, x = np.mgrid[0:height, 0:width].astype(np.float32)
+    x /= width; y /= height
+    rgb = np.stack([x, y, 0.5 + 0.5 * np.sin(12 * x + 7 * y)], axis=-1) * 200
+    for cx, cy, r in ((0.25, 0.3, 0.05), (0.7, 0.6, 0.08), (0.5, 0.85, 0.03)):
+        rgb[(x - cx) ** 2 + (y - cy) ** 2 < r * r] = 250
+    return Image.fromarray(rgb.astype(np.uint8))
+
+
+# --- Memory ---
+# A stage's peak is the larger of what tracemalloc saw allocated (numpy arrays, including OpenCV's outputs) and
+# how far resident memory rose (also covering OpenCV's and Pillow's internal buffers, but blind to reused pages).
+def _status_bytes(field):
+    try:
+        with open("/proc/self/status") as f:
+            return next(int(line.split()[1]) * 1024 for line in f if line.startswith(field + ":"))
+    except (OSError, StopIteration):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024 if field == "VmHWM" else 0
+
+def _reset_peak():
+    try:
+        with open("/proc/self/clear_refs", "w") as f: f.write("5")
+    except OSError: pass
+
+
+def measure(fn, repeat):
+    """Best wall time of ``repeat`` calls to ``fn``, and the most memory a call added, in bytes.
+
+    An untimed warm-up call measures the memory, so first-call costs
+    (lookup tables, caches) stay out of the timings as they would after
+    the first frame of a sequence.
+    """
+    gc.collect()
+    base = _status_bytes("VmRSS")
+    _reset_peak()
+    tracemalloc.start()
+    try:
+        fn()
+        traced = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+    peak = max(traced, _status_bytes("VmHWM") - base)
+    best = math.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best, peak
+
+
+def _params(preset, width, height, supersample, precision, supersample_mode=SUPERSAMPLE_MODES[0]):
+    spec = PRESETS[preset]
+    if outside := [f"{name}={value} (range {SLIDER_RANGES[name][0]}..{SLIDER_RANGES[name][1]})" for name, value in spec["sliders"].items()
+                   if not SLIDER_RANGES[name][0] <= value <= SLIDER_RANGES[name][1]]:
+        raise ValueError(f"Preset '{preset}' sets slider(s) outside the app's ranges: {', '.join(outside)}")
+    return GrainParams(width=width, height=height, seed=1, supersample=supersample, supersample_mode=supersample_mode, precision=precision,
+                       sliders=spec["sliders"], denoise_mode=spec.get("denoise_mode", "Photographic (NL-Means)"))
+
+
+def bench_case(preset, resolution, supersample, precision, repeat, memory_budget, supersample_mode=SUPERSAMPLE_MODES[0]):
+    """Times every enabled stage of one configuration and a full ``render()``; returns {stage: result}."""
+    width, height = RESOLUTIONS[resolution]
+    spec = PRESETS[preset]
+    params = _params(preset, width, height, supersample, precision, supersample_mode)
+    background = synthetic_background(width, height) if spec.get("background") else None
+    renderer = GrainRenderer(params, background, memory_budget=memory_budget)
+    megapixels, results = width * height / 1e6, {}
+
+    def record(stage, fn):
+        seconds, peak = measure(fn, repeat)
+        results[stage] = {"seconds": seconds, "mpix_per_s": megapixels / seconds, "peak_mb": peak / 2**20}
+
+    # Stages need whole intermediate frames; configurations that only fit in bands are timed end to end.
+    if not renderer.uses_bands():
+        factor = renderer._render_factor()
+        box, render_size = (0, 0, width, height), (width * factor, height * factor)
+        record("fixed_maps", lambda: renderer._create_fixed_maps(*render_size))
+        renderer._get_fixed_maps_for_resolution(*render_size)
+        record("grain", lambda: renderer._generate_base_image(0, composite=False))
+        image = renderer._generate_base_image(0, composite=False)
+        if background is not None:
+            record("background", lambda: renderer._prepared_background(box))
+            # With the prepared background cached, _composite only blends.
+            renderer.stage_cache = StageCache()
+            grain = image
+            image = renderer._composite(box, grain)
+            record("composite", lambda: renderer._composite(box, grain))
+            renderer.stage_cache = None
+        else:
+            image = renderer._to_stage(image)
+        for name, _, fn in renderer._post_stages((0, 0)):
+            if (out := fn(image)) is image: continue  # Disabled by this preset.
+            record(name, lambda: fn(image))
+            image = out
+        del image, out
+    record("frame", renderer.render)
+    results["frame"]["frames_per_s"] = 1 / results["frame"]["seconds"]
+    return results
+
+
+def spectrum_comparison(preset, supersample, precision):
+    """Radial noise power of the preset's Fast grain plate relative to its Exact one, per frequency band (1.0 is a match), and their std ratio."""
+    plates = [np.asarray(GrainRenderer(_params(preset, SPECTRUM_SIZE, SPECTRUM_SIZE, supersample, precision, mode))._generate_base_image(0, composite=False), np.float64)
+              for mode in ("Exact", "Fast")]
+    exact, fast = (radial_power_spectrum(plate, SPECTRUM_BANDS) for plate in plates)
+    return fast / exact, plates[1].std() / plates[0].std()
+
+
+def environment():
+    return {"python": platform.python_version(), "numpy": np.__version__, "opencv": cv2.__version__, "pillow": PIL.__version__,
+            "machine": platform.machine(), "cpus": os.cpu_count(), "opencv_threads": cv2.getNumThreads()}
+
+
+def _physical_memory():
+    try: return os.sysconf("SC_PAGE_SIZE") * os.sysconf("SC_PHYS_PAGES")
+    except (ValueError, OSError, AttributeError): return 8 << 30
+
+
+def report(results, baseline=None, tolerance=DEFAULT_TOLERANCE):
+    """Prints one row per case and returns the keys that are slower than ``baseline`` by more than ``tolerance``."""
+    regressions = []
+    print(f"{'case':<34}{'ms':>10}{'MP/s':>9}{'fps':>7}{'peak MB':>9}" + (f"{'base ms':>10}{'change':>9}" if baseline else ""))
+    for key, r in results.items():
+        fps = f"{r['frames_per_s']:.2f}" if "frames_per_s" in r else ""
+        row = f"{key:<34}{r['seconds'] * 1000:>10.1f}{r['mpix_per_s']:>9.1f}{fps:>7}{r['peak_mb']:>9.0f}"
+        if baseline and (old := baseline.get(key)):
+            change = r["seconds"] / old["seconds"] - 1
+            flag = "  REGRESSION" if change > tolerance else ""
+            if flag: regressions.append(key)
+            row += f"{old['seconds'] * 1000:>10.1f}{change:>+9.0%}{flag}"
+        print(row)
+    return regressions
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Benchmark every render pipeline stage headless, optionally against a stored baseline.")
+    parser.add_argument("--presets", nargs="+", choices=PRESETS, default=list(PRESETS), help="Slider presets to run (default: all).")
+    parser.add_argument("--resolutions", nargs="+", choices=RESOLUTIONS, default=["HD"], help="Output resolutions (default: HD).")
+    parser.add_argument("--supersample", nargs="+", type=int, choices=(1, 2, 3, 4), default=[1], help="Supersampling factors (default: 1).")
+    parser.add_argument("--supersample-mode", nargs="+", choices=SUPERSAMPLE_MODES, default=[SUPERSAMPLE_MODES[0]],
+                        help="Supersampling modes to time; Fast cases are named e.g. 4x-fast (default: Exact).")
+    parser.add_argument("--spectra", action="store_true",
+                        help="Also compare the noise power spectra of Fast and Exact supersampled grain for each preset and factor above 1.")
+    parser.add_argument("--precision", choices=PRECISIONS, default=PRECISIONS[0], help="Stage precision (default: 8-bit).")
+    parser.add_argument("--repeat", type=int, default=3, help="Timed runs per stage; the fastest counts (default: 3).")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="Configurations above this render in bands and are only timed end to end (default: half of physical memory).")
+    parser.add_argument("--json", metavar="FILE", help="Write the results (with the environment they were measured in) to FILE.")
+    parser.add_argument("--baseline", metavar="FILE", help="Compare with results saved by --json; exits with status 1 on a regression.")
+    parser.add_argument("--tolerance", type=float, default=DEFAULT_TOLERANCE, help=f"Allowed slowdown before a case counts as a regression (default: {DEFAULT_TOLERANCE}).")
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = build_parser().parse_args(argv)
+    baseline = None
+    if args.baseline:
+        try:
+            with open(args.baseline) as f: baseline = json.load(f)
+        except (OSError, ValueError) as e: logging.error(f"Failed to load baseline: {e}"); return 2
+        if baseline.get("environment") != environment():
+            logging.warning(f"Baseline was measured in a different environment: {baseline.get('environment')}")
+    memory_budget = (args.memory_budget << 20) if args.memory_budget else _physical_memory() // 2
+
+    results = {}
+    for preset in args.presets:
+        for resolution in args.resolutions:
+            for supersample in args.supersample:
+                for mode in args.supersample_mode:
+                    # Without supersampling both modes render the same way.
+                    if mode == "Fast" and supersample == 1: continue
+                    case = f"{preset}/{resolution}/{supersample}x{'-fast' if mode == 'Fast' else ''}/{args.precision}"
+                    logging.info(f"Benchmarking {case}")
+                    for stage, result in bench_case(preset, resolution, supersample, args.precision, max(1, args.repeat), memory_budget, mode).items():
+                        results[f"{case}/{stage}"] = result
+
+    regressions = report(results, baseline and baseline["results"], args.tolerance)
+    if args.spectra:
+        print(f"\nFast / Exact grain power per frequency band, low to high ({SPECTRUM_SIZE}x{SPECTRUM_SIZE} plates):")
+        for preset in args.presets:
+            for supersample in (k for k in args.supersample if k > 1):
+                ratios, std_ratio = spectrum_comparison(preset, supersample, args.precision)
+                print(f"{preset + '/' + str(supersample) + 'x':<14}std {std_ratio:.3f}  max deviation {np.abs(ratios - 1).max():>4.0%}  " + " ".join(f"{r:.2f}" for r in ratios))
+    if args.json:
+        with open(args.json, "w") as f: json.dump({"environment": environment(), "results": results}, f, indent=2)
+    if regressions: logging.error(f"{len(regressions)} case(s) regressed by more than {args.tolerance:.0%}.")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
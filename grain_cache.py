@@ -0,0 +1,158 @@
+import logging
+import os
+import threading
+from collections import OrderedDict, namedtuple
+
+import numpy as np
+
+# Everything that determines the contents of a set of fixed maps. ``version``
+# must be bumped whenever the way the maps are generated changes, so stale
+# files in an on-disk store are never served. ``fast_supersample`` is the
+# factor fast supersampling filtered the maps for (1: unfiltered).
+FixedMapKey = namedtuple("FixedMapKey", "version seed width height rng_mode banding_mode fast_supersample", defaults=(1,))
+FIXED_MAP_NAMES = ("prnu", "dsnu", "banding", "texture")
+# One grain-bank entry (grain_bank): the random grain of frame ``index`` rendered with the settings ``digest`` hashes.
+GrainBankKey = namedtuple("GrainBankKey", "version digest index width height")
+DEFAULT_FIXED_MAP_BUDGET = 1 << 30
+
+
+def resident_bytes(arr):
+    """Heap bytes actually held by ``arr``: broadcast axes are free and memory-mapped files are paged by the OS."""
+    if isinstance(arr, np.memmap): return 0
+    return arr.itemsize * int(np.prod([n for n, stride in zip(arr.shape, arr.strides) if stride != 0]))
+
+
+def _compact(arr):
+    # Broadcast axes (e.g. the banding map) are stored with length 1 and re-broadcast on load.
+    return arr[tuple(slice(0, 1) if stride == 0 else slice(None) for stride in arr.strides)]
+
+
+def _expand(arr, shape): return arr if arr.shape == shape else np.broadcast_to(arr, shape)
+
+
+class FixedMapCache:
+    """LRU cache of fixed sensor maps (PRNU, DSNU, banding, texture) keyed by ``FixedMapKey``, and of grain-bank entries keyed by ``GrainBankKey``.
+
+    In-memory entries are evicted least-recently-used first once their
+    resident size exceeds ``max_bytes``; the most recent entry is always kept.
+    With ``store_dir`` set, every entry is also written there as ``.npy``
+    files and later lookups (from this or any other process) memory-map them
+    instead of regenerating. The store itself is never pruned.
+    """
+    def __init__(self, max_bytes=DEFAULT_FIXED_MAP_BUDGET, store_dir=None):
+        self.max_bytes, self.store_dir = max_bytes, store_dir
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        if store_dir: os.makedirs(store_dir, exist_ok=True)
+
+    def _paths(self, key):
+        if isinstance(key, GrainBankKey):
+            return [os.path.join(self.store_dir, f"bank_v{key.version}_{key.digest}_{key.width}x{key.height}_{key.index}.npy")]
+        stem = f"fixed_v{key.version}_{key.seed}_{key.width}x{key.height}_{key.rng_mode}_{key.banding_mode}".lower().replace(" ", "-")
+        if key.fast_supersample > 1: stem += f"_fast{key.fast_supersample}x"
+        return [os.path.join(self.store_dir, f"{stem}_{name}.npy") for name in FIXED_MAP_NAMES]
+
+    def _on_disk(self, key): return bool(self.store_dir) and all(os.path.exists(path) for path in self._paths(key))
+
+    def __contains__(self, key):
+        with self._lock:
+            if key in self._entries: return True
+        return self._on_disk(key)
+
+    @property
+    def nbytes(self):
+        with self._lock: return sum(resident_bytes(arr) for maps in self._entries.values() for arr in maps)
+
+    def get(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._entries.move_to_end(key)
+                return self._entries[key]
+        if not self._on_disk(key): return None
+        try:
+            maps = tuple(np.load(path, mmap_mode='r') if isinstance(key, GrainBankKey) else _expand(np.load(path, mmap_mode='r'), (key.height, key.width))
+                         for path in self._paths(key))
+        except (OSError, ValueError) as e:
+            logging.warning(f"Ignoring unreadable fixed-map files for {key}: {e}")
+            return None
+        return self._remember(key, maps)
+
+    def put(self, key, maps):
+        if self.store_dir and not self._on_disk(key):
+            for path, arr in zip(self._paths(key), maps):
+                with open(tmp := f"{path}.{os.getpid()}.{threading.get_ident()}.tmp", "wb") as f: np.save(f, _compact(arr))
+                os.replace(tmp, path)
+        return self._remember(key, maps)
+
+    def get_or_create(self, key, create):
+        if (maps := self.get(key)) is not None: return maps
+        return self.put(key, create())
+
+    def _remember(self, key, maps):
+        with self._lock:
+            self._entries[key] = maps
+            self._entries.move_to_end(key)
+            total = sum(resident_bytes(arr) for entry in self._entries.values() for arr in entry)
+            while total > self.max_bytes and len(self._entries) > 1:
+                _, evicted = self._entries.popitem(last=False)
+                total -= sum(resident_bytes(arr) for arr in evicted)
+        return maps
+
+    def clear(self):
+        with self._lock: self._entries.clear()
+
+
+DEFAULT_STAGE_BUDGET = 512 << 20
+MAX_STAGE_TOKENS = 8
+
+
+class StageCache:
+    """Byte-bounded LRU of intermediate pipeline arrays, keyed by everything that went into them.
+
+    Stored arrays are made read-only because later renders share them. An
+    array larger than ``max_bytes`` on its own is not stored. ``token(obj)``
+    gives a hashable stand-in for an unhashable input such as a background
+    image; the object is kept alive while it has a token, so a recycled
+    ``id()`` can never match a stale entry.
+    """
+    def __init__(self, max_bytes=DEFAULT_STAGE_BUDGET):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._tokens = OrderedDict()
+        self._next_token = 0
+        self._nbytes = 0
+        self._lock = threading.Lock()
+
+    def token(self, obj):
+        if obj is None: return None
+        with self._lock:
+            if id(obj) not in self._tokens:
+                self._tokens[id(obj)] = (obj, self._next_token); self._next_token += 1
+                if len(self._tokens) > MAX_STAGE_TOKENS: self._tokens.popitem(last=False)
+            self._tokens.move_to_end(id(obj))
+            return self._tokens[id(obj)][1]
+
+    @property
+    def nbytes(self):
+        with self._lock: return self._nbytes
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._entries: return None
+            self._entries.move_to_end(key)
+            return self._entries[key]
+
+    def put(self, key, arr):
+        if arr.nbytes > self.max_bytes: return arr
+        arr.setflags(write=False)
+        with self._lock:
+            if (old := self._entries.pop(key, None)) is not None: self._nbytes -= old.nbytes
+            self._entries[key] = arr
+            self._nbytes += arr.nbytes
+            while self._nbytes > self.max_bytes:
+                _, evicted = self._entries.popitem(last=False)
+                self._nbytes -= evicted.nbytes
+        return arr
+
+    def clear(self):
+        with self._lock: self._entries.clear(); self._tokens.clear(); self._nbytes = 0
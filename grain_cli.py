@@ -0,0 +1,114 @@
+import argparse
+import json
+import logging
+import os
+import sys
+
+from PIL import Image
+
+from grain_renderer import GrainParams, GrainRenderer, BANDING_MODES, BLEND_MODES, DENOISE_MODES, GLOW_ENGINES, GRAIN_ENGINES, GRAIN_SPECTRA, PRECISIONS, RNG_MODES, SUPERSAMPLE_MODES, UPSCALE_KERNELS
+from grain_cache import FixedMapCache
+from grain_export import export_sequence, default_worker_count
+from grain_plates import PlateSequence, decode_plate, is_sequence_pattern
+from grain_profile import TRACE_FORMATS
+from grain_writer import BIT_DEPTHS, DEFAULT_PNG_COMPRESSION, FILE_FORMATS, OutputFormat
+
+
+def _parse_slider_override(text):
+    name, sep, value = text.partition("=")
+    if not sep: raise argparse.ArgumentTypeError(f"Expected NAME=VALUE, got '{text}'")
+    try: return name.strip(), float(value)
+    except ValueError: raise argparse.ArgumentTypeError(f"Slider value for '{name.strip()}' is not a number: '{value}'")
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Render Organic Grain Generator plates without a display.")
+    parser.add_argument("--preset", help="JSON preset saved from the app (Save Preset...).")
+    parser.add_argument("--width", type=int, help="Output width (defaults to the preset, or the background size).")
+    parser.add_argument("--height", type=int, help="Output height (defaults to the preset, or the background size).")
+    parser.add_argument("--seed", type=int, help="Master noise seed.")
+    parser.add_argument("--supersample", type=int, choices=(1, 2, 3, 4), help="Supersampling factor.")
+    parser.add_argument("--supersample-mode", choices=SUPERSAMPLE_MODES,
+                        help="Exact renders supersample² the pixels; Fast synthesizes grain with the same spectrum at output resolution (default: Exact).")
+    parser.add_argument("--denoise-mode", choices=DENOISE_MODES, help="Denoise algorithm.")
+    parser.add_argument("--banding-mode", choices=BANDING_MODES, help="Banding direction.")
+    parser.add_argument("--precision", choices=PRECISIONS, help="Stage precision: 8-bit (classic) or Float (no rounding between stages).")
+    parser.add_argument("--upscale-kernel", choices=UPSCALE_KERNELS, help="How grain cells are expanded to pixels: Nearest (square cells) or a smooth kernel.")
+    parser.add_argument("--grain-engine", choices=GRAIN_ENGINES,
+                        help="Cells (one value per grain cell, expanded) or Spectral (white noise shaped by FFT; fractional sizes, Grain Aspect / Angle).")
+    parser.add_argument("--grain-spectrum", choices=GRAIN_SPECTRA, help="Grain shape of the Spectral engine: Film (clumpy) or Gaussian (soft).")
+    parser.add_argument("--grain-bank", type=int, metavar="K",
+                        help="Render the random grain of K frames once and cut every frame from one of them with a seeded offset, flip and channel swap "
+                             "(e.g. 16 or 32; 0 renders every frame's grain, the default). Stored in --map-cache when given.")
+    parser.add_argument("--rng-mode", choices=RNG_MODES, help="Noise generator (default: the preset's, else Sequential).")
+    parser.add_argument("--set", dest="overrides", action="append", default=[], type=_parse_slider_override, metavar="NAME=VALUE",
+                        help="Override a slider, e.g. --set \"Grain Size=2\". May be repeated.")
+    parser.add_argument("--background", help="Background image to composite the grain over, or a plate sequence such as shot.####.png (frame N over plate N).")
+    parser.add_argument("--blend-mode", choices=BLEND_MODES, help="How the grain is composited over --background (default: Overlay).")
+    parser.add_argument("--glow-engine", choices=GLOW_ENGINES, help="How --background highlights are blurred for glow: Gaussian (classic) or Pyramid (fast at large radii).")
+    parser.add_argument("--grain-only", action="store_true", help="Write the grain plate only, even when a background is given.")
+    parser.add_argument("--start", type=int, default=1001, help="First frame (default: 1001).")
+    parser.add_argument("--end", type=int, help="Last frame, inclusive (default: same as --start).")
+    parser.add_argument("--prefix", default="noise_plate", help="Output filename prefix (default: noise_plate).")
+    parser.add_argument("--output", "-o", default=".", help="Output directory (default: current directory).")
+    parser.add_argument("--format", dest="file_format", choices=FILE_FORMATS, default=FILE_FORMATS[0],
+                        help="PNG or TIFF frames, or one memory-mappable {prefix}.npy array of every frame (default: PNG).")
+    parser.add_argument("--bit-depth", type=int, choices=BIT_DEPTHS, default=8, help="Bits per channel; 16 keeps Float precision's unrounded levels (default: 8).")
+    parser.add_argument("--png-compression", type=int, choices=range(10), default=DEFAULT_PNG_COMPRESSION, metavar="0-9",
+                        help=f"PNG deflate level; lower writes faster, larger files (default: {DEFAULT_PNG_COMPRESSION}).")
+    parser.add_argument("--workers", "-j", type=int, default=default_worker_count(), help="Parallel render processes (default: CPU count).")
+    parser.add_argument("--resume", action="store_true", help="Skip frames that already exist in the output directory.")
+    parser.add_argument("--map-cache", default=os.environ.get("GRAIN_MAP_CACHE"), metavar="DIR",
+                        help="Directory for persistent fixed sensor maps, reused across runs and farm workers (default: $GRAIN_MAP_CACHE).")
+    parser.add_argument("--trace", metavar="FILE", help="Profile every stage of every frame and write the trace to FILE.")
+    parser.add_argument("--trace-format", choices=TRACE_FORMATS, default=TRACE_FORMATS[0],
+                        help="Chrome Trace (open in chrome://tracing or Perfetto) or JSON with per-frame stage totals (default: Chrome Trace).")
+    parser.add_argument("--memory-budget", type=int, metavar="MB",
+                        help="Cap each render process's working memory; frames larger than this render in bands with identical output.")
+    return parser
+
+
+def params_from_args(args, background=None):
+    data = {}
+    if args.preset:
+        with open(args.preset) as f: data = json.load(f)
+    if background is not None:
+        data["width"], data["height"] = background.size
+    for field in ("width", "height", "seed", "supersample", "supersample_mode", "denoise_mode", "rng_mode", "banding_mode", "precision", "upscale_kernel", "blend_mode", "glow_engine", "grain_engine", "grain_spectrum", "grain_bank"):
+        if (value := getattr(args, field)) is not None: data[field] = value
+    sliders = dict(data.get("sliders", {}))
+    sliders.update(args.overrides)
+    data["sliders"] = sliders
+    return GrainParams.from_dict(data)
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    end = args.start if args.end is None else args.end
+    if end < args.start: parser.error("--end must not be before --start")
+
+    try:
+        plates = PlateSequence(args.background) if args.background and is_sequence_pattern(args.background) else None
+        # A sequence's first plate sets the frame size; the export decodes the rest as it goes.
+        background = decode_plate(plates.path(args.start)) if plates else Image.open(args.background).convert('RGB') if args.background else None
+        params = params_from_args(args, background)
+    except (OSError, ValueError, TypeError) as e:
+        logging.error(f"Invalid render settings: {e}"); return 1
+    if background is not None and background.size != (params.width, params.height):
+        logging.error(f"Background is {background.size[0]}x{background.size[1]}, but {params.width}x{params.height} was requested."); return 1
+
+    memory_budget = args.memory_budget * 2**20 if args.memory_budget else None
+    renderer = GrainRenderer(params, background, fixed_map_cache=FixedMapCache(store_dir=args.map_cache), memory_budget=memory_budget)
+    if renderer.uses_bands(): logging.info(f"Rendering in bands to stay within {args.memory_budget} MB per process.")
+    composite = background is not None and not args.grain_only
+    progress = lambda done, total: logging.info(f"[{done}/{total}] frames written")
+    output = OutputFormat(args.file_format, args.bit_depth, args.png_compression)
+    try: export_sequence(renderer, args.output, args.start, end, args.prefix, composite, args.workers, args.resume, progress, output, args.trace, args.trace_format, plates)
+    except FileNotFoundError as e: logging.error(f"Export failed: {e}"); return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,182 @@
+import copy
+import logging
+import os
+import tempfile
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+import multiprocessing
+from queue import Empty
+
+import cv2
+import numpy as np
+from PIL import Image
+
+from grain_cache import FixedMapCache
+from grain_plates import PlateReader
+from grain_profile import TRACE_FORMATS, StageProfiler, write_trace
+from grain_renderer import GrainRenderer
+from grain_writer import AsyncWriter, FrameWriter, OutputFormat
+
+
+def default_worker_count(): return max(1, os.cpu_count() or 1)
+
+# How often a parallel export collects the frames its workers report written, for progress.
+PROGRESS_POLL_SECONDS = 0.1
+
+
+
+# --- Worker process state ---
+# Each pool process builds one renderer in its initializer. The fixed maps are
+# memory-mapped from the fixed-map store the parent filled, so every worker
+# shares the same physical pages instead of regenerating PRNU/DSNU/banding/texture.
+# Frames are reported on the ``written`` queue as soon as their writes finish, for progress.
+# With ``profile`` each chunk is rendered under its own memory-tracking profiler, stopped when the chunk is done.
+_worker_renderer = _worker_plates = _worker_written = None
+_worker_profile = False
+
+def _init_worker(params, shared_dir, map_store_dir, has_background, memory_budget, profile, plates, written=None):
+    global _worker_renderer, _worker_plates, _worker_written, _worker_profile
+    cv2.setNumThreads(1)  # One process per core already; avoid oversubscribing OpenCV's own pool.
+    load = lambda name: np.load(os.path.join(shared_dir, f"{name}.npy"), mmap_mode='r')
+    background = Image.fromarray(np.asarray(load("background"))) if has_background else None
+    luma = load("luma") if has_background else None
+    _worker_renderer = GrainRenderer(params, background, luma, FixedMapCache(store_dir=map_store_dir), memory_budget)
+    _worker_plates, _worker_written, _worker_profile = plates, written, profile
+
+def _report_written(frames):
+    if _worker_written is not None:
+        for frame in frames: _worker_written.put(frame)
+
+def _render_frames_to(frames, composite, writer):
+    """Renders and writes ``frames``; returns them with the profiler events they produced."""
+    profiler = _worker_renderer.profiler = StageProfiler(track_memory=True) if _worker_profile else None
+    try:
+        with AsyncWriter(writer, profiler=profiler) as queue:
+            for frame, image in _worker_renderer.render_frames(frames, composite, writer.output.bits, _plate_reader(_worker_plates, frames, _worker_renderer)):
+                queue.submit(frame, image)
+                _report_written(queue.completed())
+            _report_written(queue.completed(wait=True))
+    finally:
+        if profiler: profiler.close()
+    return frames, profiler.take_events() if profiler else []
+
+
+def _plate_reader(plates, frames, renderer):
+    return None if plates is None else PlateReader(plates, frames, (renderer.params.width, renderer.params.height))
+
+
+def _publish_shared_state(renderer, shared_dir, plates=None):
+    """Writes everything workers need to ``shared_dir`` and returns the fixed-map store they should open.
+
+    A renderer whose cache already has an on-disk store shares it directly;
+    otherwise its maps are written to a temporary store in ``shared_dir``.
+    """
+    p = renderer.params
+    cache = renderer.fixed_map_cache
+    store = cache if cache.store_dir else FixedMapCache(store_dir=os.path.join(shared_dir, "maps"))
+    # Banded renderers stream their render-resolution maps; materializing them here would defeat the memory budget.
+    # Fast supersampling filters whole output-resolution maps, banded or not.
+    resolutions = set() if renderer.uses_bands() and renderer._fast_factor() == 1 else {(p.width * (factor := renderer._render_factor()), p.height * factor)}
+    if p["Micro-contrast"] > 0 and not renderer.uses_bands(): resolutions.add((p.width, p.height))
+    for width, height in resolutions:
+        store.put(renderer._fixed_map_key(width, height), renderer._get_fixed_maps_for_resolution(width, height))
+    # Workers decode a plate sequence themselves, frame by frame.
+    if renderer.background is not None and plates is None:
+        np.save(os.path.join(shared_dir, "background.npy"), np.asarray(renderer.background))
+        np.save(os.path.join(shared_dir, "luma.npy"), renderer.luma)
+    return store.store_dir
+
+
+def _save_trace(events, path, trace_format):
+    write_trace(events, path, trace_format)
+    logging.info(f"Wrote a {trace_format} of {len(events)} stage(s) to {path}")
+
+
+def export_sequence(renderer, output_dir, start, end, prefix, composite=False, workers=1, resume=False, progress=None, output=OutputFormat(),
+                    trace=None, trace_format=TRACE_FORMATS[0], plates=None):
+    """Renders frames ``start..end`` to ``{prefix}.{frame:04d}.png`` in ``output_dir`` (or as ``output`` says, see ``FrameWriter``).
+
+    Grain is synthesized in batches (``GrainRenderer.render_frames``); with
+    ``workers > 1`` the batches are spread over a process pool. Each
+    rendering process hands finished frames to writer threads
+    (``AsyncWriter``), so encoding overlaps with rendering. Frames are
+    written to hidden ``.partial`` files and committed (renamed) strictly in
+    frame order, so an interrupted export always leaves a contiguous run of
+    finished frames. ``resume`` skips frames whose output already exists; a
+    frame stack is only published complete, so an unfinished one starts over.
+    ``progress(done, total)`` is called as each frame is written. With a
+    ``trace`` path, every stage of every frame (writes included) is
+    profiled and saved there in ``trace_format`` (see ``write_trace``).
+    ``plates`` (a ``PlateSequence``) composites frame N over plate N instead
+    of ``renderer.background``; plates are decoded ahead on reader threads
+    (``PlateReader``) in each rendering process.
+    Returns the list of frames written by this call.
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    writer = FrameWriter(output_dir, prefix, start, end, output)
+    frames = [f for f in range(start, end + 1) if not (resume and writer.exists(f))]
+    if resume and (skipped := end - start + 1 - len(frames)): logging.info(f"Resuming export: {skipped} frame(s) already on disk.")
+    total, committed, rendered, written, events = len(frames), 0, set(), set(), []
+    plates = plates if composite else None
+    if plates is not None and (missing := [f for f in frames if not os.path.exists(plates.path(f))]):
+        raise FileNotFoundError(f"{len(missing)} background plate(s) missing, first {plates.path(missing[0])}")
+
+    def report(frame):
+        if frame in written: return
+        written.add(frame)
+        if progress: progress(len(written), total)
+
+    def commit(frame):
+        nonlocal committed
+        report(frame)
+        rendered.add(frame)
+        while committed < total and frames[committed] in rendered:
+            writer.commit(frames[committed])
+            committed += 1
+
+    try:
+        if total: writer.prepare(renderer.params.height, renderer.params.width)
+        if workers <= 1 or total <= 1:
+            if trace: renderer = copy.copy(renderer); renderer.profiler = StageProfiler(track_memory=True)
+            try:
+                with AsyncWriter(writer, profiler=renderer.profiler if trace else None) as queue:
+                    for frame, image in renderer.render_frames(frames, composite, output.bits, _plate_reader(plates, frames, renderer)):
+                        queue.submit(frame, image)
+                        for done in queue.completed(): commit(done)
+                    for done in queue.completed(wait=True): commit(done)
+            finally:
+                if trace: renderer.profiler.close()
+            if total: writer.finish()
+            if trace: _save_trace(renderer.profiler.take_events(), trace, trace_format)
+            return frames
+
+        with tempfile.TemporaryDirectory(prefix="grain_maps_") as shared_dir:
+            map_store_dir = _publish_shared_state(renderer, shared_dir, plates)
+            context = multiprocessing.get_context("spawn")
+            # Workers report each frame as its write finishes; chunks only complete (and commit) as a whole.
+            written_queue = context.Queue() if progress else None
+            initargs = (renderer.params, shared_dir, map_store_dir, renderer.background is not None and plates is None, renderer.memory_budget, bool(trace),
+                        plates, written_queue)
+            with ProcessPoolExecutor(max_workers=min(workers, total), mp_context=context, initializer=_init_worker, initargs=initargs) as pool:
+                # Batches no larger than an even share of the frames, so every worker gets some.
+                batch = min(renderer.batch_size(), -(-total // workers))
+                chunks = [frames[i:i + batch] for i in range(0, total, batch)]
+                futures = [pool.submit(_render_frames_to, chunk, composite, writer) for chunk in chunks]
+                try:
+                    pending = set(futures)
+                    while pending:
+                        finished, pending = wait(pending, PROGRESS_POLL_SECONDS if written_queue else None, FIRST_COMPLETED)
+                        while written_queue is not None:
+                            try: report(written_queue.get_nowait())
+                            except Empty: break
+                        for future in finished:
+                            done, chunk_events = future.result()
+                            events.extend(chunk_events)
+                            for frame in done: commit(frame)
+                except BaseException:
+                    pool.shutdown(wait=True, cancel_futures=True)
+                    raise
+        writer.finish()
+        if trace: _save_trace(events, trace, trace_format)
+        return frames
+    finally:
+        if committed < total: writer.discard(frames[committed:])
@@ -0,0 +1,50 @@
+import math
+
+import cv2
+import numpy as np
+
+GLOW_ENGINES = ("Gaussian", "Pyramid")
+# Film halation: red light scatters furthest through the film base, blue hardly at all.
+HALATION_SPREAD = (1.0, 0.5, 0.0)
+# A pyramid blur stops halving once the blur left to apply would fall below this many pixels of the reduced level.
+MIN_LEVEL_SIGMA = 2.0
+
+
+def kernel_sigma(radius):
+    """The sigma OpenCV's GaussianBlur derives for a ``2 * radius + 1`` kernel."""
+    return 0.3 * (radius - 1) + 0.8
+
+
+def pyramid_levels(sigma, size):
+    """How many times a pyramid blur of ``sigma`` halves a frame whose short side is ``size`` pixels."""
+    levels = 0
+    while sigma / 2 ** (levels + 1) >= MIN_LEVEL_SIGMA and size >> (levels + 1) >= 8: levels += 1
+    return levels
+
+
+def pyramid_reach(sigma, levels):
+    """Pixels of input on each side that a pyramid blur reads: the level blur's 4 sigma plus the pyrDown/pyrUp taps."""
+    return math.ceil(4 * sigma) + 4 * 2 ** levels
+
+
+def pyramid_blur(image, sigmas, levels):
+    """Each channel of an (H, W, C) uint8 or float32 ``image`` Gaussian-blurred by ``sigmas[c]`` through an image pyramid.
+
+    Channel ``c`` is halved ``levels[c]`` times with ``pyrDown``, blurred by
+    whatever its sigma still needs after the pyramid's own smoothing, and
+    expanded back with ``pyrUp``, so the cost barely grows with the sigma.
+    A crop whose origin is a multiple of ``2 ** max(levels)`` pixels, taken
+    with ``pyramid_reach`` pixels of margin, blurs to the same pixels as the
+    whole frame (bit for bit in uint8, which OpenCV filters in fixed point).
+    """
+    pyramid = [image]
+    for _ in range(max(levels)): pyramid.append(cv2.pyrDown(pyramid[-1]))
+    out = np.empty_like(image)
+    for c, (sigma, level) in enumerate(zip(sigmas, levels)):
+        # pyrDown and pyrUp each smooth with a variance of one pixel of the finer level: (4^L - 1) / 3 frame pixels² per direction.
+        residual = math.sqrt(max(0.0, sigma ** 2 - 2 * (4 ** level - 1) / 3)) / 2 ** level
+        plane = np.ascontiguousarray(pyramid[level][..., c])
+        if residual > 0: plane = cv2.GaussianBlur(plane, (0, 0), residual)
+        for finer in reversed(pyramid[:level]): plane = cv2.pyrUp(plane, dstsize=(finer.shape[1], finer.shape[0]))
+        out[..., c] = plane
+    return out
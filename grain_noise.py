@@ -0,0 +1,397 @@
+import copy
+import random
+from functools import lru_cache
+
+import numpy as np
+
+# Upper bound on elements drawn per call while walking a stream, which keeps
+# pre-passes memory-flat regardless of plate resolution.
+STREAM_CHUNK_ELEMENTS = 1 << 20
+
+
+@lru_cache(maxsize=64)
+def nearest_index(out_size, in_size):
+    """Source index of every output pixel for a NEAREST resize of ``in_size`` -> ``out_size``.
+
+    Replicates Pillow's scale-affine sampler (half-pixel start, accumulated
+    step), so gathering with this index matches ``Image.resize(NEAREST)``.
+    """
+    step = in_size / out_size
+    steps = np.full(out_size, step)
+    steps[0] = step * 0.5
+    index = np.add.accumulate(steps).astype(np.intp)
+    index.flags.writeable = False
+    return index
+
+
+# --- Noise upscaling ---
+# Grain is drawn one value per cell and expanded to pixels here, in float32.
+# "Nearest" gives the blocky cells of Image.resize(NEAREST); the smooth kernels
+# interpolate between cell centres (Bicubic is Keys' a = -0.5 cubic).
+UPSCALE_KERNELS = ("Nearest", "Bilinear", "Bicubic")
+_KERNEL_TAPS = {"Bilinear": 2, "Bicubic": 4}
+
+
+def _kernel_weights(kernel, t):
+    if kernel == "Bilinear": return np.stack([1.0 - t, t], axis=1)
+    t2, t3 = t * t, t * t * t
+    return np.stack([-0.5 * t3 + t2 - 0.5 * t, 1.5 * t3 - 2.5 * t2 + 1.0, -1.5 * t3 + 2.0 * t2 + 0.5 * t, 0.5 * t3 - 0.5 * t2], axis=1)
+
+
+@lru_cache(maxsize=64)
+def _axis_taps(out_size, in_size, kernel):
+    """(index, weights) of the source cells every output position reads; weights is None for Nearest.
+
+    Interpolating averages neighbouring cells, which would lower the noise
+    amplitude; the weights are scaled so the mean of their squares matches
+    Nearest's, keeping each noise slider's strength across kernels.
+    """
+    if kernel == "Nearest": return nearest_index(out_size, in_size), None
+    centre = (np.arange(out_size) + 0.5) * (in_size / out_size) - 0.5
+    first = np.floor(centre)
+    taps = _KERNEL_TAPS[kernel]
+    index = np.clip(first.astype(np.intp)[:, None] + np.arange(-(taps // 2) + 1, taps // 2 + 1), 0, in_size - 1)
+    weights = _kernel_weights(kernel, centre - first)
+    weights = (weights / np.sqrt(np.mean(np.sum(weights ** 2, axis=1)))).astype(np.float32)
+    index.flags.writeable = weights.flags.writeable = False
+    return index, weights
+
+
+def upscale_matrix(out_size, in_size, kernel):
+    """Dense (out_size, in_size) matrix of the expansion from ``in_size`` cells to ``out_size`` pixels along one axis, for spectral analysis."""
+    index, weights = _axis_taps(out_size, in_size, kernel)
+    matrix = np.zeros((out_size, in_size))
+    if weights is None: matrix[np.arange(out_size), index] = 1.0
+    else: np.add.at(matrix, (np.arange(out_size)[:, None], index), weights)
+    return matrix
+
+
+class NoiseUpscaler:
+    """Expands noise fields of ``n_rows`` × ``n_cols`` cells onto ``box`` of a ``width`` × ``height`` plate.
+
+    Only the cells in ``self.cells`` are read, and every pixel depends on its
+    plate position alone, so boxes and bands match a full-plate upscale.
+    Nearest repeats columns and broadcasts rows through a blocked view of the
+    destination when every cell spans the same number of rows, so the
+    full-size field is never materialized.
+    """
+    def __init__(self, width, height, n_cols, n_rows, box, kernel="Nearest"):
+        x0, y0, x1, y1 = box
+        # One cell per pixel: every kernel reduces to a copy.
+        self.kernel = kernel = "Nearest" if (n_cols, n_rows) == (width, height) else kernel
+        (row_index, row_weights), (col_index, col_weights) = _axis_taps(height, n_rows, kernel), _axis_taps(width, n_cols, kernel)
+        row_index, col_index = row_index[y0:y1], col_index[x0:x1]
+        if kernel != "Nearest": self.row_weights, self.col_weights = row_weights[y0:y1], col_weights[x0:x1]
+        self.cells = (int(col_index.min()), int(row_index.min()), int(col_index.max()) + 1, int(row_index.max()) + 1)
+        self.row_index, self.col_index = row_index - self.cells[1], col_index - self.cells[0]
+        if kernel == "Nearest":
+            # Nearest indices never decrease, so each cell covers one run of pixels.
+            self.row_counts, self.col_counts = np.bincount(self.row_index), np.bincount(self.col_index)
+
+    def add_to(self, dest, fields, mask=None):
+        """``dest += upscale(fields) * mask`` for an (N, h, w[, C]) block of cell values and an (N, H, W[, C]) ``dest``."""
+        if self.kernel != "Nearest":
+            expanded = _interpolate(_interpolate(fields, self.col_index, self.col_weights, 2), self.row_index, self.row_weights, 1)
+            if mask is not None: expanded *= mask
+            dest += expanded
+            return
+        if (self.col_counts != 1).any(): fields = np.repeat(fields, self.col_counts, axis=2)
+        if (rows := self.row_counts[0]) > 1 and (self.row_counts == rows).all() and dest.flags.c_contiguous:
+            # Every cell spans ``rows`` pixel rows: add through an (N, h, rows, W[, C]) view of ``dest``.
+            dest = dest.reshape(dest.shape[:1] + (len(self.row_counts), rows) + dest.shape[2:])
+            fields = fields[:, :, None]
+            if mask is not None: mask = mask.reshape((len(self.row_counts), rows) + mask.shape[1:])
+        elif (self.row_counts != 1).any():
+            fields = np.repeat(fields, self.row_counts, axis=1)
+        dest += fields if mask is None else fields * mask
+
+
+def _interpolate(block, index, weights, axis):
+    shape = [1] * block.ndim
+    shape[axis] = -1
+    out = np.take(block, index[:, 0], axis=axis) * weights[:, 0].reshape(shape)
+    for k in range(1, index.shape[1]): out += np.take(block, index[:, k], axis=axis) * weights[:, k].reshape(shape)
+    return out
+
+
+class _RowStream:
+    """Replays one component of a sequential generator by row range.
+
+    Requests are expected to move forward (with some overlap between
+    neighbouring bands); the most recent block is kept so overlapping rows are
+    not redrawn. Going backwards restarts the stream from its recorded state.
+    """
+    def __init__(self, state, draw, transform):
+        self.state, self.draw, self.transform = state, draw, transform
+        self.rng, self.pos = None, 0
+        self.block, self.block_start = None, 0
+
+    def _restart(self):
+        self.rng = np.random.Generator(np.random.PCG64())
+        self.rng.bit_generator.state = copy.deepcopy(self.state)
+        self.pos, self.block, self.block_start = 0, None, 0
+
+    def rows(self, start, stop):
+        if self.rng is None or start < self.block_start: self._restart()
+        if self.block is not None and start > self.block_start:
+            self.block, self.block_start = self.block[start - self.block_start:], start
+        while self.pos < start:
+            self.draw(self.rng, n := min(start - self.pos, self.chunk_rows))
+            self.pos += n
+        if self.block is None or self.pos <= start: self.block, self.block_start = None, start
+        if stop > self.pos:
+            fresh = self.transform(self.draw(self.rng, stop - self.pos))
+            self.block = fresh if self.block is None else np.concatenate([self.block, fresh])
+            self.pos = stop
+        return self.block[start - self.block_start:stop - self.block_start]
+
+
+class SequentialNoise:
+    """The random fields one ``Generator`` produces, in draw order, readable by row range.
+
+    ``components`` is an ordered list of ``(name, draw, transform)`` where
+    ``draw(rng, n_rows)`` consumes the generator for ``n_rows`` rows and
+    ``transform`` maps the raw draw to the field's values. ``extra(rng)``, if
+    given, runs after all components (e.g. sparse firefly draws) and its
+    result is stored as ``self.extra``.
+
+    With ``streamed=False`` every field is drawn whole, exactly as a single
+    sequential call would. With ``streamed=True`` a pre-pass walks each field
+    once in bounded chunks, recording the generator state at its start and its
+    value range, so any row range can later be replayed bit-identically
+    without holding the full field in memory. Column windows are cut from
+    full-width rows, since a sequential stream cannot skip within a row.
+    """
+    quantized = True
+
+    def __init__(self, rng, n_rows, n_cols, components, extra=None, streamed=False, need_ranges=True):
+        self.n_rows, self.n_cols, self.streamed = n_rows, n_cols, streamed
+        self._fields, self._streams, self._ranges = {}, {}, {}
+        for i, (name, draw, transform) in enumerate(components):
+            if not streamed:
+                self._fields[name] = transform(draw(rng, n_rows))
+                continue
+            self._streams[name] = stream = _RowStream(copy.deepcopy(rng.bit_generator.state), draw, transform)
+            stream.chunk_rows = max(1, STREAM_CHUNK_ELEMENTS // max(1, draw(copy.deepcopy(rng), 1).size))
+            if need_ranges or i < len(components) - 1 or extra is not None:
+                lo = hi = None
+                for start in range(0, n_rows, stream.chunk_rows):
+                    raw = draw(rng, min(stream.chunk_rows, n_rows - start))
+                    if need_ranges:
+                        chunk = transform(raw)
+                        c_lo, c_hi = chunk.min(axis=(0, 1)), chunk.max(axis=(0, 1))
+                        lo, hi = (c_lo, c_hi) if lo is None else (np.minimum(lo, c_lo), np.maximum(hi, c_hi))
+                self._ranges[name] = (lo, hi)
+        self.extra = extra(rng) if extra is not None else None
+
+    def __contains__(self, name): return name in self._fields or name in self._streams
+
+    def rows(self, name, start, stop):
+        if name in self._fields: return self._fields[name][start:stop]
+        return self._streams[name].rows(start, stop)
+
+    def window(self, name, box):
+        x0, y0, x1, y1 = box
+        return self.rows(name, y0, y1)[:, x0:x1]
+
+    def points(self, box):
+        """Sparse ``extra`` points ``(y, x, values)`` inside ``box``, in draw order and box-local coordinates."""
+        if self.extra is None: return None
+        y, x, values = self.extra
+        x0, y0, x1, y1 = box
+        inside = (y >= y0) & (y < y1) & (x >= x0) & (x < x1)
+        return y[inside] - y0, x[inside] - x0, values[inside]
+
+    def value_range(self, name):
+        """Per-channel (min, max) of the whole field, as ``GrainRenderer._noise_cells`` quantizes over."""
+        if name in self._fields:
+            field = self._fields[name]
+            return field.min(axis=(0, 1)), field.max(axis=(0, 1))
+        return self._ranges[name]
+
+
+# --- Gradient (Perlin) noise ---
+# Vectorized replacement for evaluating ``perlin_noise.PerlinNoise`` point by
+# point. ``frequency`` is that library's ``octaves`` argument: lattice cells per
+# unit of input coordinate.
+# perlin_noise picks a random seed when given 0; pin one so seed 0 is reproducible.
+_ZERO_SEED_SUBSTITUTE = 100001
+
+
+def _fade(t): return 6 * t ** 5 - 15 * t ** 4 + 10 * t ** 3
+
+
+def gradient_noise_1d(coords, frequency, seed):
+    """``PerlinNoise(octaves=frequency, seed=seed)(c)`` for every ``c`` in ``coords``, in one pass.
+
+    Lattice gradients are drawn exactly as the library draws them (``random``
+    seeded with ``seed * (i + 1)``), so profiles match its output.
+    """
+    seed = seed or _ZERO_SEED_SUBSTITUTE
+    x = np.asarray(coords, dtype=np.float64) * frequency
+    cell = np.floor(x).astype(np.int64)
+    first = int(cell.min(initial=0))
+    lattice = range(first, int(cell.max(initial=0)) + 2)
+    gradients = np.array([random.Random(seed * max(1, abs(i + 1))).uniform(-1, 1) for i in lattice])
+    value = np.zeros_like(x)
+    for corner in (0, 1):
+        dist = x - (cell + corner)
+        value += _fade(1 - np.abs(dist)) * (gradients[cell + corner - first] * dist)
+    return value
+
+
+def gradient_noise_2d(y_coords, x_coords, frequency, seed):
+    """2D gradient noise over the grid ``y_coords`` × ``x_coords`` (float32).
+
+    Same lattice, fade and frequency semantics as ``gradient_noise_1d``; the
+    per-vertex gradients come from the counter hash so that every window of
+    the grid evaluates identically on its own.
+    """
+    y = np.asarray(y_coords, dtype=np.float64) * frequency
+    x = np.asarray(x_coords, dtype=np.float64) * frequency
+    cy, cx = np.floor(y).astype(np.int64), np.floor(x).astype(np.int64)
+    y0, x0 = int(cy.min(initial=0)), int(cx.min(initial=0))
+    vertex_y = np.arange(y0, int(cy.max(initial=0)) + 2, dtype=np.int64).astype(np.uint64)
+    vertex_x = np.arange(x0, int(cx.max(initial=0)) + 2, dtype=np.int64).astype(np.uint64)
+    vertex = (vertex_y[:, None] << _U64(32)) + vertex_x[None, :] * _U64(2)
+    key = stream_key(seed, 0x9A7D)
+    grad_y = (bits_to_uniform(counter_bits(key, vertex)) * 2 - 1).astype(np.float32)
+    grad_x = (bits_to_uniform(counter_bits(key, vertex + _U64(1))) * 2 - 1).astype(np.float32)
+
+    value = np.zeros((len(y), len(x)), dtype=np.float32)
+    for oy in (0, 1):
+        dy = (y - (cy + oy)).astype(np.float32)
+        wy = _fade(1 - np.abs(dy))
+        rows = cy + oy - y0
+        for ox in (0, 1):
+            dx = (x - (cx + ox)).astype(np.float32)
+            wx = _fade(1 - np.abs(dx))
+            cols = cx + ox - x0
+            value += (wy[:, None] * wx[None, :]) * (grad_y[rows][:, cols] * dy[:, None] + grad_x[rows][:, cols] * dx[None, :])
+    return value
+
+
+# --- Position-addressable (counter-based) noise ---
+# Every value is a pure function of (key, stream, position): a SplitMix64
+# finalizer applied to the position counter offset by a per-stream key. Any
+# window of a field can therefore be generated on its own and matches the
+# same window of the full field exactly.
+_U64 = np.uint64
+_GOLDEN = _U64(0x9E3779B97F4A7C15)
+_MASK64 = (1 << 64) - 1
+POINT_CELL = 32
+_MAX_POINTS_PER_CELL = 1 << 16
+
+
+def _mix64(z):
+    z = z + _GOLDEN
+    z = (z ^ (z >> _U64(30))) * _U64(0xBF58476D1CE4E5B9)
+    z = (z ^ (z >> _U64(27))) * _U64(0x94D049BB133111EB)
+    return z ^ (z >> _U64(31))
+
+
+def stream_key(seed, stream):
+    return _mix64(_mix64(np.array([seed & _MASK64], dtype=_U64)) ^ _U64(stream))[0]
+
+
+def counter_bits(key, index):
+    return _mix64(np.asarray(index, dtype=_U64) + key)
+
+
+def bits_to_uniform(bits): return (bits >> _U64(11)).astype(np.float64) * (1.0 / (1 << 53))
+
+
+def bits_to_normal(bits):
+    """One standard normal per 64-bit counter value (Box-Muller on its two 32-bit halves)."""
+    u1 = ((bits >> _U64(32)).astype(np.float64) + 1.0) * (1.0 / (1 << 32))
+    u2 = (bits & _U64(0xFFFFFFFF)).astype(np.float64) * (1.0 / (1 << 32))
+    return np.sqrt(-2.0 * np.log(u1)) * np.cos(2.0 * np.pi * u2)
+
+
+@lru_cache(maxsize=8)
+def _poisson_cdf(lam):
+    k = np.arange(int(lam + 12 * np.sqrt(lam) + 20))
+    log_pmf = k * np.log(lam) - lam - np.cumsum(np.log(np.maximum(k, 1)))
+    return np.cumsum(np.exp(log_pmf))
+
+
+def bits_to_poisson(bits, lam):
+    """Inverse-CDF Poisson sample per counter value (fixed ``lam``)."""
+    return np.searchsorted(_poisson_cdf(float(lam)), bits_to_uniform(bits), side="right")
+
+
+def _poisson_per_cell(lam, u):
+    k = np.zeros(lam.shape, dtype=np.int64)
+    p = np.exp(-lam)
+    cdf = p.copy()
+    for i in range(1, int(lam.max(initial=0) + 12 * np.sqrt(lam.max(initial=0)) + 20)):
+        more = u > cdf
+        if not more.any(): break
+        k += more
+        p = p * lam / i
+        cdf += p
+    return k
+
+
+SAMPLERS = {
+    "normal": bits_to_normal,
+    "poisson25": lambda bits: bits_to_poisson(bits, 25.0),
+}
+
+
+class AddressableNoise:
+    """Counter-based counterpart of ``SequentialNoise`` with the same read interface.
+
+    ``components`` is a list of ``(name, stream, sampler, channels, transform)``:
+    ``sampler`` names an entry of ``SAMPLERS`` and ``transform`` maps raw
+    samples to field values. ``points`` optionally describes sparse points as
+    ``(stream, density, n_uniforms, to_values)``; they are scattered per
+    ``POINT_CELL``-sized cell with Poisson counts, so any box can be generated
+    in time proportional to its area and point count. Fields are not
+    quantized before upscaling.
+    """
+    quantized = False
+
+    def __init__(self, seed, n_rows, n_cols, components, points=None, plate_size=None):
+        self.n_rows, self.n_cols = n_rows, n_cols
+        self._components = {name: (stream_key(seed, stream), SAMPLERS[sampler], channels, transform)
+                            for name, stream, sampler, channels, transform in components}
+        self._seed, self._points, self._plate_size = seed, points, plate_size
+
+    def __contains__(self, name): return name in self._components
+
+    def value_range(self, name): return None
+
+    def window(self, name, box):
+        x0, y0, x1, y1 = box
+        key, sampler, channels, transform = self._components[name]
+        index = np.arange(y0, y1, dtype=np.uint64)[:, None] * _U64(self.n_cols) + np.arange(x0, x1, dtype=np.uint64)[None, :]
+        if channels > 1: index = index[..., None] * _U64(channels) + np.arange(channels, dtype=np.uint64)
+        return transform(sampler(counter_bits(key, index)))
+
+    def rows(self, name, start, stop): return self.window(name, (0, start, self.n_cols, stop))
+
+    def points(self, box):
+        if self._points is None: return None
+        stream, density, n_uniforms, to_values = self._points
+        width, height = self._plate_size
+        x0, y0, x1, y1 = box
+        cells_x = -(-width // POINT_CELL)
+        cy, cx = np.meshgrid(np.arange(y0 // POINT_CELL, (y1 - 1) // POINT_CELL + 1),
+                             np.arange(x0 // POINT_CELL, (x1 - 1) // POINT_CELL + 1), indexing="ij")
+        cy, cx = cy.ravel(), cx.ravel()
+        cell_h = np.minimum(POINT_CELL, height - cy * POINT_CELL)
+        cell_w = np.minimum(POINT_CELL, width - cx * POINT_CELL)
+        cell_id = (cy * cells_x + cx).astype(np.uint64)
+        counts = _poisson_per_cell(density * cell_h * cell_w, bits_to_uniform(counter_bits(stream_key(self._seed, stream), cell_id)))
+        counts = np.minimum(counts, _MAX_POINTS_PER_CELL)
+
+        first = np.cumsum(counts) - counts
+        k = np.arange(counts.sum(), dtype=np.uint64) - np.repeat(first, counts).astype(np.uint64)
+        point = np.repeat(cell_id, counts) * _U64(_MAX_POINTS_PER_CELL) + k
+        uniforms = bits_to_uniform(counter_bits(stream_key(self._seed, stream + 1),
+                                                point[:, None] * _U64(n_uniforms + 2) + np.arange(n_uniforms + 2, dtype=np.uint64)))
+        y = np.repeat(cy * POINT_CELL, counts) + (uniforms[:, 0] * np.repeat(cell_h, counts)).astype(np.int64)
+        x = np.repeat(cx * POINT_CELL, counts) + (uniforms[:, 1] * np.repeat(cell_w, counts)).astype(np.int64)
+        inside = (y >= y0) & (y < y1) & (x >= x0) & (x < x1)
+        return y[inside] - y0, x[inside] - x0, to_values(uniforms[inside, 2:])
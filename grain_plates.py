@@ -0,0 +1,111 @@
+import glob
+import os
+import re
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+# OpenCV only decodes EXR when asked to; it reads the switch on first use.
+os.environ.setdefault("OPENCV_IO_ENABLE_OPENEXR", "1")
+
+import cv2
+import numpy as np
+from PIL import Image
+
+# Decoder threads per rendering process, and decoded plates that may wait for the renderer.
+READER_THREADS = 2
+READER_LOOKAHEAD_FRAMES = 4
+# Scene-linear formats, decoded with OpenCV and encoded to sRGB for compositing.
+LINEAR_EXTENSIONS = (".exr", ".hdr")
+_FRAME_PATTERN = re.compile(r"#+")
+
+
+def is_sequence_pattern(path): return bool(_FRAME_PATTERN.search(os.path.basename(path)))
+
+
+def sequence_pattern_for(path):
+    """The pattern of the sequence a frame file belongs to: its last run of digits as #s (``shot.1001.png`` → ``shot.####.png``), or None."""
+    name = os.path.basename(path)
+    if not (matches := list(re.finditer(r"\d+", name))): return None
+    m = matches[-1]
+    return os.path.join(os.path.dirname(path), name[:m.start()] + "#" * len(m.group()) + name[m.end():])
+
+
+class PlateSequence:
+    """Background plates numbered by frame: ``pattern`` names them with a run of #s, e.g. ``shot.####.png``.
+
+    Frame numbers are zero-padded to the number of #s (longer numbers are
+    used as they are), like the sequences this app exports.
+    """
+    def __init__(self, pattern):
+        if not is_sequence_pattern(pattern): raise ValueError(f"Sequence pattern needs a #### frame number: {pattern}")
+        self.pattern = pattern
+        directory, name = os.path.split(pattern)
+        m = _FRAME_PATTERN.search(name)
+        self._directory, self._head, self._tail, self._digits = directory, name[:m.start()], name[m.end():], len(m.group())
+
+    def __repr__(self): return f"PlateSequence({self.pattern!r})"
+
+    def path(self, frame): return os.path.join(self._directory, f"{self._head}{frame:0{self._digits}d}{self._tail}")
+
+    def frames(self):
+        """Frame numbers with a plate on disk, in order."""
+        found = set()
+        number = re.compile(re.escape(self._head) + r"(\d+)" + re.escape(self._tail) + "$")
+        for path in glob.glob(os.path.join(glob.escape(self._directory), glob.escape(self._head) + "*" + glob.escape(self._tail))):
+            if (m := number.match(os.path.basename(path))) and len(m.group(1)) >= self._digits: found.add(int(m.group(1)))
+        return sorted(found)
+
+    def size(self, frame):
+        """(width, height) of a plate, read from its header."""
+        path = self.path(frame)
+        if path.lower().endswith(LINEAR_EXTENSIONS): return decode_plate(path).size
+        with Image.open(path) as img: return img.size
+
+
+def decode_plate(path):
+    """One plate as an 8-bit RGB image; scene-linear EXR/HDR frames are clipped to 0-1 and sRGB-encoded."""
+    if not path.lower().endswith(LINEAR_EXTENSIONS): return Image.open(path).convert('RGB')
+    if (arr := cv2.imread(path, cv2.IMREAD_UNCHANGED)) is None:
+        raise OSError(f"Could not decode {path} (this OpenCV build may lack OpenEXR support)")
+    arr = np.clip(np.atleast_3d(arr.astype(np.float32))[..., :3], 0.0, 1.0)
+    arr = arr[..., [0, 0, 0]] if arr.shape[2] == 1 else arr[..., ::-1]
+    srgb = np.where(arr <= 0.0031308, arr * 12.92, 1.055 * arr ** (1 / 2.4) - 0.055)
+    return Image.fromarray(np.rint(srgb * 255).astype(np.uint8))
+
+
+def plate_luma(image):
+    """The shadow-bias luma map of a background, as the app computes it for a still."""
+    return np.array(image.convert('L'), dtype=np.float32) / 255.0
+
+
+class PlateReader:
+    """Decodes ``sequence``'s ``frames`` on ``threads`` background threads, at most ``lookahead`` frames ahead.
+
+    Iterating yields ``(background, luma)`` per frame, in order; the luma
+    map is computed on the decoding thread too. Memory stays bounded by the
+    look-ahead however long the shot is, and decoding overlaps with whatever
+    the consumer does between frames. Every plate must be ``size``.
+    """
+    def __init__(self, sequence, frames, size, threads=READER_THREADS, lookahead=READER_LOOKAHEAD_FRAMES):
+        self.sequence, self.frames, self.size = sequence, list(frames), size
+        self.threads, self.lookahead = threads, max(1, lookahead)
+
+    def _load(self, frame):
+        path = self.sequence.path(frame)
+        try: image = decode_plate(path)
+        except FileNotFoundError: raise FileNotFoundError(f"Background plate for frame {frame} is missing: {path}") from None
+        if image.size != self.size:
+            raise ValueError(f"Background plate {path} is {image.size[0]}x{image.size[1]}, expected {self.size[0]}x{self.size[1]}")
+        return image, plate_luma(image)
+
+    def __iter__(self):
+        pool, frames, pending = ThreadPoolExecutor(self.threads, thread_name_prefix="grain-plates"), iter(self.frames), deque()
+        try:
+            for frame in frames:
+                pending.append(pool.submit(self._load, frame))
+                if len(pending) >= self.lookahead: break
+            while pending:
+                plate = pending.popleft().result()
+                if (frame := next(frames, None)) is not None: pending.append(pool.submit(self._load, frame))
+                yield plate
+        finally: pool.shutdown(wait=True, cancel_futures=True)
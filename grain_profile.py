@@ -0,0 +1,136 @@
+import json
+import os
+import threading
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+TRACE_FORMATS = ("Chrome Trace", "JSON")
+# Stages the status bar names after the total, slowest first.
+SUMMARY_STAGES = 5
+
+
+class StageProfiler:
+    """Records the wall time, allocated bytes and pixels of every pipeline stage a renderer runs.
+
+    ``stage(name, pixels)`` wraps one step and appends an event (a plain
+    dict, so worker processes can send theirs back to the exporter) to
+    ``events``. With ``track_memory`` allocations are measured with
+    ``tracemalloc``, which the profiler switches on until ``close()`` (it
+    slows every allocation, so interactive renders leave it off): ``bytes``
+    is the most a stage had allocated at once beyond what was live when it
+    started, counting numpy arrays and OpenCV's outputs but not OpenCV's
+    internal scratch buffers. tracemalloc is process-wide, so concurrent
+    renders in other threads blur each other's figures. Stages may nest;
+    each thread keeps its own nesting.
+    """
+    def __init__(self, track_memory=False):
+        self.events = []
+        self.frames = ()
+        self.track_memory = track_memory
+        self._local = threading.local()
+        self._started_tracing = track_memory and not tracemalloc.is_tracing()
+        if self._started_tracing: tracemalloc.start()
+
+    def close(self):
+        """Stops tracemalloc if this profiler started it; later stages record times only."""
+        if self._started_tracing: tracemalloc.stop()
+        self._started_tracing = self.track_memory = False
+
+    def __enter__(self): return self
+
+    def __exit__(self, *exc): self.close()
+
+    @contextmanager
+    def working_on(self, frames):
+        """Attributes stages run inside the block to ``frames`` unless they name their own."""
+        previous, self.frames = self.frames, tuple(frames)
+        try: yield
+        finally: self.frames = previous
+
+    @contextmanager
+    def stage(self, name, pixels=0, frames=None, memory=True):
+        """Times the block as stage ``name`` working on ``pixels`` pixels of ``frames`` (default: the current ones).
+
+        With ``memory=False`` allocations are not measured, for stages that
+        run beside the render on other threads and would disturb its peaks.
+        """
+        open_stages = self._local.__dict__.setdefault("open", [])
+        memory = memory and self.track_memory and tracemalloc.is_tracing()
+        # [allocated at the start, highest allocation seen]; a nested stage resets tracemalloc's peak, so it hands its peak up.
+        entry = [0, 0]
+        if memory:
+            current, peak = tracemalloc.get_traced_memory()
+            if open_stages: open_stages[-1][1] = max(open_stages[-1][1], peak)
+            tracemalloc.reset_peak()
+            entry = [current, current]
+        open_stages.append(entry)
+        start = time.perf_counter_ns()
+        try: yield
+        finally:
+            seconds = (time.perf_counter_ns() - start) / 1e9
+            open_stages.pop()
+            if memory:
+                entry[1] = max(entry[1], tracemalloc.get_traced_memory()[1])
+                tracemalloc.reset_peak()
+                if open_stages: open_stages[-1][1] = max(open_stages[-1][1], entry[1])
+        self.events.append({"stage": name, "frames": list(self.frames if frames is None else frames), "start": start / 1000,
+                            "seconds": seconds, "bytes": entry[1] - entry[0], "pixels": pixels, "depth": len(open_stages),
+                            "pid": os.getpid(), "tid": threading.get_ident()})
+
+    def take_events(self):
+        """The events recorded so far, which are removed from the profiler."""
+        events, self.events = self.events, []
+        return events
+
+    def summary(self):
+        """One line for the status bar: the wall time the stages spanned and the slowest top-level stages."""
+        return summarize(self.events)
+
+
+def stage_totals(events):
+    """Top-level events summed per stage name: {name: {"seconds", "bytes" (the largest), "pixels", "calls"}}, slowest first."""
+    totals = {}
+    for e in events:
+        if e["depth"]: continue
+        t = totals.setdefault(e["stage"], {"seconds": 0.0, "bytes": 0, "pixels": 0, "calls": 0})
+        t["seconds"] += e["seconds"]; t["bytes"] = max(t["bytes"], e["bytes"]); t["pixels"] += e["pixels"]; t["calls"] += 1
+    return dict(sorted(totals.items(), key=lambda item: -item[1]["seconds"]))
+
+
+def summarize(events):
+    if not events: return ""
+    span = max(e["start"] / 1e6 + e["seconds"] for e in events) - min(e["start"] for e in events) / 1e6
+    parts = [f"{name} {t['seconds'] * 1000:.0f} ms" + (f" {t['bytes'] / 2**20:.0f} MB" if t["bytes"] >= 2**20 else "")
+             for name, t in list(stage_totals(events).items())[:SUMMARY_STAGES]]
+    return f"Render {span * 1000:.0f} ms | " + ", ".join(parts)
+
+
+def frame_breakdown(events):
+    """Per-frame stage totals: {frame: {"seconds", "stages": {name: {"seconds", "bytes", "pixels"}}}}.
+
+    A stage run for a batch of frames (grain synthesis) is shared evenly
+    between them; its ``bytes`` are the batch's.
+    """
+    frames = {}
+    for e in events:
+        if e["depth"]: continue
+        share = 1 / max(1, len(e["frames"]))
+        for frame in e["frames"]:
+            record = frames.setdefault(frame, {"seconds": 0.0, "stages": {}})
+            s = record["stages"].setdefault(e["stage"], {"seconds": 0.0, "bytes": 0, "pixels": 0})
+            s["seconds"] += e["seconds"] * share; s["bytes"] = max(s["bytes"], e["bytes"]); s["pixels"] += round(e["pixels"] * share)
+            record["seconds"] += e["seconds"] * share
+    return dict(sorted(frames.items()))
+
+
+def write_trace(events, path, trace_format=TRACE_FORMATS[0]):
+    """Writes ``events`` to ``path`` as a Chrome trace (chrome://tracing, Perfetto) or as JSON with a per-frame breakdown."""
+    if trace_format not in TRACE_FORMATS: raise ValueError(f"Unknown trace format: {trace_format}")
+    if trace_format == "Chrome Trace":
+        data = {"displayTimeUnit": "ms", "traceEvents": [
+            {"name": e["stage"], "cat": "render", "ph": "X", "ts": e["start"], "dur": e["seconds"] * 1e6, "pid": e["pid"], "tid": e["tid"],
+             "args": {"frames": e["frames"], "bytes": e["bytes"], "pixels": e["pixels"]}} for e in events]}
+    else:
+        data = {"frames": frame_breakdown(events), "stages": stage_totals(events), "events": events}
+    with open(path, "w") as f: json.dump(data, f, indent=None if trace_format == "Chrome Trace" else 2)
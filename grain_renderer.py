@@ -0,0 +1,1185 @@
+import colorsys
+import logging
+import math
+from contextlib import nullcontext
+from dataclasses import dataclass, fields, replace
+from functools import cached_property, lru_cache
+
+import cv2
+import numpy as np
+from PIL import Image
+from grain_blend import blend
+from grain_bank import BANK_VERSION, bank_digest, bank_pick, gather
+from grain_cache import FixedMapCache, FixedMapKey, GrainBankKey
+from grain_glow import GLOW_ENGINES, HALATION_SPREAD, kernel_sigma, pyramid_blur, pyramid_levels, pyramid_reach
+from grain_splat import gaussian_psf, splat, use_dense
+from grain_tiles import run_tiled
+from grain_noise import UPSCALE_KERNELS, AddressableNoise, NoiseUpscaler, SequentialNoise, gradient_noise_1d, gradient_noise_2d
+from grain_spectrum import GRAIN_ENGINES, GRAIN_SPECTRA, SpectralNoise, fast_cell, fast_supersample_taps, filter_axes, spectral_filter
+
+# --- Compatibility for Pillow resampling ---
+try:
+    resampling = Image.Resampling
+except AttributeError:
+    class _Res:
+        NEAREST = Image.NEAREST
+        BILINEAR = Image.BILINEAR
+        LANCZOS = Image.LANCZOS
+    resampling = _Res()
+
+# --- Parameter defaults (keys match the slider labels used by the UI and presets) ---
+SLIDER_DEFAULTS = {
+    "Grain Size": 1, "Grain Aspect": 1, "Grain Angle": 0, "PRNU (Gain FPN)": 0, "DSNU (Offset FPN)": 0,
+    "Shot Noise (Poisson)": 0, "Read Noise (Gaussian)": 0, "Color Noise": 0,
+    "Shadow Noise Bias": 0, "Shadow Falloff": 2.5, "Banding": 0, "Bit Depth": 8,
+    "Firefly Density (%)": 0, "Firefly Intensity": 0, "Firefly Opacity": 100, "Firefly Coloration": 0, "Firefly Spread": 0,
+    "Bloom / Crush": 0, "Bloom / Crush Strength": 100, "Denoise Param 1": 0,
+    "Denoise Param 2": 10, "Mix": 100, "Micro-contrast": 0, "Texture Variation": 0,
+    "Saturation": 0, "Filmic Saturation": 0, "Lift": 0, "Roll-off": 0, "Contrast": 0,
+    "Diamond Grid Opacity": 0, "Diamond Grid Size": 8, "Diamond Color Count": 4,
+    "Diamond Color Saturation": 50, "Diamond Edge Softness": 0,
+    "Glow Amount": 0, "Glow Radius": 20, "Glow Threshold": 90, "Glow Halation": 0, "Soften Amount": 0, "Soften Mix": 100
+}
+# (lowest, highest) value each slider offers in the app.
+SLIDER_RANGES = {
+    "Grain Size": (1, 8), "Grain Aspect": (0.25, 4.0), "Grain Angle": (0, 180), "PRNU (Gain FPN)": (0, 5.0), "DSNU (Offset FPN)": (0, 10.0),
+    "Shot Noise (Poisson)": (0, 5.0), "Read Noise (Gaussian)": (0, 15.0), "Color Noise": (0, 20.0),
+    "Shadow Noise Bias": (0, 5.0), "Shadow Falloff": (1.0, 10.0), "Banding": (0, 0.1), "Bit Depth": (4, 8),
+    "Firefly Density (%)": (0, 1.0), "Firefly Intensity": (0, 500.0), "Firefly Opacity": (0, 100.0), "Firefly Coloration": (0, 2.0), "Firefly Spread": (0, 2.0),
+    "Bloom / Crush": (-10, 10), "Bloom / Crush Strength": (0, 100), "Denoise Param 1": (0, 30),
+    "Denoise Param 2": (0, 30), "Mix": (0, 100), "Micro-contrast": (0, 100), "Texture Variation": (0, 100),
+    "Saturation": (-100, 100), "Filmic Saturation": (0, 100), "Lift": (0, 100), "Roll-off": (0, 100), "Contrast": (-100, 100),
+    "Diamond Grid Opacity": (0, 100), "Diamond Grid Size": (2, 64), "Diamond Color Count": (2, 8),
+    "Diamond Color Saturation": (0, 100), "Diamond Edge Softness": (0, 25),
+    "Glow Amount": (0, 100), "Glow Radius": (0, 100), "Glow Threshold": (50, 100), "Glow Halation": (0, 100), "Soften Amount": (0, 25), "Soften Mix": (0, 100)
+}
+DENOISE_MODES = ("Photographic (NL-Means)", "Edge-Aware Smooth")
+# "Sequential" reproduces plates from earlier versions; "Addressable" noise can be
+# generated for any crop on its own (see grain_noise.AddressableNoise).
+RNG_MODES = ("Sequential", "Addressable")
+BANDING_MODES = ("Horizontal", "Vertical", "2D")
+# "8-bit" requantizes between stages exactly as the original Pillow pipeline did;
+# "Float" keeps the frame in float32 from compositing to output.
+PRECISIONS = ("8-bit", "Float")
+# How the grain plate is composited over a background (grain_blend kernels; all are neutral at mid-grey).
+BLEND_MODES = ("Overlay", "Soft Light", "Linear Light")
+# "Exact" renders supersample² the pixels and downsamples; "Fast" synthesizes grain at output resolution
+# with the supersampled grain's variance and power spectrum (see grain_spectrum).
+SUPERSAMPLE_MODES = ("Exact", "Fast")
+# Bump whenever fixed-map generation changes, so stored maps are regenerated.
+FIXED_MAP_VERSION = 1
+# Counter streams of the addressable generator, one per random field.
+NOISE_STREAMS = {"shot": 1, "read": 2, "color": 3, "prnu": 11, "dsnu": 12, "fireflies": 21}
+
+
+class RenderCancelled(Exception):
+    """Raised at a stage boundary once a renderer's ``cancelled`` hook reports that the render is no longer wanted."""
+
+
+def bilinear_noise_gain(cell):
+    """How much a bilinear downscale to 1 pixel (a triangle filter of half-width 1) scales the std of noise made of ``cell``-pixel cells."""
+    x = (np.arange(-256, 256) + 0.5) / 256
+    weights = 1.0 - np.abs(x)
+    per_axis = []
+    for offset in np.linspace(0, cell, 8, endpoint=False):  # averaged over how the cells line up with the pixel
+        cells = np.floor((x + offset) / cell).astype(np.int64)
+        per_axis.append((np.bincount(cells - cells.min(), weights) ** 2).sum() / weights.sum() ** 2)
+    return float(np.mean(per_axis))  # the 2D std factor is the per-axis variance factor
+
+
+@lru_cache(maxsize=16)
+def diamond_tile(seed, size, color_count, saturation, softness):
+    """One period of the diamond grid overlay: a (size·color_count)² uint8 RGB tile.
+
+    Both diagonals' cell indices repeat every ``size * color_count`` pixels,
+    so tiling this covers any frame; the edge blur wraps around, so the
+    tiles join seamlessly.
+    """
+    rng = np.random.default_rng(seed + 42)
+    palette = []
+    for i in range(color_count):
+        hue = rng.random()
+        rgb_float = colorsys.hsv_to_rgb(hue, saturation, 1.0)
+        palette.append([int(c * 255) for c in rgb_float])
+    palette = np.array(palette, dtype=np.uint8)
+
+    coords = np.arange(size * color_count)
+    x_coords, y_coords = coords[None, :], coords[:, None]
+    pattern_a = ((x_coords + y_coords) // size) % color_count
+    pattern_b = ((x_coords - y_coords) // size) % color_count
+    tile = palette[(pattern_a + pattern_b) % color_count]
+
+    if softness > 0:
+        kernel_size = softness * 2 + 1
+        padded = np.pad(tile, ((softness, softness), (softness, softness), (0, 0)), mode="wrap")
+        tile = cv2.GaussianBlur(padded, (kernel_size, kernel_size), 0)[softness:-softness, softness:-softness]
+    tile = np.ascontiguousarray(tile)
+    tile.flags.writeable = False
+    return tile
+
+
+@dataclass(frozen=True)
+class GrainParams:
+    """Immutable snapshot of every setting the render pipeline reads.
+
+    ``sliders`` accepts a mapping (or pairs) of slider name -> value; missing
+    entries fall back to ``SLIDER_DEFAULTS``. Snapshots are hashable and
+    picklable, so they can be shared with worker threads and processes.
+    """
+    width: int = 1920
+    height: int = 1080
+    seed: int = 0
+    supersample: int = 1
+    denoise_mode: str = DENOISE_MODES[0]
+    sliders: tuple = ()
+    rng_mode: str = RNG_MODES[0]
+    banding_mode: str = BANDING_MODES[0]
+    precision: str = PRECISIONS[0]
+    upscale_kernel: str = UPSCALE_KERNELS[0]
+    blend_mode: str = BLEND_MODES[0]
+    glow_engine: str = GLOW_ENGINES[0]
+    supersample_mode: str = SUPERSAMPLE_MODES[0]
+    grain_engine: str = GRAIN_ENGINES[0]
+    grain_spectrum: str = GRAIN_SPECTRA[0]
+    grain_bank: int = 0
+
+    def __post_init__(self):
+        values = dict(SLIDER_DEFAULTS)
+        values.update(dict(self.sliders))
+        if unknown := set(values) - set(SLIDER_DEFAULTS):
+            raise ValueError(f"Unknown slider(s): {', '.join(sorted(unknown))}")
+        if self.width <= 0 or self.height <= 0:
+            raise ValueError(f"Invalid dimensions: {self.width}x{self.height}")
+        if self.denoise_mode not in DENOISE_MODES:
+            raise ValueError(f"Unknown denoise mode: {self.denoise_mode}")
+        if self.rng_mode not in RNG_MODES:
+            raise ValueError(f"Unknown RNG mode: {self.rng_mode}")
+        if self.banding_mode not in BANDING_MODES:
+            raise ValueError(f"Unknown banding mode: {self.banding_mode}")
+        if self.precision not in PRECISIONS:
+            raise ValueError(f"Unknown precision: {self.precision}")
+        if self.upscale_kernel not in UPSCALE_KERNELS:
+            raise ValueError(f"Unknown upscale kernel: {self.upscale_kernel}")
+        if self.blend_mode not in BLEND_MODES:
+            raise ValueError(f"Unknown blend mode: {self.blend_mode}")
+        if self.glow_engine not in GLOW_ENGINES:
+            raise ValueError(f"Unknown glow engine: {self.glow_engine}")
+        if self.supersample_mode not in SUPERSAMPLE_MODES:
+            raise ValueError(f"Unknown supersample mode: {self.supersample_mode}")
+        if self.grain_engine not in GRAIN_ENGINES:
+            raise ValueError(f"Unknown grain engine: {self.grain_engine}")
+        if self.grain_spectrum not in GRAIN_SPECTRA:
+            raise ValueError(f"Unknown grain spectrum: {self.grain_spectrum}")
+        if values["Grain Aspect"] <= 0:
+            raise ValueError(f"Grain Aspect must be positive: {values['Grain Aspect']}")
+        if self.grain_bank < 0:
+            raise ValueError(f"Grain bank size must be 0 (off) or positive: {self.grain_bank}")
+        object.__setattr__(self, "width", int(self.width))
+        object.__setattr__(self, "height", int(self.height))
+        object.__setattr__(self, "seed", int(self.seed))
+        object.__setattr__(self, "supersample", max(1, int(self.supersample)))
+        object.__setattr__(self, "grain_bank", int(self.grain_bank))
+        object.__setattr__(self, "sliders", tuple((name, float(values[name])) for name in SLIDER_DEFAULTS))
+
+    @cached_property
+    def slider_values(self): return dict(self.sliders)
+    def __getitem__(self, name): return self.slider_values[name]
+
+    def with_sliders(self, **values): return replace(self, sliders={**self.slider_values, **values})
+
+    def to_dict(self):
+        data = {f.name: getattr(self, f.name) for f in fields(self)}
+        data["sliders"] = dict(self.sliders)
+        return data
+
+    @classmethod
+    def from_dict(cls, data):
+        known = {f.name for f in fields(cls)}
+        if unknown := set(data) - known:
+            raise ValueError(f"Unknown preset field(s): {', '.join(sorted(unknown))}")
+        return cls(**data)
+
+
+# Rough peak working-set per pixel, used to size bands for the tiled path: the
+# float32 luma/RGB plate plus noise, mask and stacking temporaries at render
+# resolution, and the 8-bit/float32 stage buffers at output resolution.
+GRAIN_BYTES_PER_PIXEL = 88
+POST_BYTES_PER_PIXEL = 96
+POST_BYTES_PER_PIXEL_FLOAT = 144
+# The spectral engine's white noise, shaped fields and one in-flight transform per render pixel. They always
+# cover the full frame, so bands cannot split them; they are budgeted once per frame instead.
+SPECTRAL_BYTES_PER_PIXEL = 64
+MIN_BAND_ROWS = 8
+# Frames synthesized per batch by render_frames, within the memory budget (or this default).
+MAX_BATCH_FRAMES = 8
+DEFAULT_BATCH_BYTES = 512 << 20
+
+# Sliders read by the two inputs of compositing; the post stages declare theirs in GrainRenderer._post_stages.
+GRAIN_SLIDERS = ("Grain Size", "Grain Aspect", "Grain Angle", "PRNU (Gain FPN)", "DSNU (Offset FPN)", "Shot Noise (Poisson)", "Read Noise (Gaussian)",
+                 "Color Noise", "Shadow Noise Bias", "Shadow Falloff", "Banding", "Bit Depth",
+                 "Firefly Density (%)", "Firefly Intensity", "Firefly Opacity", "Firefly Coloration", "Firefly Spread")
+# Sliders of the two layers grain-bank frames are built from (see GrainRenderer._bank_frames); the shadow mask and bit depth apply per frame.
+BANK_RANDOM_SLIDERS = ("Grain Size", "Grain Aspect", "Grain Angle", "Shot Noise (Poisson)", "Read Noise (Gaussian)", "Color Noise",
+                       "Firefly Density (%)", "Firefly Intensity", "Firefly Opacity", "Firefly Coloration", "Firefly Spread")
+BANK_FIXED_SLIDERS = ("PRNU (Gain FPN)", "DSNU (Offset FPN)", "Banding")
+BACKGROUND_SLIDERS = ("Glow Amount", "Glow Radius", "Glow Threshold", "Glow Halation", "Soften Amount", "Soften Mix")
+
+
+class GrainRenderer:
+    """Tk-free grain pipeline driven entirely by a ``GrainParams`` snapshot.
+
+    ``fixed_map_cache`` (a ``FixedMapCache``) may be shared between renderers
+    so that the PRNU/DSNU, banding and texture maps survive across parameter
+    snapshots. When ``memory_budget`` (bytes) is set and a full-frame render
+    would exceed it, frames are rendered in horizontal bands with halos
+    instead; the result is the same plate, but peak memory no longer scales
+    with factor² × resolution. With a ``stage_cache`` (a ``StageCache``),
+    every stage's output is memoized so that a later renderer whose
+    parameters differ only in, say, Saturation reruns just the stages from
+    saturation on. ``proxy(scale)`` derives a renderer for a quick
+    reduced-resolution preview of the same frame. ``cancelled`` is an
+    optional callable polled between stages; once it returns True the
+    render stops with ``RenderCancelled``. A ``profiler`` (a
+    ``StageProfiler``) records the time, memory and pixels of each stage.
+    """
+    def __init__(self, params, background=None, luma=None, fixed_map_cache=None, memory_budget=None, stage_cache=None, cancelled=None, profiler=None):
+        if background is not None and background.size != (params.width, params.height):
+            raise ValueError(f"Background is {background.size[0]}x{background.size[1]}, expected {params.width}x{params.height}")
+        self.params = params
+        self.background = background
+        self._background_arr = np.asarray(background) if background is not None else None
+        if background is not None and luma is None:
+            luma = np.array(background.convert('L'), dtype=np.float32) / 255.0
+        self.luma = luma
+        self.fixed_map_cache = FixedMapCache() if fixed_map_cache is None else fixed_map_cache
+        self.memory_budget = memory_budget
+        self.stage_cache = stage_cache
+        self.cancelled = cancelled
+        self.profiler = profiler
+        # Proxy renderers: output pixels per full-frame output pixel, and per full-frame render (supersampled) pixel.
+        self.spatial_scale = self.grain_scale = 1.0
+        self._proxy_source = self._full_size = None
+        # Draft previews: denoise a half-size copy of the frame instead (see _approximate_denoise).
+        self.approximate_denoise = False
+        self._band_cache = {}
+
+    def get_rng_for_frame(self, seed_offset=0): return np.random.default_rng(self.params.seed + seed_offset)
+
+    def proxy(self, scale):
+        """A renderer for a ``scale``× preview of this renderer's frame, rendered without supersampling.
+
+        Grain size, blur and kernel radii and the diamond grid are scaled with
+        the frame. Noise finer than a proxy pixel is attenuated to the average
+        of the render pixels it stands for, so the proxy looks like the full
+        render displayed at that size. Proxies synthesize their grain rather
+        than cutting it from the grain bank.
+        """
+        p = self.params
+        width, height = max(1, round(p.width * scale)), max(1, round(p.height * scale))
+        background = None
+        if self.background is not None:
+            key = ("proxy_background", self._token(self.background), width, height)
+            background = Image.fromarray(self._cached_stage(key, lambda: np.asarray(self.background.resize((width, height), resample=resampling.BILINEAR))))
+        renderer = GrainRenderer(replace(p, width=width, height=height, supersample=1, grain_bank=0), background,
+                                 fixed_map_cache=self.fixed_map_cache, stage_cache=self.stage_cache, cancelled=self.cancelled, profiler=self.profiler)
+        renderer.spatial_scale, renderer.grain_scale = width / p.width, width / (p.width * p.supersample)
+        renderer._proxy_source, renderer._full_size = ("proxy", self._source_tokens()), (p.width, p.height)
+        renderer.approximate_denoise = self.approximate_denoise
+        return renderer
+
+    def with_background(self, background, luma=None):
+        """A renderer of the same frame over another background (a plate of a sequence), sharing this one's caches and hooks."""
+        renderer = GrainRenderer(self.params, background, luma, self.fixed_map_cache, self.memory_budget, self.stage_cache, self.cancelled, self.profiler)
+        renderer.approximate_denoise = self.approximate_denoise
+        # Streamed fixed maps and band heights don't depend on the background, so a sequence's frames share them.
+        renderer._band_cache = self._band_cache
+        return renderer
+
+    def _proxy_noise_gain(self, cell):
+        """Std scale for noise with ``cell``-pixel cells, so a proxy shows it as the downscaled full render would."""
+        return 1.0 if self._full_size is None else bilinear_noise_gain(cell)
+
+    # --- Supersampling ---
+    def _fast_factor(self):
+        """The supersampling factor "Fast" mode matches at output resolution, or 1 when frames render at their render factor."""
+        p = self.params
+        return p.supersample if p.supersample_mode == "Fast" else 1
+
+    def _render_factor(self):
+        """Render (grain synthesis) pixels per output pixel along each axis."""
+        return 1 if self._fast_factor() > 1 else self.params.supersample
+
+    def _grain_cell(self):
+        """Render pixels per noise cell of the supersampled plate (of the full frame's, for proxies)."""
+        return max(1, int(round(self.params["Grain Size"] * self.grain_scale)))
+
+    def _fast_supersample(self, field, mean=0.0, taps=None):
+        """An output-resolution (N, h, w[, C]) noise ``field`` reshaped to the statistics of the supersampled render's.
+
+        Only the fluctuations are filtered, so the field keeps its ``mean``.
+        ``taps`` default to the grain cells' matching filter.
+        """
+        if taps is None: taps = fast_supersample_taps(self._grain_cell(), self._fast_factor(), self.params.upscale_kernel)
+        if mean: field -= np.float32(mean)
+        for frame in field: frame[...] = filter_axes(frame, taps)
+        if mean: field += np.float32(mean)
+        return field
+
+    def _fast_reach(self):
+        """Pixels each side of a box that fast supersampling's filters read (spectral grain is already shaped for the frame)."""
+        factor = self._fast_factor()
+        grain = 0 if self._spectral() else len(fast_supersample_taps(self._grain_cell(), factor, self.params.upscale_kernel))
+        return max(grain, len(fast_supersample_taps(1, factor, "Nearest"))) // 2
+
+    def _spectral(self): return self.params.grain_engine == "Spectral"
+
+    def _spectral_filter(self, width, height):
+        """The spectral engine's filter for a ``width`` × ``height`` noise field of this renderer."""
+        p = self.params
+        # Each pixel stands for this many pixels of the full-frame supersampled render.
+        factor = self._fast_factor() / self.grain_scale
+        return spectral_filter(width, height, p["Grain Size"], p.grain_spectrum, p["Grain Aspect"], p["Grain Angle"], factor)
+
+    def _px(self, value, scale=None):
+        """A length in full-frame pixels as a whole number of this renderer's pixels (or of pixels ``scale``× full-frame)."""
+        scale = self.spatial_scale if scale is None else scale
+        return int(value) if scale == 1 else int(round(value * scale))
+
+    def _shadow_luma_mask(self, render_box, factor=None):
+        """Shadow-bias noise multiplier over a box of ``factor``× output resolution (default: render resolution), or None."""
+        p = self.params
+        shadow_bias_strength = p["Shadow Noise Bias"] if self.luma is not None else 0.0
+        if self.luma is None or shadow_bias_strength <= 0: return None
+
+        factor = self._render_factor() if factor is None else factor
+        rx0, ry0, rx1, ry1 = render_box
+        # Bilinear upsampling reads one neighbouring output pixel on each side.
+        if factor == 1: ax, ay, bx, by = render_box
+        else: ax, ay, bx, by = (max(0, rx0 // factor - 1), max(0, ry0 // factor - 1),
+                                min(p.width, -(-rx1 // factor) + 1), min(p.height, -(-ry1 // factor) + 1))
+        luma_map = self.luma[ay:by, ax:bx]
+        shadow_map = 1.0 - luma_map
+
+        falloff_curve = p["Shadow Falloff"]
+        curved_shadow_map = shadow_map ** falloff_curve
+
+        noise_multiplier = curved_shadow_map * float(shadow_bias_strength)
+
+        luma_mask = np.clip(1.0 + noise_multiplier, 1.0, 4.0)
+
+        if factor > 1:
+            lm_img = Image.fromarray(luma_mask.astype(np.float32)).resize((rx1 - rx0, ry1 - ry0), resample=resampling.BILINEAR,
+                                                                          box=(rx0 / factor - ax, ry0 / factor - ay, rx1 / factor - ax, ry1 / factor - ay))
+            luma_mask = np.array(lm_img)
+        return luma_mask
+
+    def _generate_base_image(self, seed_offset=0, composite=True, box=None, noise=None):
+        return self._generate_base_images([seed_offset], box, None if noise is None else [noise])[0]
+
+    def _generate_base_images(self, seed_offsets, box=None, noises=None):
+        """Output-resolution grain plates of several frames as one (N, h, w, 3) uint8 block."""
+        p = self.params
+        if p.grain_bank: return self._bank_frames(seed_offsets, box or (0, 0, p.width, p.height))
+        factor = self._render_factor()
+        render_width, render_height = p.width * factor, p.height * factor
+        x0, y0, x1, y1 = box or (0, 0, p.width, p.height)
+
+        # LANCZOS reads 3 source pixels per output pixel on each side; fast supersampling's filters reach their radius.
+        margin = 3 * factor + 1 if factor > 1 and box else 0
+        if self._fast_factor() > 1 and box: margin = self._fast_reach()
+        render_box = (max(0, x0 * factor - margin), max(0, y0 * factor - margin),
+                      min(render_width, x1 * factor + margin), min(render_height, y1 * factor + margin))
+        render_pixels = (render_box[2] - render_box[0]) * (render_box[3] - render_box[1])
+        with self._stage("shadow_mask", render_pixels, seed_offsets) if self.luma is not None else nullcontext():
+            luma_mask = self._shadow_luma_mask(render_box)
+
+        plates = self._generate_grain_plates(render_width, render_height, seed_offsets, luma_mask, render_box, noises)
+        rx0, ry0 = render_box[:2]
+        if factor == 1: return plates if render_box == (x0, y0, x1, y1) else np.ascontiguousarray(plates[:, y0 - ry0:y1 - ry0, x0 - rx0:x1 - rx0])
+        self._checkpoint()
+        lanczos_box = (x0 * factor - rx0, y0 * factor - ry0, x1 * factor - rx0, y1 * factor - ry0)
+        with self._stage("supersample", render_pixels * len(plates), seed_offsets):
+            return np.stack([np.asarray(Image.fromarray(plate).resize((x1 - x0, y1 - y0), resample=resampling.LANCZOS, box=lanczos_box)) for plate in plates])
+
+    def _noise_cells(self, fields, ranges):
+        """Stacks one frame's noise cells per entry of ``fields`` into an (N, h, w[, C]) float32 block.
+
+        With ``ranges`` (Sequential noise in 8-bit precision) each field is
+        first quantized to 8 bits over its frame's (and channel's) value
+        range, as the original resize through an 8-bit image did. The
+        quantization runs on the cells, before upscaling, so it costs
+        1 / grain size² of a full-plate pass.
+        """
+        block = np.stack(fields)
+        if ranges is None: return block
+        # Plane by plane with scalar bounds: broadcasting per-channel bounds would run NumPy's inner loops 3 elements at a time.
+        channels = lambda arr: arr.reshape(arr.shape[:2] + (-1,))
+        codes = np.empty(block.shape, dtype=np.uint8)
+        bounds = [(np.reshape(lo, -1), np.reshape(hi, -1)) for lo, hi in ranges]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            for code, field, (lo, hi) in zip(codes, block, bounds):
+                code, field = channels(code), channels(field)
+                for c in range(code.shape[-1]): code[..., c] = (field[..., c] - lo[c]) / (hi[c] - lo[c]) * 255.0
+
+        decoded = codes.astype(np.float32)
+        for frame, (lo, hi) in zip(decoded, bounds):
+            frame = channels(frame)
+            for c in range(frame.shape[-1]):
+                plane, original_range = frame[..., c], hi[c] - lo[c]
+                # A constant field has no range to quantize over; it stays at its one value.
+                if original_range == 0: plane[...] = lo[c]; continue
+                plane /= 255.0
+                plane *= original_range
+                plane += lo[c]
+        return decoded
+
+    def _frame_noise(self, width, height, seed_offset, streamed=False):
+        """The random fields of one frame's grain plate: sequential draws in their original order, or addressable."""
+        p = self.params
+        grain = p["Grain Size"] * self.grain_scale
+        grain_size = max(1, int(round(grain)))
+        if (factor := self._fast_factor()) > 1: grain_size = fast_cell(grain_size, factor)
+        # Spectral grain is shaped from per-pixel white noise, with the proxy or supersampling softening in its filter.
+        if spectral := self._spectral(): grain_size = 1
+        scaled_w, scaled_h = max(1, width // grain_size), max(1, height // grain_size)
+        attenuation = 1.0 if spectral else self._proxy_noise_gain(grain)
+
+        components = []  # (name, addressable sampler, channels, sequential draw, transform)
+        if (strength := p["Shot Noise (Poisson)"] * attenuation) > 0:
+            components.append(("shot", "poisson25", 1, lambda rng, n: rng.poisson(25.0, (n, scaled_w)),
+                               lambda raw, s=strength: ((raw.astype(np.float32) / 50.0) * 255.0 - 128.0) * (s / 5.0)))
+        if (strength := p["Read Noise (Gaussian)"] * attenuation) > 0:
+            components.append(("read", "normal", 1, lambda rng, n: rng.normal(0, 1, (n, scaled_w)), lambda raw, s=strength: raw.astype(np.float32) * s))
+        if (strength := p["Color Noise"] * attenuation) > 0:
+            components.append(("color", "normal", 3, lambda rng, n: rng.normal(0.0, 1.0, (n, scaled_w, 3)), lambda raw, s=strength: raw.astype(np.float32) * s))
+
+        if p.rng_mode == "Addressable":
+            noise = AddressableNoise(p.seed + seed_offset, scaled_h, scaled_w,
+                                     [(name, NOISE_STREAMS[name], sampler, channels, transform) for name, sampler, channels, _, transform in components],
+                                     self._firefly_points(), (width, height))
+        else:
+            noise = SequentialNoise(self.get_rng_for_frame(seed_offset), scaled_h, scaled_w, [(name, draw, transform) for name, _, _, draw, transform in components],
+                                    self._firefly_drawer(width, height), streamed, need_ranges=self._quantize_noise() and not spectral)
+        return SpectralNoise(noise, self._spectral_filter(width, height)) if spectral else noise
+
+    def _firefly_settings(self):
+        """(density, values) for enabled fireflies, where ``values(brightness, color)`` gives the added RGB."""
+        p = self.params
+        if (density := p["Firefly Density (%)"] / 100.0) <= 0: return None
+        # A proxy pixel (or fast-supersampled output pixel) covers 1 / scale² render pixels: more of them hold a firefly, each averaged down.
+        proxy_density = min(1.0, density / (self.grain_scale / self._fast_factor()) ** 2)
+        intensity = p["Firefly Intensity"] * (density / proxy_density)
+        density = proxy_density
+        opacity = p["Firefly Opacity"] / 100.0
+        coloration = p["Firefly Coloration"]
+        if intensity <= 0 or opacity <= 0: return None
+
+        def values(brightness, random_color):
+            gray_base = np.repeat(brightness, 3, axis=1)
+            colored_base = np.clip(gray_base * (1.0 - coloration) + random_color * coloration, 0.0, 1.0)
+            return colored_base * intensity * opacity
+        return density, values
+
+    def _firefly_psf(self):
+        """Separable firefly point-spread taps at render resolution ("Firefly Spread" is a sigma in output pixels), or None."""
+        return gaussian_psf(self.params["Firefly Spread"] * self._render_factor() * self.spatial_scale)
+
+    def _firefly_drawer(self, width, height):
+        if (settings := self._firefly_settings()) is None: return None
+        density, values = settings
+        if (num := int(width*height*density)) <= 0: return None
+
+        def draw_fireflies(rng):
+            y, x = rng.integers(0, height, num), rng.integers(0, width, num)
+            brightness = rng.uniform(0.5, 1.0, (num, 1))
+            return y, x, values(brightness, rng.random((num, 3)))
+        return draw_fireflies
+
+    def _firefly_points(self):
+        if (settings := self._firefly_settings()) is None: return None
+        density, values = settings
+        return NOISE_STREAMS["fireflies"], density, 4, lambda u: values(0.5 + 0.5 * u[:, :1], u[:, 1:])
+
+    def _generate_grain_plate(self, width, height, seed_offset, luma_mask=None, box=None, noise=None):
+        return self._generate_grain_plates(width, height, [seed_offset], luma_mask, box, None if noise is None else [noise])[0]
+
+    def _generate_grain_plates(self, width, height, seed_offsets, luma_mask=None, box=None, noises=None):
+        """Render-resolution grain plates of several frames as one (N, h, w, 3) uint8 block.
+
+        Each frame still draws from its own generator (``get_rng_for_frame``),
+        so frame ``i`` equals a single-frame render of ``seed_offsets[i]``;
+        the fixed-pattern base is built once and everything after the draws
+        runs over the whole block.
+        """
+        p = self.params
+        c0, r0, c1, r1 = box = box or (0, 0, width, height)
+        pixels = (r1 - r0) * (c1 - c0) * len(seed_offsets)
+        if noises is None:
+            with self._stage("noise", pixels, seed_offsets): noises = [self._frame_noise(width, height, offset) for offset in seed_offsets]
+        noise = noises[0]
+        with self._stage("fixed_maps", pixels, seed_offsets): prnu_map, dsnu_map, banding_map = self._fixed_map_window(width, height, box)
+        with self._stage("grain", pixels, seed_offsets):
+            fixed_gain = self._proxy_noise_gain(self.grain_scale)
+            base = np.full((r1 - r0, c1 - c0), 128.0, dtype=np.float32)
+            base *= (1.0 + (prnu_map - 1.0) * (p["PRNU (Gain FPN)"] * fixed_gain))
+            base += dsnu_map * (p["DSNU (Offset FPN)"] * fixed_gain)
+            luma_image = np.repeat(base[None], len(noises), axis=0)
+
+            # Only the noise cells the upscale maps onto the box are read.
+            upscaler = NoiseUpscaler(width, height, noise.n_cols, noise.n_rows, box, p.upscale_kernel)
+            quantize = noise.quantized and self._quantize_noise()
+            cells = lambda name: self._noise_cells([n.window(name, upscaler.cells) for n in noises],
+                                                   [n.value_range(name) for n in noises] if quantize else None)
+
+            def add_noise(dest, name, mask):
+                if self._fast_factor() == 1 or self._spectral(): return upscaler.add_to(dest, cells(name), mask)
+                field = np.zeros(dest.shape, dtype=np.float32)
+                upscaler.add_to(field, cells(name))
+                # Shot noise is centred on (25 / 50) * 255 - 128, not 0.
+                field = self._fast_supersample(field, (25 / 50 * 255 - 128) * p["Shot Noise (Poisson)"] / 5 if name == "shot" else 0.0)
+                dest += field if mask is None else field * mask
+
+            for name in ("shot", "read"):
+                if name in noise: add_noise(luma_image, name, luma_mask)
+
+            luma_image += banding_map * 255 * p["Banding"]
+            final_image = np.stack([luma_image] * 3, axis=-1)
+
+            if "color" in noise: add_noise(final_image, "color", None if luma_mask is None else np.expand_dims(luma_mask, axis=-1))
+
+        if (settings := self._firefly_settings()) is not None:
+            with self._stage("fireflies", pixels, seed_offsets):
+                psf = self._firefly_psf()
+                dense, reach = use_dense(settings[0], psf), 0 if psf is None else len(psf) // 2
+                # Fireflies up to the kernel's reach outside the box still spread into it.
+                sx0, sy0 = max(0, c0 - reach), max(0, r0 - reach)
+                splat_box = (sx0, sy0, min(width, c1 + reach), min(height, r1 + reach))
+                # Fast supersampling spreads each firefly the way downsampling would, over a separate layer.
+                layer = np.zeros_like(final_image) if (factor := self._fast_factor()) > 1 else final_image
+                for frame, n in zip(layer, noises):
+                    if (fireflies := n.points(splat_box)) is None: continue
+                    y, x, firefly_values = fireflies
+                    y, x = y + (sy0 - r0), x + (sx0 - c0)
+                    if psf is None and not self._float_precision() and factor == 1:
+                        # 8-bit precision sets each firefly pixel to its rounded sum, as earlier versions did (a repeated pixel keeps its last firefly).
+                        current_pixels = frame[y, x, :].astype(np.float32)
+                        frame[y, x, :] = np.clip(current_pixels + firefly_values, 0, 255).astype(np.uint8)
+                    else: splat(frame, y, x, firefly_values, psf, dense)
+                if layer is not final_image:
+                    taps = fast_supersample_taps(1, factor, "Nearest")
+                    final_image += self._fast_supersample(layer, taps=taps / taps.sum())
+
+        with self._stage("quantize", pixels, seed_offsets): return self._quantize_plate(final_image)
+
+    def _quantize_plate(self, final_image):
+        """A float grain plate reduced to the Bit Depth slider's levels, as uint8."""
+        if (bit_depth := int(self.params["Bit Depth"])) < 8:
+            levels = 2**bit_depth; final_image = np.round(final_image / 255 * (levels-1)) * (255 / (levels-1))
+        return np.clip(final_image, 0, 255).astype(np.uint8)
+
+    # --- Grain bank ---
+    # With ``grain_bank`` K > 0 the random grain of K frames is rendered once (each entry on first use) and
+    # kept in the fixed-map cache and its store; every frame then cuts its grain from a seeded choice of entry,
+    # wrap-around offset, flips and channel order, and adds it to the fixed-pattern plate all frames share.
+    def _bank_renderers(self):
+        """(random, fixed) renderers of the bank's two layers: one frame's random grain around mid-grey, and the fixed-pattern plate."""
+        if (renderers := self._band_cache.get("bank_renderers")) is None:
+            p = self.params
+            common = dict(width=p.width, height=p.height, seed=p.seed, supersample=p.supersample, supersample_mode=p.supersample_mode,
+                          rng_mode=p.rng_mode, precision=p.precision, upscale_kernel=p.upscale_kernel)
+            random = GrainParams(**common, grain_engine=p.grain_engine, grain_spectrum=p.grain_spectrum,
+                                 sliders={name: p[name] for name in BANK_RANDOM_SLIDERS})
+            fixed = GrainParams(**common, banding_mode=p.banding_mode, sliders={name: p[name] for name in BANK_FIXED_SLIDERS})
+            renderers = self._band_cache["bank_renderers"] = tuple(
+                GrainRenderer(params, fixed_map_cache=self.fixed_map_cache, memory_budget=self.memory_budget, cancelled=self.cancelled, profiler=self.profiler)
+                for params in (random, fixed))
+        return renderers
+
+    def _bank_key(self, index):
+        p = self.params
+        return GrainBankKey(BANK_VERSION, bank_digest(self._bank_renderers()[0].params), index, p.width, p.height)
+
+    def _bank_entry(self, index):
+        """Bank entry ``index``: the random layer of frame ``index``, an (H, W, 3) uint8 array centred on 128."""
+        random = self._bank_renderers()[0]
+        return self.fixed_map_cache.get_or_create(self._bank_key(index), lambda: (np.asarray(random.render(index, composite=False)),))[0]
+
+    def _bank_fixed_plate(self):
+        fixed = self._bank_renderers()[1]
+        if (key := ("bank_fixed", fixed.params)) not in self._band_cache:
+            self._band_cache[key] = self._cached_stage(key, lambda: np.asarray(fixed.render(composite=False)))
+        return self._band_cache[key]
+
+    def _bank_quantum(self):
+        """Output pixels bank offsets move in, so grain cells stay on the frame's cell grid (spectral grain has none)."""
+        if self._spectral(): return 1
+        cell, factor = self._grain_cell(), self._render_factor()
+        if (fast := self._fast_factor()) > 1: return fast_cell(cell, fast)
+        return cell // math.gcd(cell, factor)
+
+    def _bank_frames(self, seed_offsets, box):
+        """Grain plates of several frames over ``box``, each cut from a grain-bank entry and added to the fixed-pattern plate.
+
+        Shadow Noise Bias scales the whole random layer, fireflies included,
+        and is applied at output resolution; Bit Depth applies to the sum.
+        """
+        p = self.params
+        x0, y0, x1, y1 = box
+        pixels = (x1 - x0) * (y1 - y0)
+        with self._stage("bank_fixed", pixels, seed_offsets): fixed = self._bank_fixed_plate()[y0:y1, x0:x1]
+        with self._stage("shadow_mask", pixels, seed_offsets) if self.luma is not None else nullcontext():
+            luma_mask = self._shadow_luma_mask(box, factor=1)
+        # Mirroring turns stretched grain the other way unless it lies along an axis; a half turn keeps its orientation.
+        mirror = not self._spectral() or p["Grain Aspect"] == 1 or p["Grain Angle"] % 90 == 0
+        quantum = self._bank_quantum()
+        plates = np.empty((len(seed_offsets), y1 - y0, x1 - x0, 3), dtype=np.uint8)
+        for plate, seed_offset in zip(plates, seed_offsets):
+            self._checkpoint()
+            pick = bank_pick(p.seed, seed_offset, p.grain_bank, p.width, p.height, quantum, mirror)
+            with self._stage("bank_entry", pixels, [seed_offset]): entry = self._bank_entry(pick.entry)
+            with self._stage("bank_gather", pixels, [seed_offset]):
+                gather(entry, pick, box, plate)
+                # Entry and plate were each truncated to uint8, half a level low on average, so their sum less 127.5 estimates the
+                # frame's level before truncation less half a level; rounding it half to even keeps direct rendering's mean.
+                if luma_mask is None and p["Bit Depth"] >= 8:
+                    cv2.addWeighted(plate, 1.0, fixed, 1.0, -127.5, dst=plate)
+                    continue
+                final_image = plate.astype(np.float32)
+                final_image -= 127.5
+                if luma_mask is not None: final_image *= luma_mask[..., None]
+                final_image += fixed
+                if p["Bit Depth"] >= 8: np.rint(final_image, out=final_image)
+                else: final_image += 0.5
+                plate[...] = self._quantize_plate(final_image)
+        return plates
+
+    def _banding_window(self, width, height, box):
+        """Banding offsets over ``box``, shaped to broadcast against it (a column, a row, or a full 2D window)."""
+        x0, y0, x1, y1 = box
+        mode, seed = self.params.banding_mode, self.params.seed
+        if mode == "Horizontal": return gradient_noise_1d(np.linspace(0, 5, height)[y0:y1], 6, seed).astype(np.float32)[:, None]
+        if mode == "Vertical": return gradient_noise_1d(np.linspace(0, 5, width)[x0:x1], 6, seed).astype(np.float32)[None, :]
+        scale = 5 / max(1, height - 1)
+        return gradient_noise_2d(np.arange(y0, y1) * scale, np.arange(x0, x1) * scale, 6, seed)
+
+    def _texture_map(self, width, height, source_size=None):
+        rng_texture = np.random.default_rng(self.params.seed + 1)
+        source_w, source_h = source_size or (width, height)
+        small_w, small_h = max(1, source_w // 64), max(1, source_h // 64)
+        random_map = rng_texture.random((small_h, small_w)).astype(np.float32)
+
+        blurred_map = cv2.GaussianBlur(random_map, (0,0), sigmaX=16, sigmaY=16, borderType=cv2.BORDER_REFLECT)
+
+        texture_map_pil = Image.fromarray(blurred_map).resize((width, height), resample=resampling.BILINEAR)
+        texture_map = np.array(texture_map_pil)
+        return (texture_map - texture_map.min()) / (texture_map.max() - texture_map.min())
+
+    def _fixed_map_key(self, width, height):
+        p = self.params
+        return FixedMapKey(FIXED_MAP_VERSION, p.seed, width, height, p.rng_mode, p.banding_mode, self._fast_factor())
+
+    def _fixed_noise(self, width, height, streamed=False):
+        """PRNU/DSNU sensor fields. Unlike the frame noise they are the same for every frame."""
+        prnu = lambda raw: 1.0 + (np.asarray(raw, np.float32) * 0.02)
+        dsnu = lambda raw: np.asarray(raw, np.float32)
+        if self.params.rng_mode == "Addressable":
+            return AddressableNoise(self.params.seed, height, width, [("prnu", NOISE_STREAMS["prnu"], "normal", 1, prnu),
+                                                                     ("dsnu", NOISE_STREAMS["dsnu"], "normal", 1, dsnu)])
+        draw = lambda rng, n: rng.standard_normal((n, width), np.float32)
+        return SequentialNoise(self.get_rng_for_frame(0), height, width, [("prnu", draw, prnu), ("dsnu", draw, dsnu)],
+                               streamed=streamed, need_ranges=False)
+
+    def _get_fixed_maps_for_resolution(self, width, height):
+        return self.fixed_map_cache.get_or_create(self._fixed_map_key(width, height), lambda: self._create_fixed_maps(width, height))
+
+    def _create_fixed_maps(self, width, height):
+        noise = self._fixed_noise(width, height)
+        prnu, dsnu = noise.rows("prnu", 0, height), noise.rows("dsnu", 0, height)
+        if (factor := self._fast_factor()) > 1:
+            # Per-render-pixel sensor noise, as a supersampled render's downsampling leaves it.
+            taps = fast_supersample_taps(1, factor, "Nearest")
+            prnu, dsnu = 1.0 + filter_axes(prnu - 1.0, taps), filter_axes(np.ascontiguousarray(dsnu), taps)
+        banding = np.broadcast_to(self._banding_window(width, height, (0, 0, width, height)), (height, width))
+        return prnu, dsnu, banding, self._texture_map(width, height)
+
+    def _fixed_map_window(self, width, height, box):
+        """PRNU, DSNU and banding over ``box``. Partial boxes are streamed rather than building full-size maps (fast supersampling filters whole maps)."""
+        c0, r0, c1, r1 = box
+        if self._fixed_map_key(width, height) in self.fixed_map_cache or box == (0, 0, width, height) or self._fast_factor() > 1:
+            prnu, dsnu, banding, _ = self._get_fixed_maps_for_resolution(width, height)
+            return prnu[r0:r1, c0:c1], dsnu[r0:r1, c0:c1], banding[r0:r1, c0:c1]
+
+        if (key := ("fixed", width, height)) not in self._band_cache:
+            self._band_cache[key] = self._fixed_noise(width, height, streamed=True)
+        noise = self._band_cache[key]
+        return noise.window("prnu", box), noise.window("dsnu", box), self._banding_window(width, height, box)
+
+    def _texture_window(self, box):
+        x0, y0, x1, y1 = box
+        width, height = self.params.width, self.params.height
+        if self._full_size is not None:  # Proxies resample the full frame's texture rather than drawing one of their own.
+            key = ("proxy_texture", self.params.seed, self._full_size, width, height)
+            return self._cached_stage(key, lambda: self._texture_map(width, height, self._full_size))[y0:y1, x0:x1]
+        if self._fixed_map_key(width, height) in self.fixed_map_cache or box == (0, 0, width, height):
+            return self._get_fixed_maps_for_resolution(width, height)[3][y0:y1, x0:x1]
+        if (key := ("texture", width, height)) not in self._band_cache:
+            self._band_cache[key] = self._texture_map(width, height)
+        return self._band_cache[key][y0:y1, x0:x1]
+
+    # --- Banded (memory-bounded) rendering ---
+    def estimate_frame_bytes(self):
+        """Approximate peak working set of a full-frame render."""
+        p = self.params
+        return p.height * self._bytes_per_output_row() + self._spectral_bytes()
+
+    def _spectral_bytes(self):
+        """Working set of the spectral engine's full-frame grain fields (0 for cell grain), needed however the frame is banded."""
+        p = self.params
+        return p.width * p.height * self._render_factor() ** 2 * SPECTRAL_BYTES_PER_PIXEL if self._spectral() else 0
+
+    def _bytes_per_output_row(self):
+        p = self.params
+        post = POST_BYTES_PER_PIXEL_FLOAT if self._float_precision() else POST_BYTES_PER_PIXEL
+        return p.width * (GRAIN_BYTES_PER_PIXEL * self._render_factor() ** 2 + post)
+
+    def uses_bands(self):
+        return self.memory_budget is not None and self.estimate_frame_bytes() > self.memory_budget
+
+    def _band_halos(self):
+        """Pixels of context each band or region needs per side: (before compositing, after compositing)."""
+        p = self.params
+        pre = post = 0
+        if self.background is not None:
+            if p["Glow Amount"] > 0: pre += self._glow_reach()
+            if p["Soften Mix"] > 0: pre += self._px((p["Soften Amount"] / 25.0) ** 2.0 * 25.0)
+        if p["Bloom / Crush"] != 0 and p["Bloom / Crush Strength"] > 0: post += abs(self._px(p["Bloom / Crush"]))
+        if p["Denoise Param 1"] > 0:
+            # NL-means: search radius 10 + template radius 3. Bilateral (sigmaSpace=15) radius 23 + sharpen blur (sigma 3).
+            post += self._px(10) + self._px(3) if p.denoise_mode == "Photographic (NL-Means)" else self._px(23) + self._px(13)
+        if p["Micro-contrast"] > 0: post += self._px(13)
+        return pre, post
+
+    def _band_height(self, pre, post):
+        if (key := ("band_height", pre, post)) not in self._band_cache:
+            spectral = self._spectral_bytes()
+            rows = (self.memory_budget - spectral) // self._bytes_per_output_row() - 2 * (pre + post + 1)
+            if spectral > self.memory_budget:
+                logging.warning(f"Spectral grain synthesizes the whole frame ({spectral / 2**20:.0f} MB), more than the memory budget of "
+                                f"{self.memory_budget / 2**20:.0f} MB; bands cannot reduce it. Using {MIN_BAND_ROWS}-row bands for the rest.")
+            elif rows < MIN_BAND_ROWS:
+                logging.warning(f"Memory budget of {self.memory_budget / 2**20:.0f} MB is too small for these settings; using {MIN_BAND_ROWS}-row bands.")
+            self._band_cache[key] = max(MIN_BAND_ROWS, rows)
+        return self._band_cache[key]
+
+    def _render_banded(self, seed_offset, composite, bits=8):
+        p = self.params
+        pre, post = self._band_halos()
+        band_height = self._band_height(pre, post)
+        noise = None if p.grain_bank else self._frame_noise(p.width * self._render_factor(), p.height * self._render_factor(), seed_offset, streamed=True)
+        frame = np.empty((p.height, p.width, 3), dtype=np.uint8 if bits == 8 else np.uint16)
+        for y0 in range(0, p.height, band_height):
+            y1 = min(p.height, y0 + band_height)
+            a, b = max(0, y0 - post), min(p.height, y1 + post)
+            band = self._render_region(seed_offset, composite, (0, a, p.width, b), noise, bits=bits)
+            frame[y0:y1] = band[y0 - a:y1 - a]
+        return Image.fromarray(frame) if bits == 8 else frame
+
+    def render(self, seed_offset=0, composite=True): return self._render_frame(seed_offset, composite)
+
+    def batch_size(self):
+        """Frames per ``render_frames`` batch: as many as fit the memory budget, up to ``MAX_BATCH_FRAMES``."""
+        if self.uses_bands(): return 1
+        p = self.params
+        frame_bytes = p.width * p.height * GRAIN_BYTES_PER_PIXEL * self._render_factor() ** 2 + self._spectral_bytes()
+        return max(1, min(MAX_BATCH_FRAMES, (self.memory_budget or DEFAULT_BATCH_BYTES) // max(1, frame_bytes)))
+
+    def render_frames(self, seed_offsets, composite=True, bits=8, backgrounds=None):
+        """Yields ``(seed_offset, image)`` for each frame, equal to ``render(seed_offset, composite)``.
+
+        Grain is synthesized ``batch_size()`` frames at a time (see
+        ``_generate_grain_plates``); post-processing then runs per frame.
+        With ``bits=16`` each image is an (H, W, 3) uint16 array instead,
+        rounded from the unquantized frame in "Float" precision.
+        ``backgrounds``, if given, yields each frame's own ``(background,
+        luma)`` in order (a ``PlateReader``) and is consumed one frame at a
+        time; with Shadow Noise Bias the grain then depends on the plate, so
+        it is synthesized per frame.
+        """
+        seed_offsets, p = list(seed_offsets), self.params
+        plates = None if backgrounds is None else iter(backgrounds)
+        renderer_for = lambda: self if plates is None else self.with_background(*next(plates))
+        per_frame = self.uses_bands() or (plates is not None and p["Shadow Noise Bias"] > 0)
+        for i in range(0, len(seed_offsets), batch := 1 if per_frame else self.batch_size()):
+            chunk = seed_offsets[i:i + batch]
+            if per_frame:
+                yield chunk[0], renderer_for()._render_frame(chunk[0], composite, bits); continue
+            for seed_offset, grain in zip(chunk, self._generate_base_images(chunk)):
+                frame = renderer_for()._render_region(seed_offset, composite, (0, 0, p.width, p.height), grain=grain, bits=bits)
+                yield seed_offset, Image.fromarray(frame) if bits == 8 else frame
+
+    def _render_frame(self, seed_offset, composite, bits=8):
+        if self.uses_bands(): return self._render_banded(seed_offset, composite, bits)
+        frame = self._render_region(seed_offset, composite, (0, 0, self.params.width, self.params.height), bits=bits)
+        return Image.fromarray(frame) if bits == 8 else frame
+
+    def render_region(self, box, seed_offset=0, composite=True):
+        """Renders only ``box`` (x0, y0, x1, y1) of the frame; the result equals the same crop of ``render()``.
+
+        Only the box plus the halo the filters need is processed. In
+        "Addressable" RNG mode the noise is generated for that area alone; in
+        "Sequential" mode the frame's draws still have to be walked once.
+        """
+        p = self.params
+        post = self._band_halos()[1]
+        x0, y0, x1, y1 = box
+        padded = (max(0, x0 - post), max(0, y0 - post), min(p.width, x1 + post), min(p.height, y1 + post))
+        noise = None if p.grain_bank else self._frame_noise(p.width * self._render_factor(), p.height * self._render_factor(), seed_offset, streamed=True)
+        region = self._render_region(seed_offset, composite, padded, noise)
+        return Image.fromarray(region[y0 - padded[1]:y1 - padded[1], x0 - padded[0]:x1 - padded[0]])
+
+    # --- Array pipeline ---
+    # Stages take and return RGB arrays. In "8-bit" precision they are uint8 and
+    # every stage reproduces the Pillow operation it replaced bit for bit; in
+    # "Float" precision they are float32 on a 0-255 scale and nothing is
+    # requantized until the frame leaves the pipeline.
+    def _float_precision(self): return self.params.precision == "Float"
+    # Sequential noise cells are quantized to 8 bits as earlier versions did, unless Float precision or smooth upscaling asks for more.
+    def _quantize_noise(self): return not self._float_precision() and self.params.upscale_kernel == "Nearest"
+
+    def _to_stage(self, arr): return arr.astype(np.float32) if self._float_precision() else arr
+
+    def _pil_view(self, arr):
+        """Zero-copy Pillow image over a contiguous 8-bit RGB array, for running Pillow's own kernels on stage buffers."""
+        arr = np.ascontiguousarray(arr)
+        return Image.frombuffer("RGB", (arr.shape[1], arr.shape[0]), arr, "raw", "RGB", 0, 1)
+
+    def _blend(self, base, layer, alpha):
+        """``Image.blend(base, layer, alpha)``: ``base + alpha * (layer - base)``."""
+        if base.dtype == np.uint8 and layer.dtype == np.uint8:
+            return np.asarray(Image.blend(self._pil_view(base), self._pil_view(layer), alpha))
+        out = layer.astype(np.float32)
+        out -= base
+        out *= np.float32(alpha)
+        out += base
+        return out
+
+    def _luma(self, image):
+        if image.dtype == np.float32: return image @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+        return np.asarray(self._pil_view(image).convert('L'))
+
+    # --- Stage graph ---
+    # background (glow, soften) ─┐
+    # grain plate ───────────────┴─ composite ─ bloom/crush ─ denoise ─ micro-contrast ─ saturation ─ tone curve ─ diamond grid
+    # A stage's cache key is its own inputs plus the key of the stage feeding it.
+    def _post_stages(self, origin):
+        """The stages after compositing, in order, as (name, the parameters they read, function)."""
+        p = self.params
+        sliders = lambda *names: tuple(p[name] for name in names)
+        return (("bloom_crush", sliders("Bloom / Crush", "Bloom / Crush Strength"), self._apply_bloom_crush_mix),
+                ("denoise", (p.denoise_mode, self.approximate_denoise) + sliders("Denoise Param 1", "Denoise Param 2", "Mix"), self._apply_denoise),
+                ("micro_contrast", sliders("Micro-contrast", "Texture Variation"), lambda image: self._apply_micro_contrast(image, origin)),
+                ("saturation", sliders("Saturation", "Filmic Saturation"), self._apply_saturation),
+                ("tone_curve", sliders("Lift", "Roll-off", "Contrast"), self._apply_s_curve),
+                ("diamond_grid", sliders("Diamond Grid Opacity", "Diamond Grid Size", "Diamond Color Count",
+                                         "Diamond Color Saturation", "Diamond Edge Softness"), lambda image: self._apply_diamond_grid(image, origin)))
+
+    def _checkpoint(self):
+        if self.cancelled is not None and self.cancelled(): raise RenderCancelled()
+
+    def _stage(self, name, pixels=0, frames=None):
+        """Profiles the block as stage ``name`` when the renderer has a profiler."""
+        return self.profiler.stage(name, pixels, frames) if self.profiler is not None else nullcontext()
+
+    def _token(self, obj): return self.stage_cache.token(obj) if self.stage_cache is not None else None
+
+    def _source_tokens(self):
+        """Stand-ins for the background and luma inputs in stage keys; a proxy's are derived from its source renderer's."""
+        return self._proxy_source or (self._token(self.background), self._token(self.luma))
+
+    def _cached_stage(self, key, compute):
+        if self.stage_cache is None: return compute()
+        if (out := self.stage_cache.get(key)) is not None: return out
+        return self.stage_cache.put(key, compute())
+
+    def _render_region(self, seed_offset, composite, box, noise=None, grain=None, bits=8):
+        """Runs the pipeline for output ``box`` and returns a ``bits``-bit (8 or 16) RGB array. Pixels near a partial box's edge are only valid inside the halo.
+
+        ``grain``, if given, is the frame's already synthesized grain plate over ``box``.
+        """
+        p = self.params
+        composite = composite and self.background is not None
+        frame = (p.width, p.height, p.seed, p.supersample, p.supersample_mode, p.grain_engine, p.grain_spectrum, p.grain_bank, p.rng_mode, p.banding_mode, p.precision, p.upscale_kernel, self.spatial_scale, self.grain_scale, seed_offset, box)
+        background_token, luma_token = self._source_tokens()
+        grain_key = ("grain", frame, tuple(p[name] for name in GRAIN_SLIDERS), luma_token)
+        composite_key = key = ("composite", grain_key, background_token, p.blend_mode, p.glow_engine, tuple(p[name] for name in BACKGROUND_SLIDERS)) if composite else grain_key
+
+        stages, keys = self._post_stages(box[:2]), []
+        for name, inputs, _ in stages:
+            keys.append(key := (name, inputs, key))
+        pixels = (box[2] - box[0]) * (box[3] - box[1])
+        with self.profiler.working_on([seed_offset]) if self.profiler is not None else nullcontext():
+            # Resume after the last stage whose output is still cached.
+            start, image = 0, None
+            if self.stage_cache is not None:
+                start = next((i + 1 for i in reversed(range(len(keys))) if (image := self.stage_cache.get(keys[i])) is not None), 0)
+            if image is None:
+                self._checkpoint()
+                grain_plate_arr = grain if grain is not None else self._cached_stage(
+                    grain_key, lambda: self._generate_base_image(seed_offset, composite=False, box=None if box == (0, 0, p.width, p.height) else box, noise=noise))
+                image = self._cached_stage(composite_key, lambda: self._composite(box, grain_plate_arr)) if composite else self._to_stage(grain_plate_arr)
+            for i in range(start, len(stages)):
+                self._checkpoint()
+                with self._stage(stages[i][0], pixels): out = stages[i][2](image)
+                # Disabled stages hand back their input, which is already cached under an earlier key.
+                image = out if out is image or self.stage_cache is None else self.stage_cache.put(keys[i], out)
+
+        if bits == 16:
+            # 257 maps 0-255 onto 0-65535 exactly, so 8-bit frames keep their values.
+            if image.dtype == np.uint8: return image.astype(np.uint16) * np.uint16(257)
+            return np.clip(np.rint(image * np.float32(257)), 0, 65535).astype(np.uint16)
+        if image.dtype == np.uint8: return image
+        return np.clip(np.rint(image), 0, 255).astype(np.uint8)
+
+    def _prepared_background(self, box):
+        """The background with glow and soften applied, cropped to ``box``."""
+        p = self.params
+        x0, y0, x1, y1 = box
+        pre, align = self._band_halos()[0], self._glow_alignment()
+        a = box if box == (0, 0, p.width, p.height) else (max(0, x0 - pre) // align * align, max(0, y0 - pre) // align * align, min(p.width, x1 + pre), min(p.height, y1 + pre))
+        image = self._to_stage(np.ascontiguousarray(self._background_arr[a[1]:a[3], a[0]:a[2]]))
+        pixels = (a[2] - a[0]) * (a[3] - a[1])
+        with self._stage("glow", pixels): image = self._apply_halation_glow(image)
+        with self._stage("soften", pixels): image = self._apply_box_blur(image)
+        if a != box: image = np.ascontiguousarray(image[y0 - a[1]:y1 - a[1], x0 - a[0]:x1 - a[0]])
+        return image
+
+    def _composite(self, box, grain_plate_arr):
+        background_key = ("background", self._source_tokens()[0], box, self.params.precision, self.params.glow_engine, self.spatial_scale, tuple(self.params[name] for name in BACKGROUND_SLIDERS))
+        self._checkpoint()
+        background = self._cached_stage(background_key, lambda: self._prepared_background(box))
+        with self._stage("blend", (box[2] - box[0]) * (box[3] - box[1])): return blend(self.params.blend_mode, background, grain_plate_arr, clip=True)
+
+    def _apply_bloom_crush_mix(self, image_to_process):
+        bloom_crush_val = self.params["Bloom / Crush"]
+        strength_percent = self.params["Bloom / Crush Strength"]
+        if bloom_crush_val == 0 or strength_percent <= 0: return image_to_process
+        processed_bc = self._apply_bloom_crush(image_to_process, bloom_crush_val)
+        mix_alpha = strength_percent / 100.0
+        return self._blend(image_to_process, processed_bc, mix_alpha) if mix_alpha < 1.0 else processed_bc
+
+    def _apply_denoise(self, image_to_process):
+        if self.params["Denoise Param 1"] <= 0: return image_to_process
+        mode = self.params.denoise_mode
+        denoise = None
+        if mode == "Photographic (NL-Means)": denoise = self._apply_photographic_denoise
+        elif mode == "Edge-Aware Smooth": denoise = self._apply_edge_aware_denoise
+        if denoise is None: return image_to_process
+        denoised_image = self._approximate_denoise(denoise, image_to_process) if self.approximate_denoise else denoise(image_to_process)
+        mix_alpha = self.params["Mix"] / 100.0
+        return self._blend(image_to_process, denoised_image, mix_alpha) if mix_alpha < 1.0 else denoised_image
+
+    def _approximate_denoise(self, denoise, image_to_process):
+        """Preview stand-in for ``denoise``, run on a half-size copy of the frame.
+
+        The filtered copy is upsampled, and the fine detail the copy cannot
+        hold is added back in proportion to how much of the copy's own detail
+        the filter kept nearby: removed as grain where the filter smoothed,
+        kept where it preserved edges or was too weak to act.
+        """
+        h, w = image_to_process.shape[:2]
+        if min(h, w) < 16: return denoise(image_to_process)
+        def upsample(image, size): return cv2.resize(image, size, interpolation=cv2.INTER_LINEAR)
+        def fine_detail(image):
+            ih, iw = image.shape[:2]
+            return image - upsample(cv2.resize(image, (iw // 2, ih // 2), interpolation=cv2.INTER_AREA), (iw, ih))
+        small = cv2.resize(image_to_process, (w // 2, h // 2), interpolation=cv2.INTER_AREA)
+        denoised = denoise(small, self.spatial_scale * small.shape[1] / w).astype(np.float32)
+        small = small.astype(np.float32)
+        kept = cv2.blur(fine_detail(denoised) ** 2, (7, 7)) / np.maximum(cv2.blur(fine_detail(small) ** 2, (7, 7)), 1e-3)
+        kept = upsample(np.sqrt(np.clip(kept, 0, 1, out=kept), out=kept), (w, h))
+        result = image_to_process - upsample(small, (w, h))
+        result *= kept
+        result += upsample(denoised, (w, h))
+        if self._float_precision(): return result
+        return np.clip(np.rint(result, out=result), 0, 255, out=result).astype(np.uint8)
+
+    def _apply_box_blur(self, image_to_process):
+        raw_amount = self.params["Soften Amount"]
+        mix_alpha = self.params["Soften Mix"] / 100.0
+
+        if raw_amount == 0 or mix_alpha == 0 or self.background is None:
+            return image_to_process
+
+        normalized_amount = raw_amount / 25.0
+        curved_amount = normalized_amount ** 2.0
+        final_amount = self._px(curved_amount * 25.0)
+
+        if final_amount == 0:
+            return image_to_process
+
+        kernel_size = final_amount * 2 + 1
+        blurred_image = cv2.blur(image_to_process, (kernel_size, kernel_size))
+        return self._blend(image_to_process, blurred_image, mix_alpha)
+
+    def _glow_radii(self):
+        """Per-channel glow radii in this renderer's pixels; Glow Halation widens red most and leaves blue alone."""
+        radius, halation = self._px(self.params["Glow Radius"]), self.params["Glow Halation"] / 100.0
+        return tuple(max(0, round(radius * (1 + halation * spread))) for spread in HALATION_SPREAD)
+
+    def _glow_pyramid(self):
+        """Per-channel (sigmas, levels) of the Pyramid glow engine; levels depend on the frame, not the box rendered."""
+        sigmas = tuple(kernel_sigma(radius) if radius > 0 else 0.0 for radius in self._glow_radii())
+        size = min(self.params.width, self.params.height)
+        return sigmas, tuple(pyramid_levels(sigma, size) for sigma in sigmas)
+
+    def _glow_reach(self):
+        if self.params.glow_engine == "Gaussian": return max(self._glow_radii())
+        return max(pyramid_reach(sigma, level) for sigma, level in zip(*self._glow_pyramid()))
+
+    def _glow_alignment(self):
+        """Pixel multiple a background crop must start on for the glow to match the full frame's."""
+        p = self.params
+        if p.glow_engine == "Gaussian" or p["Glow Amount"] <= 0: return 1
+        return 2 ** max(self._glow_pyramid()[1])
+
+    def _apply_halation_glow(self, image_to_process):
+        amount = self.params["Glow Amount"] / 100.0
+        if amount == 0 or self.background is None:
+            return image_to_process
+
+        radii = self._glow_radii()
+        threshold = self.params["Glow Threshold"] / 100.0 * 255.0
+
+        highlight_mask = self._luma(image_to_process) > threshold
+        highlights_only_arr = image_to_process * highlight_mask[..., None]
+
+        if max(radii) == 0:
+            blurred_highlights = highlights_only_arr
+        elif self.params.glow_engine == "Pyramid":
+            blurred_highlights = pyramid_blur(highlights_only_arr, *self._glow_pyramid())
+        elif len(set(radii)) == 1:
+            kernel_size = radii[0] * 2 + 1
+            blurred_highlights = cv2.GaussianBlur(highlights_only_arr, (kernel_size, kernel_size), 0)
+        else:
+            blurred_highlights = np.stack([cv2.GaussianBlur(np.ascontiguousarray(highlights_only_arr[..., c]), (radius * 2 + 1, radius * 2 + 1), 0)
+                                           for c, radius in enumerate(radii)], axis=-1)
+
+        return blend("Screen", image_to_process, blurred_highlights, amount)
+
+    def _apply_bloom_crush(self, image_to_process, value):
+        kernel_size = abs(self._px(value)) * 2 + 1
+        if kernel_size <= 1: return image_to_process
+        kernel = cv2.getStructuringElement(cv2.MORPH_ELLIPSE, (kernel_size, kernel_size))
+        if value > 0: return cv2.dilate(image_to_process, kernel, iterations=1)
+        return cv2.erode(image_to_process, kernel, iterations=1)
+
+    def _apply_photographic_denoise(self, image_to_process, scale=None):
+        strength = self.params["Denoise Param 1"]
+        detail = self.params["Denoise Param 2"]
+        quantized = image_to_process if image_to_process.dtype == np.uint8 else np.clip(np.rint(image_to_process), 0, 255).astype(np.uint8)
+        template, search = 2 * max(1, self._px(3, scale)) + 1, 2 * max(1, self._px(10, scale)) + 1
+        def nl_means(tile):
+            # NL-means measures colour distance in Lab, so it needs BGR channel order.
+            bgr_array = np.ascontiguousarray(tile[..., ::-1])
+            return cv2.fastNlMeansDenoisingColored(bgr_array, None, h=strength, hColor=detail, templateWindowSize=template, searchWindowSize=search)[..., ::-1]
+        denoised = run_tiled(nl_means, quantized, search // 2 + template // 2, self._checkpoint)
+        if quantized is image_to_process: return np.ascontiguousarray(denoised)
+        # Float precision: apply the filter's correction to the unquantized frame.
+        return image_to_process + (denoised.astype(np.float32) - quantized)
+
+    def _apply_edge_aware_denoise(self, image_to_process, scale=None):
+        smoothing = int(self.params["Denoise Param 1"])
+        sharpening = self.params["Denoise Param 2"] / 20.0
+        scale = self.spatial_scale if scale is None else scale
+        sigma_space = 15 * scale
+        def bilateral(tile): return cv2.bilateralFilter(tile, d=-1, sigmaColor=smoothing, sigmaSpace=sigma_space)
+        # With d=-1 the filter reaches round(1.5 * sigmaSpace) pixels. Float frames are filtered whole: OpenCV scales
+        # its colour-weight table to the input's value range, which would differ from tile to tile.
+        smoothed = run_tiled(bilateral, image_to_process, math.ceil(1.5 * sigma_space), self._checkpoint) if image_to_process.dtype == np.uint8 else bilateral(image_to_process)
+        if sharpening > 0:
+            gaussian = cv2.GaussianBlur(smoothed, (0, 0), 3 * scale)
+            sharpened = cv2.addWeighted(smoothed, 1.0 + sharpening, gaussian, -sharpening, 0)
+            return np.clip(sharpened, 0, 255, out=sharpened) if sharpened.dtype == np.float32 else sharpened
+        return smoothed
+
+    def _apply_micro_contrast(self, image_to_process, origin=(0, 0)):
+        strength = self.params["Micro-contrast"] / 100.0
+        variation = self.params["Texture Variation"] / 100.0
+        if strength == 0: return image_to_process
+
+        blurred = cv2.GaussianBlur(image_to_process, (0,0), 3 * self.spatial_scale)
+        detail_layer = image_to_process.astype(np.float32) - blurred.astype(np.float32)
+        h, w = image_to_process.shape[:2]
+        texture_map = self._texture_window((origin[0], origin[1], origin[0] + w, origin[1] + h))
+
+        flat_mask = np.ones_like(texture_map, dtype=np.float32)
+        blended_mask = cv2.addWeighted(flat_mask, 1.0 - variation, texture_map, variation, 0)
+
+        modulated_detail = detail_layer * np.expand_dims(blended_mask, axis=-1) * strength * 2.0
+        final = np.clip(image_to_process.astype(np.float32) + modulated_detail, 0, 255)
+        return final if self._float_precision() else final.astype(np.uint8)
+
+    def _apply_saturation(self, image_to_process):
+        sat_value = self.params["Saturation"] / 100.0 + 1.0
+        if sat_value != 1.0:
+            # ImageEnhance.Color: blend from the image's own grayscale.
+            image_to_process = self._blend(np.repeat(self._luma(image_to_process)[..., None], 3, axis=-1), image_to_process, sat_value)
+
+        filmic_sat_val = self.params["Filmic Saturation"] / 100.0
+        if filmic_sat_val > 0:
+            if self._float_precision():
+                # Scaling HSV saturation at fixed hue and value scales each channel's distance from the value.
+                v = image_to_process.max(axis=-1, keepdims=True)
+                return v - (v - image_to_process) * self._filmic_mask(v / 255.0, filmic_sat_val).astype(np.float32)
+            hsv = Image.fromarray(image_to_process).convert("HSV")
+            h, s, v = hsv.split()
+            s_np = np.array(s).astype(np.float32)
+            s_np *= self._filmic_mask(np.array(v) / 255.0, filmic_sat_val)
+            s_new = Image.fromarray(np.clip(s_np, 0, 255).astype(np.uint8))
+            image_to_process = np.asarray(Image.merge("HSV", (h, s_new, v)).convert("RGB"))
+        return image_to_process
+
+    def _filmic_mask(self, v_np, filmic_sat_val):
+        highlight_rolloff = 1.0 - (1.0 / (1.0 + np.exp(-(v_np - 0.8) * 15.0)))
+        shadow_rolloff = 1.0 / (1.0 + np.exp((v_np - 0.2) * 15.0))
+
+        mask = highlight_rolloff * shadow_rolloff
+        return 1.0 - ((1.0 - mask) * filmic_sat_val)
+
+    def _s_curve(self):
+        """The tone curve on a 0-255 scale at 256 input levels, or None when it is the identity."""
+        lift = self.params["Lift"] / 100.0
+        rolloff = self.params["Roll-off"] / 100.0
+        contrast = self.params["Contrast"] / 100.0
+
+        if lift == 0 and rolloff == 0 and contrast == 0: return None
+
+        x = np.linspace(0, 1, 256, dtype=np.float32)
+        alpha = 1.0 + contrast if contrast >= 0 else 1.0 / (1.0 - contrast)
+        s_curve = x**alpha / (x**alpha + (1-x)**alpha)
+        output_min = lift / 2.0
+        output_max = 1.0 - (rolloff / 2.0)
+        final_curve = s_curve * (output_max - output_min) + output_min
+        return np.clip(final_curve * 255, 0, 255)
+
+    def _apply_s_curve(self, image):
+        if (curve := self._s_curve()) is None: return image
+        if image.dtype == np.float32: return np.interp(image, np.arange(256, dtype=np.float32), curve).astype(np.float32)
+        return cv2.LUT(image, curve.astype(np.uint8))
+
+    def _apply_diamond_grid(self, image_to_process, origin=(0, 0)):
+        opacity = self.params["Diamond Grid Opacity"] / 100.0
+        if opacity == 0:
+            return image_to_process
+
+        size = max(1 if self.spatial_scale < 1 else 2, self._px(self.params["Diamond Grid Size"]))
+        softness = self._px(self.params["Diamond Edge Softness"])
+        color_count = int(self.params["Diamond Color Count"])
+        saturation = self.params["Diamond Color Saturation"] / 100.0
+
+        tile = diamond_tile(self.params.seed, size, color_count, saturation, softness)
+        period, (h, w) = tile.shape[0], image_to_process.shape[:2]
+        # Tile columns across one period of rows, then copy whole rows down the frame.
+        band = np.take(tile, (origin[0] + np.arange(w)) % period, axis=1)
+        color_overlay_arr = np.take(band, (origin[1] + np.arange(h)) % period, axis=0)
+        return blend("Overlay", image_to_process, color_overlay_arr, opacity)
@@ -0,0 +1,58 @@
+import logging
+import threading
+
+from grain_renderer import RenderCancelled
+
+
+class RenderScheduler:
+    """Runs preview renders on one background thread, newest request first.
+
+    ``submit(job)`` replaces any request that is still waiting and returns
+    its generation number. The worker calls ``job(cancelled)``, where
+    ``cancelled()`` turns True as soon as a newer request is submitted;
+    pass it to ``GrainRenderer(cancelled=...)`` and a superseded render
+    stops at the next stage boundary. A result is handed to
+    ``on_result(generation, result)`` (on the worker thread) only if no
+    newer request arrived meanwhile; a failed job reports ``None``.
+    ``cancel()`` calls ``on_cancel()`` (on the calling thread) instead, so
+    every request ends in exactly one of the two callbacks or is superseded
+    by a newer one.
+    """
+    def __init__(self, on_result, on_cancel=None):
+        self.on_result, self.on_cancel = on_result, on_cancel
+        self.generation = 0
+        self._pending = None
+        self._closed = False
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, name="render-scheduler", daemon=True).start()
+
+    def submit(self, job):
+        with self._condition:
+            self.generation += 1
+            self._pending = (self.generation, job)
+            self._condition.notify()
+            return self.generation
+
+    def cancel(self):
+        """Drops the waiting request and stops the running one."""
+        with self._condition: self.generation += 1; self._pending = None
+        if self.on_cancel: self.on_cancel()
+
+    def is_current(self, generation): return generation == self.generation
+
+    def close(self):
+        with self._condition:
+            self._closed = True; self.generation += 1; self._pending = None
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while self._pending is None and not self._closed: self._condition.wait()
+                if self._closed: return
+                (generation, job), self._pending = self._pending, None
+            try: result = job(lambda: generation != self.generation)
+            except RenderCancelled: continue
+            except Exception as e:
+                logging.error(f"Preview render failed: {e}"); result = None
+            if self.is_current(generation): self.on_result(generation, result)
@@ -0,0 +1,354 @@
+import argparse
+import io
+import json
+import logging
+import multiprocessing
+import os
+import shutil
+import socket
+import socketserver
+import stat
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from functools import partial
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import cv2
+import numpy as np
+
+from grain_cache import FixedMapCache
+from grain_export import _publish_shared_state, default_worker_count
+from grain_renderer import GrainParams, GrainRenderer
+from grain_writer import DEFAULT_PNG_COMPRESSION, FILE_FORMATS, AsyncWriter, FrameWriter, OutputFormat
+
+DEFAULT_PORT = 8765
+# Renderers (and the caches they hold, e.g. a grain bank's fixed plate) each worker keeps for recent settings.
+WORKER_RENDERERS = 4
+# Largest frame block a /render request may get back in its response instead of writing it to disk.
+MAX_RETURN_BYTES = 1 << 30
+
+# --- Worker process state ---
+# Pool processes live as long as the service. Each keeps one fixed-map cache, backed by the
+# service's store, and renderers for the settings it rendered last, so repeated requests start warm.
+_service_cache = _service_budget = None
+_service_renderers = OrderedDict()
+
+def _init_service_worker(map_store_dir, memory_budget):
+    global _service_cache, _service_budget
+    cv2.setNumThreads(1)  # One process per core already; avoid oversubscribing OpenCV's own pool.
+    _service_cache, _service_budget = FixedMapCache(store_dir=map_store_dir), memory_budget
+
+def _warm_worker(): return os.getpid()
+
+def _service_renderer(params):
+    if (renderer := _service_renderers.get(params)) is None:
+        renderer = _service_renderers[params] = GrainRenderer(params, fixed_map_cache=_service_cache, memory_budget=_service_budget)
+        while len(_service_renderers) > WORKER_RENDERERS: _service_renderers.popitem(last=False)
+    _service_renderers.move_to_end(params)
+    return renderer
+
+def _render_service_chunk(params, frames, bits, writer):
+    """Renders ``frames``: written by ``writer`` (returns ``(frame, None)`` pairs), or returned as ``(frame, array)`` pairs."""
+    renderer = _service_renderer(params)
+    if writer is None: return [(frame, np.asarray(image)) for frame, image in renderer.render_frames(frames, False, bits)]
+    with AsyncWriter(writer) as queue:
+        for frame, image in renderer.render_frames(frames, False, bits): queue.submit(frame, image)
+        queue.completed(wait=True)
+    return [(frame, None) for frame in frames]
+
+
+class _Job:
+    """One request's frames, handed to the pool a chunk at a time; written frames are committed in order.
+
+    Only touched under the service's lock. ``done`` is set once no chunk is
+    left to hand out or running; a failure drops the chunks not handed out yet.
+    """
+    def __init__(self, params, frames, chunks, bits, writer):
+        self.params, self.frames, self.bits, self.writer = params, frames, bits, writer
+        self.chunks, self.running = deque(chunks), 0
+        self.results, self.committed, self.error = {}, 0, None
+        self.done = threading.Event()
+
+    def fail(self, error):
+        if self.error is None: self.error = error
+        self.chunks.clear()
+        if not self.running: self.done.set()
+
+    def finished(self, future):
+        self.running -= 1
+        try:
+            for frame, image in future.result(): self.results[frame] = image
+            if self.writer is not None:
+                while self.committed < len(self.frames) and self.frames[self.committed] in self.results:
+                    self.writer.commit(self.frames[self.committed]); self.committed += 1
+        except BaseException as e: return self.fail(e)
+        if not self.running and not self.chunks: self.done.set()
+
+
+class RenderService:
+    """Renders grain plate sequences on a pool of ``workers`` processes that stay up between requests.
+
+    The processes are started (and the pipeline imported) up front. The
+    fixed sensor maps of each new set of settings are computed once, kept in
+    the service's cache and memory-mapped by every worker from ``store_dir``
+    (a temporary directory unless given, e.g. a ``GRAIN_MAP_CACHE``), so
+    repeated requests pay for neither. Concurrent requests share the pool
+    fairly: their frames go out in chunks, one request after another, with
+    at most one chunk per worker in flight, so a long sequence never holds
+    back a short one for more than a chunk.
+    """
+    def __init__(self, workers=None, store_dir=None, memory_budget=None):
+        self.workers = workers or default_worker_count()
+        self.memory_budget = memory_budget
+        self._own_store = store_dir is None
+        self.store_dir = tempfile.mkdtemp(prefix="grain_service_") if store_dir is None else store_dir
+        self.fixed_map_cache = FixedMapCache(store_dir=self.store_dir)
+        self._pool = self._start_pool()
+        # Jobs with chunks left to hand out, in turn order.
+        self._waiting = deque()
+        self._in_flight = 0
+        # Set when a worker died: the pool is replaced once its last chunk has reported.
+        self._broken = False
+        self._closed = False
+        self._condition = threading.Condition()
+        threading.Thread(target=self._run, name="grain-service-dispatch", daemon=True).start()
+
+    def render(self, params, start, end, output_dir=None, prefix="noise_plate", output=OutputFormat()):
+        """Renders the grain plates of frames ``start..end``.
+
+        With ``output_dir`` they are written as ``export_sequence`` writes
+        them and the frame numbers are returned; otherwise the frames come
+        back as one (N, H, W, 3) array of ``output.bits`` per channel.
+        """
+        frames = list(range(start, end + 1))
+        if not frames: raise ValueError(f"Empty frame range {start}-{end}")
+        if output_dir is None and len(frames) * params.width * params.height * 3 * output.bits // 8 > MAX_RETURN_BYTES:
+            raise ValueError(f"{len(frames)} frames of {params.width}x{params.height} are too large to return; give an output directory")
+        renderer = GrainRenderer(params, fixed_map_cache=self.fixed_map_cache, memory_budget=self.memory_budget)
+        _publish_shared_state(renderer, self.store_dir)
+        writer = None
+        if output_dir is not None:
+            os.makedirs(output_dir, exist_ok=True)
+            writer = FrameWriter(output_dir, prefix, start, end, output)
+            writer.prepare(params.height, params.width)
+        # Chunks no larger than an even share of the frames, so every worker gets some.
+        batch = min(renderer.batch_size(), -(-len(frames) // self.workers))
+        job = _Job(params, frames, [frames[i:i + batch] for i in range(0, len(frames), batch)], output.bits, writer)
+        with self._condition:
+            if self._closed: raise RuntimeError("The render service is closed")
+            self._waiting.append(job)
+            self._condition.notify()
+        job.done.wait()
+        if job.error is not None:
+            if writer is not None: writer.discard(frames[job.committed:])
+            raise job.error
+        if writer is not None:
+            writer.finish()
+            return frames
+        return np.stack([job.results[frame] for frame in frames])
+
+    def status(self):
+        with self._condition: return {"workers": self.workers, "busy": self._in_flight, "queued_requests": len(self._waiting), "store_dir": self.store_dir}
+
+    def close(self):
+        with self._condition:
+            self._closed = True
+            for job in self._waiting: job.fail(RuntimeError("The render service was closed"))
+            self._waiting.clear()
+            self._condition.notify()
+        self._pool.shutdown(wait=True, cancel_futures=True)
+        if self._own_store: shutil.rmtree(self.store_dir, ignore_errors=True)
+
+    def _start_pool(self):
+        """A process pool with every worker started and the pipeline imported."""
+        pool = ProcessPoolExecutor(self.workers, mp_context=multiprocessing.get_context("spawn"),
+                                   initializer=_init_service_worker, initargs=(self.store_dir, self.memory_budget))
+        wait([pool.submit(_warm_worker) for _ in range(self.workers)])
+        return pool
+
+    def _restart_pool(self):
+        """Replaces a pool that a dead worker (OOM kill, crash) broke. Jobs with chunks on it have already failed; waiting ones go to the new pool."""
+        logging.warning("A render process died; restarting the worker pool.")
+        self._pool.shutdown(wait=False, cancel_futures=True)
+        try: pool = self._start_pool()
+        except Exception as e:
+            # The broken pool stays; the next chunk handed to it fails and triggers another attempt.
+            return logging.error(f"Could not restart the worker pool: {e}")
+        with self._condition:
+            if self._closed: return pool.shutdown(wait=False, cancel_futures=True)
+            self._pool = pool
+
+    def _run(self):
+        while True:
+            with self._condition:
+                # A broken pool is replaced once none of its chunks are still to report; until then nothing is handed out.
+                while not self._closed and not (self._in_flight == 0 if self._broken else self._waiting and self._in_flight < self.workers):
+                    self._condition.wait()
+                if self._closed: return
+                restart, self._broken = self._broken, False
+                if not restart:
+                    job = self._waiting.popleft()
+                    if not job.chunks: continue
+                    chunk = job.chunks.popleft()
+                    # Round robin: a job with more chunks goes to the back of the line.
+                    if job.chunks: self._waiting.append(job)
+                    self._in_flight += 1; job.running += 1
+            if restart:
+                self._restart_pool()
+                continue
+            try: future = self._pool.submit(_render_service_chunk, job.params, chunk, job.bits, job.writer)
+            except BaseException as e:
+                with self._condition: self._in_flight -= 1; job.running -= 1; self._broken |= isinstance(e, BrokenProcessPool); job.fail(e)
+                continue
+            future.add_done_callback(partial(self._finished, job))
+
+    def _finished(self, job, future):
+        with self._condition:
+            self._in_flight -= 1
+            self._broken |= not future.cancelled() and isinstance(future.exception(), BrokenProcessPool)
+            job.finished(future)
+            self._condition.notify()
+
+
+# --- Requests ---
+def resolve_request_path(root, path, what):
+    """``path`` from a request, resolved under ``root`` (symlinks followed); anything outside it, or any path without a root, is refused."""
+    if root is None: raise ValueError(f"This server accepts no file paths ({what}); start it with --root to allow paths under a directory")
+    root = os.path.realpath(root)
+    resolved = os.path.realpath(os.path.join(root, path))
+    if os.path.commonpath([root, resolved]) != root: raise ValueError(f"{what} '{path}' is outside the server's root")
+    return resolved
+
+
+def params_from_request(request, root=None):
+    """``GrainParams`` from a /render request: ``preset`` (a preset dict, or the path of a saved one under ``root``) with top-level overrides."""
+    preset = request.get("preset") or {}
+    if isinstance(preset, str):
+        with open(resolve_request_path(root, preset, "preset")) as f: preset = json.load(f)
+    data = dict(preset)
+    for field in ("width", "height", "seed", "supersample", "supersample_mode", "denoise_mode", "rng_mode", "banding_mode", "precision",
+                  "upscale_kernel", "grain_engine", "grain_spectrum", "grain_bank"):
+        if (value := request.get(field)) is not None: data[field] = value
+    data["sliders"] = {**data.get("sliders", {}), **request.get("sliders", {})}
+    return GrainParams.from_dict(data)
+
+
+def render_request(service, request, root=None):
+    """Runs one /render request; returns a JSON-able dict, or the frames as an array when no ``output_dir`` is given.
+
+    ``preset`` paths and ``output_dir`` are resolved under ``root`` (see
+    ``resolve_request_path``); without one only inline presets and returned
+    frames are accepted.
+    """
+    params = params_from_request(request, root)
+    start = int(request.get("start", 1001))
+    end = int(request.get("end", start))
+    output = OutputFormat(request.get("format", FILE_FORMATS[0]), int(request.get("bit_depth", 8)), int(request.get("png_compression", DEFAULT_PNG_COMPRESSION)))
+    output_dir = None if request.get("output_dir") is None else resolve_request_path(root, request["output_dir"], "output_dir")
+    if (prefix := request.get("prefix", "noise_plate")) in ("", ".", "..") or os.path.basename(prefix) != prefix:
+        raise ValueError(f"prefix '{prefix}' must be a plain file name")
+    began = time.perf_counter()
+    result = service.render(params, start, end, output_dir, prefix, output)
+    if isinstance(result, np.ndarray): return result
+    writer = FrameWriter(output_dir, prefix, start, end, output)
+    return {"frames": result, "paths": sorted({writer.path(frame) for frame in result}), "seconds": round(time.perf_counter() - began, 3)}
+
+
+class _Handler(BaseHTTPRequestHandler):
+    """``POST /render`` with a JSON request renders frames (see ``render_request``); ``GET /status`` reports the pool."""
+    server_version = "GrainServer/1"
+
+    def address_string(self): return self.client_address[0] if isinstance(self.client_address, tuple) else "local socket"
+
+    def log_message(self, format, *args): logging.info(f"{self.address_string()} {format % args}")
+
+    def _reply(self, status, body, content_type="application/json"):
+        if not isinstance(body, bytes): body = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path != "/status": return self._reply(404, {"error": f"Unknown path: {self.path}"})
+        self._reply(200, self.server.service.status())
+
+    def do_POST(self):
+        if self.path != "/render": return self._reply(404, {"error": f"Unknown path: {self.path}"})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get("Content-Length") or 0)) or b"{}")
+            result = render_request(self.server.service, request, self.server.root)
+        except (OSError, ValueError, TypeError, KeyError) as e: return self._reply(400, {"error": str(e)})
+        except Exception as e:
+            logging.error(f"Render request failed: {e}")
+            return self._reply(500, {"error": str(e)})
+        if isinstance(result, np.ndarray):
+            buffer = io.BytesIO(); np.save(buffer, result)
+            return self._reply(200, buffer.getvalue(), "application/x-npy")
+        self._reply(200, result)
+
+
+class _UnixHTTPServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+
+def make_server(service, host="127.0.0.1", port=DEFAULT_PORT, socket_path=None, root=None):
+    """An HTTP server for ``service`` on ``host:port``, or on the Unix socket ``socket_path``; each request runs on its own thread.
+
+    Requests may only read presets from and write frames to paths under ``root`` (none at all without it).
+    """
+    if socket_path:
+        # Only a stale socket left by an earlier server is replaced; any other file at the path is an error, never deleted.
+        try: mode = os.lstat(socket_path).st_mode
+        except FileNotFoundError: mode = None
+        if mode is not None:
+            if not stat.S_ISSOCK(mode): raise FileExistsError(f"{socket_path} exists and is not a socket")
+            with socket.socket(socket.AF_UNIX) as probe:
+                if probe.connect_ex(socket_path) == 0: raise FileExistsError(f"Another server is listening on {socket_path}")
+            os.remove(socket_path)
+        server = _UnixHTTPServer(socket_path, _Handler)
+    else: server = ThreadingHTTPServer((host, port), _Handler)
+    server.service, server.root = service, root
+    return server
+
+
+def build_parser():
+    parser = argparse.ArgumentParser(description="Serve Organic Grain Generator renders to local tools over HTTP.")
+    parser.add_argument("--host", default="127.0.0.1", help="Interface to listen on (default: 127.0.0.1, this machine only).")
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT, help=f"TCP port (default: {DEFAULT_PORT}).")
+    parser.add_argument("--socket", metavar="PATH", help="Listen on a Unix socket instead of TCP (a stale socket there is replaced; any other file is left alone).")
+    parser.add_argument("--workers", "-j", type=int, default=default_worker_count(), help="Render processes kept running (default: CPU count).")
+    parser.add_argument("--map-cache", default=os.environ.get("GRAIN_MAP_CACHE"), metavar="DIR",
+                        help="Directory for persistent fixed sensor maps, reused across restarts (default: $GRAIN_MAP_CACHE, else a temporary one).")
+    parser.add_argument("--memory-budget", type=int, metavar="MB", help="Cap each render process's working memory; larger frames render in bands.")
+    parser.add_argument("--root", metavar="DIR",
+                        help="Directory requests may read preset files from and write frames to, relative paths resolved against it "
+                             "(default: none; requests must send inline presets and get frames back in the reply).")
+    return parser
+
+
+def main(argv=None):
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    args = build_parser().parse_args(argv)
+    service = RenderService(args.workers, args.map_cache, args.memory_budget * 2**20 if args.memory_budget else None)
+    try:
+        try: server = make_server(service, args.host, args.port, args.socket, args.root)
+        except OSError as e:
+            logging.error(f"Cannot listen on {args.socket or f'{args.host}:{args.port}'}: {e}")
+            return 1
+        logging.info(f"Serving renders on {args.socket or f'http://{args.host}:{args.port}'} with {service.workers} worker(s)")
+        try: server.serve_forever()
+        except KeyboardInterrupt: pass
+        finally: server.server_close()
+    finally: service.close()
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
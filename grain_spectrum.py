@@ -0,0 +1,223 @@
+import math
+from functools import lru_cache
+
+import cv2
+import numpy as np
+
+from grain_noise import STREAM_CHUNK_ELEMENTS, upscale_matrix
+
+# Output pixels along the axis the covariances are measured on.
+ANALYSIS_PIXELS = 128
+# Half-width of the matching filters for one-pixel grain; supersampled grain's correlation dies out well within it.
+MATCHED_TAP_RADIUS = 6
+_SPECTRUM_SIZE = 512
+# "Cells" draws one value per grain cell and upscales it (grain_noise); "Spectral" shapes per-pixel white noise in the frequency domain.
+GRAIN_ENGINES = ("Cells", "Spectral")
+# Power spectra of the spectral engine: "Film" has the exponential autocorrelation of silver-halide
+# granularity (clumps with fine detail), "Gaussian" is a soft, round grain with no fine structure.
+GRAIN_SPECTRA = ("Film", "Gaussian")
+# Samples per axis of the render-resolution frequency square grain spectra are normalized over.
+_NORMALIZE_GRID = 512
+
+
+def _lanczos(x, a=3):
+    return np.where(np.abs(x) < a, np.sinc(x) * np.sinc(x / a), 0.0)
+
+
+def lanczos_matrix(in_size, out_size):
+    """Dense (out_size, in_size) weights of Pillow's LANCZOS resize along one axis (its own coefficient formula)."""
+    scale = in_size / out_size
+    filter_scale = max(scale, 1.0)
+    support = 3.0 * filter_scale
+    matrix = np.zeros((out_size, in_size))
+    for i in range(out_size):
+        centre = (i + 0.5) * scale
+        lo, hi = max(0, int(centre - support + 0.5)), min(in_size, int(centre + support + 0.5))
+        weights = _lanczos((np.arange(lo, hi) - centre + 0.5) / filter_scale)
+        matrix[i, lo:hi] = weights / weights.sum()
+    return matrix
+
+
+def axis_autocovariance(matrix, reach):
+    """Covariance of outputs 0..``reach`` pixels apart in ``matrix @ v`` for unit white ``v``, averaged over rows clear of the ends."""
+    cov = matrix @ matrix.T
+    rows = np.arange(len(cov) // 4, 3 * len(cov) // 4)
+    return np.array([cov[rows, rows + d].mean() for d in range(reach + 1)])
+
+
+def _power(autocovariance):
+    full = np.zeros(_SPECTRUM_SIZE)
+    full[:len(autocovariance)] = autocovariance
+    full[-len(autocovariance) + 1:] = autocovariance[:0:-1]
+    return np.fft.rfft(full).real
+
+
+def matching_taps(target, source, radius=MATCHED_TAP_RADIUS):
+    """Symmetric taps that turn a field with per-axis autocovariance ``source`` into one with ``target``.
+
+    The filter's power response is the ratio of the two spectra (the
+    square root of it, as a zero-phase kernel); where ``source`` has almost
+    no power there is nothing to reshape, so the ratio is capped. The
+    truncated taps are rescaled so the variance matches exactly.
+    """
+    source_power = _power(source)
+    gain = np.sqrt(np.clip(_power(target), 0, None) / np.maximum(source_power, 1e-3 * source_power.max()))
+    kernel = np.fft.irfft(gain, _SPECTRUM_SIZE)
+    taps = np.concatenate([kernel[-radius:], kernel[:radius + 1]])
+    auto = np.correlate(taps, taps, "full")
+    lags = np.abs(np.arange(-2 * radius, 2 * radius + 1))
+    variance = float((auto * np.where(lags < len(source), source[np.minimum(lags, len(source) - 1)], 0.0)).sum())
+    return taps * np.sqrt(target[0] / variance)
+
+
+def fast_cell(cell, factor):
+    """Output pixels per grain cell when ``cell``-pixel grain of a ``factor``× supersampled render is synthesized at output resolution.
+
+    Whole cells keep their shape; cells that would span a fraction of an
+    output pixel are drawn per pixel, and the matching filter shapes them.
+    Either way the field has as many cells as the supersampled render, so
+    it costs what a 1x render of ``factor`` times finer grain does.
+    """
+    return cell // factor if cell % factor == 0 else 1
+
+
+@lru_cache(maxsize=64)
+def fast_supersample_taps(cell, factor, kernel):
+    """Per-axis taps that give output-resolution grain (``fast_cell`` pixels) the statistics of supersampled grain.
+
+    The reference is ``cell``-pixel grain drawn at ``factor``× resolution
+    and LANCZOS-downscaled; both fields are expanded with ``kernel``. Their
+    covariances are separable (the cells are independent and both resizes
+    act per axis), so matching one axis matches the 2D power spectrum.
+    """
+    n, small = ANALYSIS_PIXELS, fast_cell(cell, factor)
+    # Per-pixel noise has to be given the cells' whole correlation length by the filter.
+    radius = MATCHED_TAP_RADIUS + (-(-cell // factor) if small == 1 else 0)
+    exact = lanczos_matrix(n * factor, n) @ upscale_matrix(n * factor, max(1, n * factor // cell), kernel)
+    fast = upscale_matrix(n, max(1, n // small), kernel)
+    reach = 2 * radius + 1
+    taps = matching_taps(axis_autocovariance(exact, reach), axis_autocovariance(fast, reach), radius).astype(np.float32)
+    taps.flags.writeable = False
+    return taps
+
+
+def filter_axes(image, taps):
+    """``image`` ((h, w) or (h, w, C) float32) filtered by ``taps`` along both axes, mirroring it at the edges."""
+    return cv2.sepFilter2D(image, cv2.CV_32F, taps, taps, borderType=cv2.BORDER_REFLECT_101)
+
+
+# --- Spectral synthesis ---
+def grain_power(fy, fx, grain_size, shape, aspect=1.0, angle=0.0):
+    """Unnormalized power of ``shape`` grain at frequencies ``(fy, fx)`` in cycles per pixel.
+
+    ``grain_size`` (pixels, fractional) sets the correlation length so that a
+    grain covers about grain_size² pixels, as a cell does; ``aspect``
+    stretches it horizontally (area kept) and ``angle`` turns it (degrees).
+    """
+    theta = math.radians(angle)
+    u, v = fx * math.cos(theta) + fy * math.sin(theta), fy * math.cos(theta) - fx * math.sin(theta)
+    q2 = (u * (grain_size * math.sqrt(aspect))) ** 2 + (v * (grain_size / math.sqrt(aspect))) ** 2
+    if shape == "Gaussian": return np.exp(-math.pi * q2)
+    return (1.0 + 2 * math.pi * q2) ** -1.5
+
+
+def lanczos_response(f):
+    """Frequency response of a LANCZOS downsample at ``f`` cycles per output pixel (1 at DC)."""
+    t = np.linspace(-3, 3, 601)
+    kernel = _lanczos(t)
+    return np.cos(2 * np.pi * np.multiply.outer(np.abs(f), t)) @ kernel / kernel.sum()
+
+
+@lru_cache(maxsize=8)
+def spectral_filter(width, height, grain_size, shape, aspect=1.0, angle=0.0, factor=1.0):
+    """(height, width // 2 + 1) float32 amplitudes that turn unit white noise into ``shape`` grain under ``numpy.fft.rfft2``.
+
+    ``grain_size`` is in render pixels. Each output pixel stands for
+    ``factor`` render pixels per axis (fast supersampling, proxies): the
+    spectrum is then the render's as LANCZOS-downsampled, softer and weaker.
+    Grain has unit variance per render pixel; DC passes unchanged, so each
+    frame keeps its mean.
+    """
+    grid = (np.arange(_NORMALIZE_GRID) + 0.5) / _NORMALIZE_GRID - 0.5
+    norm = grain_power(grid[:, None], grid[None, :], grain_size, shape, aspect, angle).mean()
+    fy, fx = np.fft.fftfreq(height)[:, None], np.fft.rfftfreq(width)[None, :]
+    power = grain_power(fy / factor, fx / factor, grain_size, shape, aspect, angle) / norm
+    if factor != 1: power *= (lanczos_response(fy) * lanczos_response(fx)) ** 2 / factor ** 2
+    gain = np.sqrt(power).astype(np.float32)
+    gain[0, 0] = 1.0
+    gain.flags.writeable = False
+    return gain
+
+
+class SpectralNoise:
+    """Grain fields shaped in the frequency domain from the per-pixel white noise of ``source``.
+
+    ``source`` (a ``SequentialNoise`` or ``AddressableNoise`` with one cell
+    per pixel) supplies the draws and the sparse points. On first read every
+    field plane goes through ``rfft2``, a multiply by ``gain`` (see
+    ``spectral_filter``) and the inverse transform in place, one plane at a
+    time so only one spectrum is alive; the white noise is read from the
+    source in row chunks. Shot and read noise reach
+    the plate the same way, so they are summed first and read back together
+    as the "shot" field. Every pixel depends on the whole frame, so the
+    fields are synthesized in full and windows are cut from them (see
+    ``spectral_bytes`` for what that costs).
+    """
+    quantized = False
+
+    def __init__(self, source, gain):
+        self.source, self.gain = source, gain
+        self.n_rows, self.n_cols = source.n_rows, source.n_cols
+        self._fields = None
+
+    def __contains__(self, name): return name in self.source and (name != "read" or "shot" not in self.source)
+
+    def value_range(self, name): return None
+
+    def points(self, box): return self.source.points(box)
+
+    def _read(self, names):
+        """The sum of the source's fields ``names`` as (C, rows, cols) float32 planes, read a few rows at a time."""
+        planes, step = None, max(1, STREAM_CHUNK_ELEMENTS // self.n_cols)
+        for start in range(0, self.n_rows, step):
+            stop = min(self.n_rows, start + step)
+            chunk = np.array(self.source.rows(names[0], start, stop), dtype=np.float32)
+            for name in names[1:]: chunk += self.source.rows(name, start, stop)
+            if planes is None: planes = np.empty((chunk.shape[2] if chunk.ndim == 3 else 1, self.n_rows, self.n_cols), dtype=np.float32)
+            planes[:, start:stop] = np.moveaxis(chunk, -1, 0) if chunk.ndim == 3 else chunk
+        return planes, chunk.ndim
+
+    def _synthesize(self):
+        self._fields = {}
+        for names in ([name for name in ("shot", "read") if name in self.source], ["color"] if "color" in self.source else []):
+            if not names: continue
+            planes, ndim = self._read(names)
+            for plane in planes:
+                spectrum = np.fft.rfft2(plane)
+                spectrum *= self.gain
+                plane[...] = np.fft.irfft2(spectrum, s=(self.n_rows, self.n_cols))
+            self._fields[names[0]] = np.moveaxis(planes, 0, -1) if ndim == 3 else planes[0]
+
+    def window(self, name, box):
+        if self._fields is None: self._synthesize()
+        x0, y0, x1, y1 = box
+        return self._fields[name][y0:y1, x0:x1]
+
+    def rows(self, name, start, stop): return self.window(name, (0, start, self.n_cols, stop))
+
+
+# --- Validation ---
+def radial_power_spectrum(image, bins=32):
+    """Mean noise power per radial frequency band (0 to Nyquist) of an (h, w) or (h, w, C) image, averaged over channels."""
+    image = np.asarray(image, np.float64)
+    if image.ndim == 2: image = image[..., None]
+    h, w = image.shape[:2]
+    power = np.zeros((h, w))
+    window = np.outer(np.hanning(h), np.hanning(w))
+    for c in range(image.shape[2]):
+        plane = image[..., c] - image[..., c].mean()
+        power += np.abs(np.fft.fft2(plane * window)) ** 2
+    power /= image.shape[2] * (window ** 2).sum()
+    radius = np.hypot(*np.meshgrid(np.fft.fftfreq(h), np.fft.fftfreq(w), indexing="ij")) / 0.5
+    band = np.minimum((radius * bins).astype(np.intp), bins)
+    return np.bincount(band.ravel(), power.ravel(), bins + 1)[:bins] / np.maximum(np.bincount(band.ravel(), minlength=bins + 1)[:bins], 1)
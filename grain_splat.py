@@ -0,0 +1,75 @@
+import math
+
+import cv2
+import numpy as np
+
+# Pixels per strip of the dense path; bounds its energy buffer regardless of plate size.
+STRIP_PIXELS = 1 << 20
+# Above this many kernel-tap updates per pixel, spreading through dense strips beats scattering tap by tap.
+DENSE_TAPS_PER_PIXEL = 1 / 16
+
+
+def gaussian_psf(sigma):
+    """Normalized 1D Gaussian taps (radius ``ceil(3 * sigma)``) for a separable point-spread kernel, or None for a point."""
+    if sigma < 0.25: return None
+    radius = math.ceil(3 * sigma)
+    taps = np.exp(-0.5 * (np.arange(-radius, radius + 1) / sigma) ** 2)
+    return taps / taps.sum()
+
+
+def use_dense(density, psf):
+    """Whether ``splat`` should spread points ``density`` per pixel through dense strips.
+
+    Decided from the settings rather than the points at hand, so every box
+    and band of a plate takes the same path and produces the same pixels.
+    """
+    return psf is not None and density * len(psf) ** 2 > DENSE_TAPS_PER_PIXEL
+
+
+def splat(dest, y, x, values, psf=None, dense=False):
+    """Adds ``values`` (M, C) at points ``(y, x)`` of an (H, W, C) float ``dest``, in float.
+
+    Points landing on the same pixel add up. With a ``psf`` (see
+    ``gaussian_psf``) each point's energy is spread over ``psf ⊗ psf``, and
+    points may lie up to its radius outside ``dest``. Memory grows with the
+    number of points (sparse) or one strip (``dense``), never with the plate.
+    """
+    if len(y) == 0: return
+    if dense: _splat_dense(dest, y, x, values, psf)
+    else: _splat_sparse(dest, y, x, values, psf)
+
+
+def _splat_sparse(dest, y, x, values, psf):
+    h, w = dest.shape[:2]
+    r = 0 if psf is None else len(psf) // 2
+    pitch = w + 2 * r
+    # Sum coincident points first; shifted copies of a set of distinct pixels stay distinct, so each tap is a plain scatter.
+    pixels, inverse = np.unique((y + r) * pitch + (x + r), return_inverse=True)
+    energy = np.stack([np.bincount(inverse, values[:, c], len(pixels)) for c in range(values.shape[1])], axis=1)
+    py, px = np.divmod(pixels, pitch)
+    py -= r; px -= r
+    flat = dest.reshape(-1, dest.shape[2])
+    for dy in range(-r, r + 1):
+        for dx in range(-r, r + 1):
+            ty, tx = py + dy, px + dx
+            inside = (ty >= 0) & (ty < h) & (tx >= 0) & (tx < w)
+            tapped = energy[inside] if psf is None else energy[inside] * (psf[dy + r] * psf[dx + r])
+            flat[(ty * w + tx)[inside]] += tapped
+
+
+def _splat_dense(dest, y, x, values, psf):
+    h, w = dest.shape[:2]
+    r = len(psf) // 2
+    pitch = w + 2 * r
+    order = np.argsort(y, kind="stable")
+    y, x, values = y[order], x[order], values[order]
+    strip_rows = max(1, STRIP_PIXELS // pitch)
+    for top in range(0, h, strip_rows):
+        bottom = min(h, top + strip_rows)
+        lo, hi = np.searchsorted(y, top - r), np.searchsorted(y, bottom + r)
+        if lo == hi: continue
+        # Points over the strip plus an r-pixel margin, so the filter sees every point that reaches the strip.
+        energy = np.zeros((bottom - top + 2 * r, pitch, dest.shape[2]), dtype=np.float32)
+        _splat_sparse(energy, y[lo:hi] - (top - r), x[lo:hi] + r, values[lo:hi], None)
+        spread = cv2.sepFilter2D(energy, -1, psf, psf, borderType=cv2.BORDER_CONSTANT)
+        dest[top:bottom] += spread[r:r + bottom - top, r:r + w]
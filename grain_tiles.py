@@ -0,0 +1,52 @@
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+import numpy as np
+
+# Output tile edge. Each tile is filtered with its halo of context, so larger tiles spend less on overlap.
+TILE_SIZE = 1024
+
+
+def tile_workers():
+    """Threads for tiled filters: the parallelism OpenCV itself was given (1 inside export worker processes)."""
+    return max(1, cv2.getNumThreads())
+
+
+def run_tiled(fn, image, halo, checkpoint=None, tile_size=TILE_SIZE, workers=None):
+    """``fn(image)`` evaluated ``tile_size`` tile by tile on a thread pool.
+
+    ``fn`` maps an (h, w, C) crop to a result of the same size in which each
+    pixel reads input at most ``halo`` pixels away. Every tile is filtered
+    with that much context (at the frame's edges, ``fn``'s own border
+    handling applies exactly as on the whole frame) and only its own pixels
+    are kept, so the result equals ``fn(image)`` and there are no seams.
+    ``checkpoint()`` runs before each tile and may raise to abandon the rest.
+    """
+    h, w = image.shape[:2]
+    if h <= tile_size and w <= tile_size:
+        if checkpoint: checkpoint()
+        return fn(image)
+
+    def run(tile):
+        y0, x0 = tile
+        if checkpoint: checkpoint()
+        y1, x1 = min(h, y0 + tile_size), min(w, x0 + tile_size)
+        ay, ax = max(0, y0 - halo), max(0, x0 - halo)
+        result = fn(np.ascontiguousarray(image[ay:min(h, y1 + halo), ax:min(w, x1 + halo)]))
+        return y0, x0, result[y0 - ay:y1 - ay, x0 - ax:x1 - ax]
+
+    tiles = [(y, x) for y in range(0, h, tile_size) for x in range(0, w, tile_size)]
+    out = None
+    workers = workers or tile_workers()
+    with ThreadPoolExecutor(workers) if workers > 1 else _Inline() as pool:
+        for y0, x0, result in pool.map(run, tiles):
+            if out is None: out = np.empty((h, w) + result.shape[2:], result.dtype)
+            out[y0:y0 + result.shape[0], x0:x0 + result.shape[1]] = result
+    return out
+
+
+class _Inline:
+    """Stand-in for a one-thread pool: runs tiles in the calling thread."""
+    def __enter__(self): return self
+    def __exit__(self, *exc): return False
+    def map(self, fn, items): return map(fn, items)
@@ -0,0 +1,138 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+
+import cv2
+import numpy as np
+from PIL import Image
+
+FILE_FORMATS = ("PNG", "TIFF", "NPY Stack")
+BIT_DEPTHS = (8, 16)
+EXTENSIONS = {"PNG": "png", "TIFF": "tif", "NPY Stack": "npy"}
+# Pillow's default level, so 8-bit PNGs stay byte-identical to earlier exports.
+DEFAULT_PNG_COMPRESSION = 6
+# Encoder threads per rendering process, and frames that may wait for them before rendering blocks.
+WRITER_THREADS = 2
+WRITER_QUEUE_FRAMES = 4
+
+
+@dataclass(frozen=True)
+class OutputFormat:
+    """How exported frames are stored: ``file_format`` (one of ``FILE_FORMATS``), ``bits`` per channel and PNG ``png_compression`` (0-9)."""
+    file_format: str = FILE_FORMATS[0]
+    bits: int = 8
+    png_compression: int = DEFAULT_PNG_COMPRESSION
+
+    def __post_init__(self):
+        if self.file_format not in FILE_FORMATS:
+            raise ValueError(f"Unknown file format: {self.file_format}")
+        if self.bits not in BIT_DEPTHS:
+            raise ValueError(f"Unsupported bit depth: {self.bits}")
+        if not 0 <= self.png_compression <= 9:
+            raise ValueError(f"PNG compression must be 0-9, got {self.png_compression}")
+
+    @property
+    def dtype(self): return np.uint8 if self.bits == 8 else np.uint16
+
+
+class FrameWriter:
+    """Stores the frames ``start..end`` of one export in ``output_dir``.
+
+    Image formats write ``{prefix}.{frame:04d}.{ext}``; "NPY Stack" writes
+    every frame into one ``{prefix}.npy`` array of shape (frames, H, W, 3)
+    that downstream tools can memory-map without decoding. Frames are
+    written to hidden ``.partial`` files first and published by ``commit``
+    (a stack as a whole by ``finish``). Writers are picklable, and ``write``
+    may run for different frames on several threads or processes at once.
+    """
+    def __init__(self, output_dir, prefix, start, end, output=OutputFormat()):
+        self.output_dir, self.prefix, self.start, self.end, self.output = output_dir, prefix, start, end, output
+
+    @property
+    def stacked(self): return self.output.file_format == "NPY Stack"
+
+    def path(self, frame):
+        if self.stacked: return os.path.join(self.output_dir, f"{self.prefix}.npy")
+        return os.path.join(self.output_dir, f"{self.prefix}.{frame:04d}.{EXTENSIONS[self.output.file_format]}")
+
+    def _partial_path(self, frame):
+        return os.path.join(self.output_dir, f".{os.path.basename(self.path(frame))}.partial")
+
+    def exists(self, frame): return os.path.exists(self.path(frame))
+
+    def prepare(self, height, width):
+        """Creates the stack file frames are written into; image formats need nothing."""
+        if self.stacked:
+            shape = (self.end - self.start + 1, height, width, 3)
+            np.lib.format.open_memmap(self._partial_path(self.start), mode="w+", dtype=self.output.dtype, shape=shape).flush()
+
+    def write(self, frame, image):
+        """Writes ``image``, a PIL image or an (H, W, 3) array of ``output.bits`` per channel, as ``frame``."""
+        out = self.output
+        if self.stacked:
+            stack = np.load(self._partial_path(frame), mmap_mode="r+")
+            stack[frame - self.start] = image
+            stack.flush()
+        elif out.file_format == "PNG" and out.bits == 8:
+            image.save(self._partial_path(frame), format="PNG", compress_level=out.png_compression)
+        else:
+            params = [cv2.IMWRITE_PNG_COMPRESSION, out.png_compression] if out.file_format == "PNG" else []
+            ok, encoded = cv2.imencode(f".{EXTENSIONS[out.file_format]}", np.ascontiguousarray(np.asarray(image)[..., ::-1]), params)
+            if not ok: raise OSError(f"Could not encode frame {frame} as {out.bits}-bit {out.file_format}")
+            encoded.tofile(self._partial_path(frame))
+
+    def commit(self, frame):
+        if not self.stacked: os.replace(self._partial_path(frame), self.path(frame))
+
+    def finish(self):
+        if self.stacked: os.replace(self._partial_path(self.start), self.path(self.start))
+
+    def discard(self, frames):
+        """Removes what ``write`` left behind for uncommitted ``frames`` (for a stack, the unfinished stack)."""
+        for frame in frames[:1] if self.stacked else frames:
+            if os.path.exists(partial := self._partial_path(frame)): os.remove(partial)
+
+
+class AsyncWriter:
+    """Runs ``writer.write`` on ``threads`` background threads, so frames are encoded while the next one renders.
+
+    ``submit`` blocks while ``depth`` frames are already waiting, which
+    bounds the memory held by rendered-but-unwritten frames. Pillow and
+    OpenCV release the GIL while encoding, so the threads overlap with
+    rendering. Leaving the ``with`` block waits for every write, or drops
+    the queued ones if it is left by an exception. Writes are recorded as
+    "write" stages in ``profiler`` (a ``StageProfiler``), if given.
+    """
+    def __init__(self, writer, threads=WRITER_THREADS, depth=WRITER_QUEUE_FRAMES, profiler=None):
+        self.writer, self.profiler = writer, profiler
+        self._pool = ThreadPoolExecutor(threads, thread_name_prefix="grain-writer")
+        self._slots = threading.BoundedSemaphore(depth)
+        self._pending = []
+
+    def __enter__(self): return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self._pool.shutdown(wait=True, cancel_futures=exc_type is not None)
+        return False
+
+    def submit(self, frame, image):
+        self._slots.acquire()
+        try: future = self._pool.submit(self._write, frame, image)
+        except BaseException: self._slots.release(); raise
+        future.add_done_callback(lambda _: self._slots.release())
+        self._pending.append((frame, future))
+
+    def _write(self, frame, image):
+        if self.profiler is None: return self.writer.write(frame, image)
+        # Allocations aren't measured: resetting tracemalloc's peak here would disturb the render's.
+        width, height = image.size if isinstance(image, Image.Image) else image.shape[1::-1]
+        with self.profiler.stage("write", width * height, [frame], memory=False): self.writer.write(frame, image)
+
+    def completed(self, wait=False):
+        """Frames whose writes have finished since the last call (all outstanding ones if ``wait``); re-raises a failed write."""
+        done, pending = [], []
+        for frame, future in self._pending: (done if wait or future.done() else pending).append((frame, future))
+        self._pending = pending
+        for _, future in done: future.result()
+        return [frame for frame, _ in done]